@@ -0,0 +1,85 @@
+"""
+支撑阻力位计算的性能对比：逐行 iloc 的旧实现 vs 向量化分形查找
+
+用法：
+    python benchmark_support_resistance.py          # 旧实现在100万根K线上按1万根的耗时线性估算
+    python benchmark_support_resistance.py --full   # 旧实现也实际运行100万根（约需数分钟）
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.services.technical_analysis import TechnicalAnalysis
+
+SIZES = (100, 10_000, 1_000_000)
+# 旧实现超过该规模时按线性外推估算
+LEGACY_MAX_ROWS = 10_000
+
+
+def make_candles(size: int, seed: int = 0) -> pd.DataFrame:
+    """生成随机游走K线"""
+    rng = np.random.default_rng(seed)
+    close = 2000 + np.cumsum(rng.normal(0, 2, size))
+    spread = rng.uniform(0.1, 3, size)
+    return pd.DataFrame({
+        'high': np.round(close + spread, 2),
+        'low': np.round(close - spread, 2),
+    })
+
+
+def legacy_fractals(recent_data: pd.DataFrame):
+    """原实现：每根K线约16次 iloc 行查找"""
+    highs = []
+    lows = []
+    for i in range(2, len(recent_data) - 2):
+        if (recent_data.iloc[i]['high'] > recent_data.iloc[i-1]['high'] and
+                recent_data.iloc[i]['high'] > recent_data.iloc[i-2]['high'] and
+                recent_data.iloc[i]['high'] > recent_data.iloc[i+1]['high'] and
+                recent_data.iloc[i]['high'] > recent_data.iloc[i+2]['high']):
+            highs.append(recent_data.iloc[i]['high'])
+        if (recent_data.iloc[i]['low'] < recent_data.iloc[i-1]['low'] and
+                recent_data.iloc[i]['low'] < recent_data.iloc[i-2]['low'] and
+                recent_data.iloc[i]['low'] < recent_data.iloc[i+1]['low'] and
+                recent_data.iloc[i]['low'] < recent_data.iloc[i+2]['low']):
+            lows.append(recent_data.iloc[i]['low'])
+    return highs, lows
+
+
+def vectorized_fractals(recent_data: pd.DataFrame):
+    find = TechnicalAnalysis._find_fractals
+    return (find(recent_data['high'].to_numpy(), 2, True).tolist(),
+            find(recent_data['low'].to_numpy(), 2, False).tolist())
+
+
+def timed(func, *args, repeat: int = 1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args)
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    full = '--full' in sys.argv
+    print(f"{'K线数':>10} {'旧实现':>14} {'向量化':>12} {'加速比':>10}")
+    for size in SIZES:
+        df = make_candles(size)
+        new_time, new_result = timed(vectorized_fractals, df, repeat=max(1, 100_000 // size))
+
+        if full or size <= LEGACY_MAX_ROWS:
+            legacy_time, legacy_result = timed(legacy_fractals, df)
+            assert [float(v) for v in legacy_result[0]] == new_result[0], '局部高点不一致'
+            assert [float(v) for v in legacy_result[1]] == new_result[1], '局部低点不一致'
+            legacy_label = f'{legacy_time * 1000:.1f}ms'
+        else:
+            sample = make_candles(LEGACY_MAX_ROWS)
+            sample_time, _ = timed(legacy_fractals, sample)
+            legacy_time = sample_time * size / LEGACY_MAX_ROWS
+            legacy_label = f'~{legacy_time * 1000:.0f}ms'
+
+        print(f'{size:>10} {legacy_label:>14} {new_time * 1000:>10.3f}ms {legacy_time / new_time:>9.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,18 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from src.services.bitget_service import BitgetService
 from src.services.simple_technical_analysis import SimpleTechnicalAnalysis
-import asyncio
-import threading
+from src.services.lazy_analysis import SECTION_DEPENDENCIES
+from src.services.batch_analysis import BatchAnalysisService
+from src.services.candle_store import CandleStore
+from src.services.candle_db import CandleDatabase, DEFAULT_DB_PATH
+from src.services.candle_archive import CandleArchive
+from src.services.candle_query import CandleRangeQuery
+from src.services.cold_storage import ColdStorage
+from src.services.gap_repair import GapRepairService
+from src.services.ingestion_service import IngestionService
+from src.services.bitget_ws_service import BitgetWebSocketClient
+import json
+import os
 import time
 
 crypto_bp = Blueprint('crypto', __name__)
@@ -11,33 +21,130 @@ crypto_bp = Blueprint('crypto', __name__)
 bitget_service = BitgetService()
 technical_analysis = SimpleTechnicalAnalysis()
 
-# 全局变量存储最新数据
-latest_data = {
-    'klines': [],
-    'analysis': {},
-    'last_update': 0
-}
+# 进程内K线存储，由后台采集服务统一刷新，路由只读
+candle_store = CandleStore(max_candles=1000)
+# K线持久化到本地SQLite，重启后从本地恢复，只向上游补拉增量；BITGET_DB 可指定路径，设为空字符串则禁用
+db_path = os.environ.get('BITGET_DB', DEFAULT_DB_PATH)
+candle_db = CandleDatabase(db_path) if db_path else None
+# 设置 BITGET_ARCHIVE_DIR 后已收盘的K线同时追加到列式归档（长期历史，可直接映射为NumPy数组分析）
+archive_dir = os.environ.get('BITGET_ARCHIVE_DIR')
+candle_archive = CandleArchive(archive_dir) if archive_dir else None
+ingestion_service = IngestionService(bitget_service, candle_store, technical_analysis,
+                                     database=candle_db, archive=candle_archive,
+                                     streaming_analysis=True)
+
+# 设置 BITGET_COLD_DIR 后范围查询同时读取已封存到压缩冷存储的历史（见 ColdStorage.seal_from_database）
+cold_dir = os.environ.get('BITGET_COLD_DIR')
+cold_storage = ColdStorage(cold_dir) if cold_dir else None
+
+# 缺口检测与修复：定期扫描各序列缺失的K线并向历史接口补拉
+gap_repair = GapRepairService(ingestion_service)
+
+# 多币对批量分析在进程池中并行计算，BITGET_ANALYSIS_WORKERS 指定进程数（默认CPU核数）
+# 单次批量分析最多的币对数，BITGET_BATCH_MAX_SYMBOLS 可调整
+BATCH_MAX_SYMBOLS = int(os.environ.get('BITGET_BATCH_MAX_SYMBOLS', '200'))
+batch_analysis = BatchAnalysisService(technical_analysis,
+                                      max_workers=int(os.environ.get('BITGET_ANALYSIS_WORKERS', '0')) or None)
+
+# 时间范围查询：本地数据优先，只对缺口请求上游
+range_query = CandleRangeQuery(candle_store, bitget_service, database=candle_db, archive=candle_archive,
+                               cold_storage=cold_storage, repair=ingestion_service.apply_repair)
+
+# 设置环境变量 BITGET_WS=1 启用WebSocket实时推送（需安装 websocket-client），断线期间自动回退到REST轮询
+ws_client = None
+if os.environ.get('BITGET_WS') == '1':
+    ws_client = BitgetWebSocketClient(candle_store, ingestion_service,
+                                      proxy=bitget_service.proxies.get('https'))
+
+def _freshness(series, granularity: str):
+    """数据年龄（毫秒）及是否过期；上游故障期间继续返回最后一次成功获取的数据"""
+    age = max(0, int(time.time() * 1000) - series['fetched_at'])
+    return age, age > ingestion_service.stale_after_ms(granularity)
+
+def _load_series(symbol: str, granularity: str):
+    """从存储读取数据，首次访问时完成冷启动，拉取成功后才登记采集和实时订阅"""
+    gap_repair.start()
+    if not ingestion_service.ensure_series(symbol, granularity):
+        return None
+    if ws_client is not None:
+        # 3m~1D 由1分钟数据本地合成，只订阅1分钟K线
+        ws_client.subscribe_candles(symbol, ingestion_service.upstream_granularity(granularity))
+        ws_client.subscribe_ticker(symbol)
+        ws_client.start()
+    return candle_store.get(symbol, granularity)
+
+def _bad_request(error: str):
+    return jsonify({
+        'success': False,
+        'error': error
+    }), 400
+
+def _unsupported_granularity(granularity: str):
+    """不支持的粒度返回400响应，否则返回None"""
+    if granularity in ingestion_service.SUPPORTED_GRANULARITIES:
+        return None
+    return _bad_request(f"不支持的K线粒度: {granularity}")
+
+def _stream_range(symbol: str, granularity: str, start: int, end: int):
+    """分块流式输出时间范围内的K线，大范围查询无需在内存中拼出完整响应"""
+    def generate():
+        yield '{"success": true, "data": ['
+        first = True
+        for chunk in range_query.iter_range(symbol, granularity, start, end):
+            body = json.dumps(chunk.to_rows())[1:-1]
+            if body:
+                yield body if first else ',' + body
+                first = False
+        yield '], "start": %d, "end": %d, "timestamp": %d}' % (start, end, int(time.time() * 1000))
+    
+    return Response(generate(), mimetype='application/json')
+
+def _parse_fields():
+    """解析 fields 参数，返回 (字段列表或None, 未知字段)"""
+    fields = request.args.get('fields')
+    fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+    return fields, [f for f in fields or () if f not in SECTION_DEPENDENCIES]
+
+def _unknown_fields_response(unknown):
+    return _bad_request(f"未知的分析字段: {', '.join(unknown)}，可选: {', '.join(SECTION_DEPENDENCIES)}")
 
 @crypto_bp.route('/klines', methods=['GET'])
 def get_klines():
-    """获取K线数据"""
+    """获取K线数据；指定 start/end（毫秒时间戳）时按时间范围查询"""
     try:
-        symbol = request.args.get('symbol', 'ETHUSDT')
+        symbol = request.args.get('symbol', 'ETHUSDT').strip().upper()
         granularity = request.args.get('granularity', '1m')
-        limit = request.args.get('limit', '1000')
+        try:
+            limit = int(request.args.get('limit', '1000'))
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            return _bad_request('limit 必须为正整数')
+        error = _unsupported_granularity(granularity)
+        if error:
+            return error
         
-        # 获取K线数据
-        klines = bitget_service.get_klines(symbol, granularity, limit)
+        if request.args.get('start') is not None:
+            try:
+                start = int(request.args['start'])
+                end = int(request.args.get('end', int(time.time() * 1000)))
+            except ValueError:
+                return _bad_request('start/end 必须为毫秒时间戳')
+            if start > end:
+                return _bad_request('start 不能晚于 end')
+            return _stream_range(symbol, granularity, start, end)
         
-        if klines:
-            # 更新全局数据
-            latest_data['klines'] = klines
-            latest_data['last_update'] = int(time.time() * 1000)
-            
+        # 从存储获取K线数据
+        series = _load_series(symbol, granularity)
+        
+        if series and series['klines']:
+            age, stale = _freshness(series, granularity)
             return jsonify({
                 'success': True,
-                'data': klines,
-                'timestamp': latest_data['last_update']
+                'data': series['klines'][-limit:].to_rows(),
+                'timestamp': series['last_update'],
+                'data_age_ms': age,
+                'stale': stale
             })
         else:
             return jsonify({
@@ -53,25 +160,25 @@ def get_klines():
 
 @crypto_bp.route('/analysis', methods=['GET'])
 def get_technical_analysis():
-    """获取技术分析数据"""
+    """获取技术分析数据，fields 参数（逗号分隔，如 moving_averages,pivot_points）只返回并计算指定部分"""
     try:
-        symbol = request.args.get('symbol', 'ETHUSDT')
+        symbol = request.args.get('symbol', 'ETHUSDT').strip().upper()
+        fields, unknown = _parse_fields()
+        if unknown:
+            return _unknown_fields_response(unknown)
         
-        # 如果没有K线数据，先获取
-        if not latest_data['klines']:
-            klines = bitget_service.get_klines(symbol, '1m', '1000')
-            latest_data['klines'] = klines
+        # 技术分析按序列版本缓存，没有新数据时直接返回上次的结果；各部分在首次请求时才计算
+        series = _load_series(symbol, '1m')
+        analysis = ingestion_service.get_analysis(symbol, '1m') if series else None
         
-        if latest_data['klines']:
-            # 进行技术分析
-            analysis = technical_analysis.analyze(latest_data['klines'])
-            latest_data['analysis'] = analysis
-            latest_data['last_update'] = int(time.time() * 1000)
-            
+        if analysis is not None:
+            age, stale = _freshness(series, '1m')
             return jsonify({
                 'success': True,
-                'data': analysis,
-                'timestamp': latest_data['last_update']
+                'data': analysis.to_dict(fields),
+                'timestamp': series['last_update'],
+                'data_age_ms': age,
+                'stale': stale
             })
         else:
             return jsonify({
@@ -85,31 +192,127 @@ def get_technical_analysis():
             'error': str(e)
         }), 500
 
+@crypto_bp.route('/levels', methods=['GET'])
+def get_levels():
+    """按多个回看长度（lookbacks，逗号分隔的K线数）获取斐波那契回撤和枢轴点"""
+    try:
+        symbol = request.args.get('symbol', 'ETHUSDT').strip().upper()
+        granularity = request.args.get('granularity', '1m')
+        error = _unsupported_granularity(granularity)
+        if error:
+            return error
+        try:
+            lookbacks = [int(v) for v in request.args.get('lookbacks', '24,100').split(',') if v.strip()]
+        except ValueError:
+            lookbacks = []
+        if not lookbacks or len(lookbacks) > 50 or min(lookbacks) < 1:
+            return jsonify({
+                'success': False,
+                'error': 'lookbacks 应为1~50个正整数，逗号分隔'
+            }), 400
+
+        # 各回看长度的区间最高/最低价由序列的范围索引直接查询，不重新扫描K线
+        series = _load_series(symbol, granularity)
+        levels = ingestion_service.get_levels(symbol, granularity, lookbacks) if series else None
+
+        if levels is not None:
+            age, stale = _freshness(series, granularity)
+            return jsonify({
+                'success': True,
+                'data': levels,
+                'timestamp': series['last_update'],
+                'data_age_ms': age,
+                'stale': stale
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'error': '无法获取分析数据'
+            }), 500
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@crypto_bp.route('/batch_analysis', methods=['GET'])
+def get_batch_analysis():
+    """
+    批量获取多个币对的技术分析（symbols 逗号分隔），在进程池中并行计算，
+    各币对的结果按完成顺序流式输出；fields 参数同 /analysis
+    """
+    try:
+        symbols = list(dict.fromkeys(s.strip().upper() for s in request.args.get('symbols', '').split(',')
+                                     if s.strip()))
+        granularity = request.args.get('granularity', '1m')
+        fields, unknown = _parse_fields()
+        if not symbols:
+            return _bad_request('缺少 symbols 参数')
+        if len(symbols) > BATCH_MAX_SYMBOLS:
+            return _bad_request(f'symbols 最多 {BATCH_MAX_SYMBOLS} 个')
+        if unknown:
+            return _unknown_fields_response(unknown)
+        error = _unsupported_granularity(granularity)
+        if error:
+            return error
+        
+        # 已在采集的序列直接读取存储，其余并发向上游拉取一次，不登记后台采集
+        series = {}
+        failed = []
+        for symbol, klines in ingestion_service.read_or_fetch_many(symbols, granularity).items():
+            if klines:
+                series[symbol] = klines
+            else:
+                failed.append(symbol)
+        
+        def generate():
+            yield '{"success": true, "data": {'
+            first = True
+            for symbol, analysis in batch_analysis.analyze_many(series, fields):
+                body = '%s: %s' % (json.dumps(symbol), json.dumps(analysis))
+                yield body if first else ',' + body
+                first = False
+            yield '}, "failed": %s, "timestamp": %d}' % (json.dumps(failed), int(time.time() * 1000))
+        
+        return Response(generate(), mimetype='application/json')
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @crypto_bp.route('/latest', methods=['GET'])
 def get_latest_data():
     """获取最新的综合数据"""
     try:
-        symbol = request.args.get('symbol', 'ETHUSDT')
+        symbol = request.args.get('symbol', 'ETHUSDT').strip().upper()
         
-        # 获取最新K线数据
-        klines = bitget_service.get_klines(symbol, '1m', '100')
+        # 从存储获取最新K线数据
+        series = _load_series(symbol, '1m')
         
-        if klines:
-            # 进行技术分析
-            analysis = technical_analysis.analyze(klines)
+        if series and series['klines']:
+            klines = series['klines']
+            age, stale = _freshness(series, '1m')
             
-            # 更新全局数据
-            latest_data['klines'] = klines
-            latest_data['analysis'] = analysis
-            latest_data['last_update'] = int(time.time() * 1000)
+            analysis = ingestion_service.get_analysis(symbol, '1m')
+            
+            # 优先使用ticker推送的最新成交价，否则取最新收盘价
+            current_price = klines.close[-1]
+            ticker = candle_store.get_ticker(symbol)
+            if ticker and ticker['ts'] >= klines.timestamp[-1]:
+                current_price = ticker['price']
             
             return jsonify({
                 'success': True,
                 'data': {
-                    'klines': klines[-50:],  # 只返回最近50条K线
-                    'analysis': analysis,
-                    'current_price': float(klines[-1][4]) if klines else 0,  # 最新收盘价
-                    'timestamp': latest_data['last_update']
+                    'klines': klines[-50:].to_rows(),  # 只返回最近50条K线
+                    'analysis': analysis.to_dict() if analysis is not None else {},
+                    'current_price': current_price,
+                    'timestamp': series['last_update'],
+                    'data_age_ms': age,
+                    'stale': stale
                 }
             })
         else:
@@ -124,13 +327,46 @@ def get_latest_data():
             'error': str(e)
         }), 500
 
+@crypto_bp.route('/tickers', methods=['GET'])
+def get_tickers():
+    """批量获取最新价格（自选列表），多个币对用逗号分隔"""
+    try:
+        symbols = [s.strip() for s in request.args.get('symbols', 'ETHUSDT').split(',') if s.strip()]
+        product_type = request.args.get('productType', 'usdt-futures')
+        
+        # 缓存未命中时一次全量ticker请求覆盖所有币对
+        prices = bitget_service.get_latest_prices(symbols, product_type)
+        
+        return jsonify({
+            'success': True,
+            'data': prices,
+            'timestamp': int(time.time() * 1000)
+        })
+            
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @crypto_bp.route('/status', methods=['GET'])
 def get_status():
     """获取服务状态"""
     return jsonify({
         'success': True,
         'status': 'running',
-        'last_update': latest_data['last_update'],
-        'has_data': len(latest_data['klines']) > 0
+        'last_update': candle_store.last_update(),
+        'has_data': any(candle_store.has_data(*key) for key in candle_store.keys()),
+        'ingestion_running': ingestion_service.is_running(),
+        'series': [f'{symbol}:{granularity}' for symbol, granularity in candle_store.keys()],
+        'upstream': {
+            'coalescing': bitget_service.get_coalesce_stats(),
+            'throttled': bitget_service.throttled_requests,
+            'circuit_breaker': bitget_service.circuit_breaker.get_stats()
+        },
+        'analysis_cache': ingestion_service.analysis_cache.get_stats(),
+        'gap_repair': gap_repair.get_stats(),
+        'batch_analysis': batch_analysis.get_stats(),
+        'completeness': gap_repair.get_metrics(),
+        'websocket': ws_client.get_stats() if ws_client is not None else None
     })
-
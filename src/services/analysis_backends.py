@@ -0,0 +1,155 @@
+from typing import Dict, List, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:  # numpy 为可选依赖，缺失时只使用纯Python后端
+    np = None
+
+from src.services.candle_columns import CandleColumns
+
+
+class PythonAnalysisBackend:
+    """
+    纯Python计算后端：直接在 array / memoryview 列上逐个元素计算
+
+    各指标只使用最近几百根K线，输入较少时没有转换数组和调用NumPy的固定开销。
+    """
+
+    name = 'python'
+
+    def prepare(self, klines: Union[CandleColumns, List[List]]) -> CandleColumns:
+        return CandleColumns.from_rows(klines)
+
+    def moving_averages(self, closes: Sequence[float], periods: Sequence[int]) -> Dict[int, float]:
+        """各周期最近 period 根收盘价的均值（数据不足的周期不返回）"""
+        return {period: sum(closes[-period:]) / period for period in periods if len(closes) >= period}
+
+    def extremes(self, highs: Sequence[float], lows: Sequence[float],
+                 lookback: int) -> Tuple[float, float, int, int]:
+        """
+        最近 lookback 根K线的最高价、最低价及其在窗口内首次出现的位置
+
+        Returns:
+            (最高价, 最低价, 最高价位置, 最低价位置)
+        """
+        highs = highs[-lookback:]
+        lows = lows[-lookback:]
+        # 列可能是不支持 index 的 memoryview 视图
+        high_idx = max(range(len(highs)), key=highs.__getitem__)
+        low_idx = min(range(len(lows)), key=lows.__getitem__)
+        return highs[high_idx], lows[low_idx], high_idx, low_idx
+
+    def regression(self, closes: Sequence[float], lookback: int) -> Tuple[int, int, float, float, int, float, float]:
+        """
+        最近 lookback 根收盘价对位置的线性回归累加量
+
+        Returns:
+            (n, sum_x, sum_y, sum_xy, sum_x2, 最高收盘价, 最低收盘价)
+        """
+        closes = closes[-lookback:]
+        n = len(closes)
+        sum_x = sum(range(n))
+        sum_y = sum(closes)
+        sum_xy = sum(i * closes[i] for i in range(n))
+        sum_x2 = sum(i * i for i in range(n))
+        return n, sum_x, sum_y, sum_xy, sum_x2, max(closes), min(closes)
+
+    def local_extremes(self, highs: Sequence[float], lows: Sequence[float], lookback: int,
+                       width: int = 2) -> Tuple[List[float], List[float]]:
+        """
+        最近 lookback 根K线中的局部高点和低点（严格高于/低于左右各 width 根），按时间顺序
+
+        Returns:
+            (局部高点价格, 局部低点价格)
+        """
+        highs = highs[-lookback:]
+        lows = lows[-lookback:]
+        offsets = [offset for offset in range(-width, width + 1) if offset]
+        resistance, support = [], []
+        for i in range(width, len(highs) - width):
+            high = highs[i]
+            low = lows[i]
+            if all(high > highs[i + offset] for offset in offsets):
+                resistance.append(high)
+            if all(low < lows[i + offset] for offset in offsets):
+                support.append(low)
+        return resistance, support
+
+
+class NumpyAnalysisBackend(PythonAnalysisBackend):
+    """
+    NumPy向量化计算后端：列以零拷贝方式映射为数组，均线由一次累加求得，
+    局部高低点用滑动窗口整体比较，回归量用闭式求和。适合较长的序列和列式归档数据。
+    """
+
+    name = 'numpy'
+
+    def prepare(self, klines: Union[CandleColumns, List[List], Dict]) -> CandleColumns:
+        if isinstance(klines, dict):
+            # 列式归档返回的 {列名: 数组}
+            return CandleColumns(*(np.asarray(klines[name]) for name in CandleColumns.FIELDS))
+        return CandleColumns(*CandleColumns.from_rows(klines).to_numpy().values())
+
+    def moving_averages(self, closes: 'np.ndarray', periods: Sequence[int]) -> Dict[int, float]:
+        periods = [period for period in periods if len(closes) >= period]
+        if not periods:
+            return {}
+        # 从最新一根向前累加，第 period-1 项即为最近 period 根之和
+        sums = np.cumsum(closes[::-1][:max(periods)])
+        return {period: float(sums[period - 1]) / period for period in periods}
+
+    def extremes(self, highs: 'np.ndarray', lows: 'np.ndarray', lookback: int) -> Tuple[float, float, int, int]:
+        highs = highs[-lookback:]
+        lows = lows[-lookback:]
+        # argmax / argmin 返回首次出现的位置
+        high_idx = int(np.argmax(highs))
+        low_idx = int(np.argmin(lows))
+        return float(highs[high_idx]), float(lows[low_idx]), high_idx, low_idx
+
+    def regression(self, closes: 'np.ndarray', lookback: int) -> Tuple[int, int, float, float, int, float, float]:
+        closes = closes[-lookback:]
+        n = len(closes)
+        return (n, n * (n - 1) // 2, float(closes.sum()), float(np.dot(np.arange(n, dtype=np.float64), closes)),
+                (n - 1) * n * (2 * n - 1) // 6, float(closes.max()), float(closes.min()))
+
+    def local_extremes(self, highs: 'np.ndarray', lows: 'np.ndarray', lookback: int,
+                       width: int = 2) -> Tuple[List[float], List[float]]:
+        highs = highs[-lookback:]
+        lows = lows[-lookback:]
+        if len(highs) < 2 * width + 1:
+            return [], []
+        neighbors = np.r_[0:width, width + 1:2 * width + 1]
+        high_windows = sliding_window_view(highs, 2 * width + 1)
+        low_windows = sliding_window_view(lows, 2 * width + 1)
+        is_high = (high_windows[:, width:width + 1] > high_windows[:, neighbors]).all(axis=1)
+        is_low = (low_windows[:, width:width + 1] < low_windows[:, neighbors]).all(axis=1)
+        return highs[width:len(highs) - width][is_high].tolist(), lows[width:len(lows) - width][is_low].tolist()
+
+
+PYTHON_BACKEND = PythonAnalysisBackend()
+NUMPY_BACKEND = NumpyAnalysisBackend() if np is not None else None
+
+# 至少这么多根K线时自动选择NumPy后端（实测约50根时两者耗时相当，更多时NumPy更快）
+NUMPY_MIN_CANDLES = 64
+
+
+def select_backend(size: int, preference: str = 'auto') -> PythonAnalysisBackend:
+    """
+    选择计算后端
+
+    Args:
+        size: K线数量
+        preference: 'auto'（按数量和可用依赖自动选择）、'python' 或 'numpy'
+    """
+    if preference == 'python':
+        return PYTHON_BACKEND
+    if preference == 'numpy':
+        if NUMPY_BACKEND is None:
+            raise ImportError("NumPy后端需要安装 numpy")
+        return NUMPY_BACKEND
+    if preference != 'auto':
+        raise ValueError(f"未知的分析后端: {preference}")
+    if NUMPY_BACKEND is not None and size >= NUMPY_MIN_CANDLES:
+        return NUMPY_BACKEND
+    return PYTHON_BACKEND
@@ -0,0 +1,60 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Tuple
+
+
+class AnalysisCache:
+    """
+    技术分析结果缓存，键为 (币对, 粒度, 分析引擎配置)，值为某个序列版本上的分析结果
+
+    序列版本号未变化（没有新K线或价格变化）时直接返回上次的结果对象，不再重新计算；
+    每个键只保留最新版本的结果，旧版本不会再被请求。调用方不应修改返回的结果。
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        Args:
+            max_entries: 最多缓存的序列数，超过时淘汰最久未使用的
+        """
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Tuple, Tuple[int, Dict]]' = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get_or_compute(self, symbol: str, granularity: str, config: Hashable, version: int,
+                       compute: Callable[[], Dict]) -> Dict:
+        """
+        返回指定版本的分析结果，缓存未命中时调用 compute 计算并缓存
+
+        Args:
+            config: 分析引擎配置（如 analyzer.cache_key()），配置不同的结果分别缓存
+            version: 序列版本号（CandleStore.version）
+        """
+        key = (symbol, granularity, config)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[1]
+            self.stats['misses'] += 1
+
+        result = compute()
+        with self._lock:
+            current = self._entries.get(key)
+            # 并发计算时不用较旧版本的结果覆盖较新的
+            if current is None or current[0] <= version:
+                self._entries[key] = (version, result)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+        return result
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
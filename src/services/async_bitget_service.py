@@ -0,0 +1,167 @@
+import asyncio
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp 为可选依赖，仅异步客户端需要
+    aiohttp = None
+
+from src.services.bitget_service import BitgetService
+from src.services.rate_limiter import RateLimiter, default_rate_limiter
+
+
+class AsyncBitgetService:
+    """基于asyncio的Bitget API服务类，使用有界连接池和keep-alive长连接"""
+
+    def __init__(self, proxy: Optional[str] = "http://127.0.0.1:7890",
+                 pool_size: int = 20, request_timeout: float = 10.0,
+                 keepalive_timeout: float = 30.0, rate_limiter: Optional[RateLimiter] = None):
+        """
+        Args:
+            proxy: HTTP代理地址，None表示直连
+            pool_size: 连接池上限，同时也是最大并发请求数
+            request_timeout: 单个请求的超时时间（秒）
+            keepalive_timeout: 空闲连接保持时间（秒）
+            rate_limiter: 限流器，默认与同步客户端共享额度
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncBitgetService 需要安装 aiohttp")
+
+        self.base_url = "https://api.bitget.com"
+        self.proxy = proxy
+        self.pool_size = pool_size
+        self.request_timeout = request_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.rate_limiter = rate_limiter or default_rate_limiter
+        self.headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': 'ETH-Trading-Dashboard/1.0'
+        }
+        self._session: Optional['aiohttp.ClientSession'] = None
+
+    async def __aenter__(self) -> 'AsyncBitgetService':
+        await self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _get_session(self) -> 'aiohttp.ClientSession':
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+            )
+        return self._session
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _make_request(self, endpoint: str, params: Dict = None,
+                            timeout: Optional[float] = None) -> Optional[Dict]:
+        """发起API请求"""
+        session = await self._get_session()
+        url = f"{self.base_url}{endpoint}"
+        # 未指定本次超时时不传 timeout，使用会话默认的 request_timeout（传入None会关闭超时）
+        kwargs = {'timeout': aiohttp.ClientTimeout(total=timeout)} if timeout is not None else {}
+
+        # 令牌不足时让出事件循环而不是阻塞线程
+        while not self.rate_limiter.try_acquire(endpoint):
+            await asyncio.sleep(max(0.01, self.rate_limiter.wait_time(endpoint)))
+
+        try:
+            async with session.get(url, params=params, proxy=self.proxy, **kwargs) as response:
+                text = await response.text()
+                if response.status == 200:
+                    return json.loads(text)
+                print(f"API请求失败: {response.status} - {text}")
+                return None
+
+        except asyncio.TimeoutError:
+            print(f"请求超时: {endpoint}")
+            return None
+        except aiohttp.ClientError as e:
+            print(f"网络请求错误: {e}")
+            return None
+        except json.JSONDecodeError as e:
+            print(f"JSON解析错误: {e}")
+            return None
+
+    async def get_klines(self, symbol: str = "ETHUSDT", granularity: str = "1m",
+                         limit: str = "1000", product_type: str = "usdt-futures",
+                         start_time: Optional[int] = None,
+                         timeout: Optional[float] = None) -> List[List]:
+        """
+        获取K线数据，参数与返回值同 BitgetService.get_klines
+
+        Args:
+            timeout: 本次请求的超时时间（秒），为空时使用 request_timeout
+        """
+        endpoint = "/api/v2/mix/market/candles"
+        params = BitgetService.build_klines_params(symbol, granularity, limit, product_type, start_time)
+        response = await self._make_request(endpoint, params, timeout)
+        return BitgetService.parse_klines_response(response)
+
+    async def get_klines_many(self, series: Iterable[Tuple[str, str]], limit: str = "1000",
+                              product_type: str = "usdt-futures") -> Dict[Tuple[str, str], List[List]]:
+        """
+        并发获取多个币对/粒度的K线，并发数受连接池大小约束
+
+        Args:
+            series: (symbol, granularity) 列表
+
+        Returns:
+            {(symbol, granularity): K线数据列表}
+        """
+        keys = list(dict.fromkeys(series))
+        results = await asyncio.gather(*(
+            self.get_klines(symbol, granularity, limit, product_type) for symbol, granularity in keys
+        ))
+        return dict(zip(keys, results))
+
+    async def get_ticker(self, symbol: str = "ETHUSDT",
+                         product_type: str = "usdt-futures") -> Optional[Dict]:
+        """获取单个币对的ticker，返回格式同 BitgetService.get_ticker"""
+        response = await self._make_request("/api/v2/mix/market/ticker",
+                                            {'symbol': symbol, 'productType': product_type})
+        if not response or response.get('code') != '00000':
+            return None
+        tickers = [t for t in map(BitgetService.parse_ticker, response.get('data') or []) if t]
+        return tickers[0] if tickers else None
+
+    async def get_all_tickers(self, product_type: str = "usdt-futures") -> Dict[str, Dict]:
+        """一次请求获取某产品类型下全部币对的ticker"""
+        response = await self._make_request("/api/v2/mix/market/tickers", {'productType': product_type})
+        if not response or response.get('code') != '00000':
+            return {}
+        tickers = [t for t in map(BitgetService.parse_ticker, response.get('data') or []) if t]
+        return {ticker['symbol']: ticker for ticker in tickers}
+
+    async def get_latest_price(self, symbol: str = "ETHUSDT") -> Optional[float]:
+        """获取最新价格"""
+        ticker = await self.get_ticker(symbol)
+        if ticker:
+            return ticker['price']  # 返回最新成交价
+        return None
+
+    async def test_connection(self) -> bool:
+        """测试API连接"""
+        response = await self._make_request("/api/v2/public/time")
+        return response is not None and response.get('code') == '00000'
+
+    async def get_server_time(self) -> Optional[int]:
+        """获取服务器时间"""
+        response = await self._make_request("/api/v2/public/time")
+        if response and response.get('code') == '00000':
+            return int(response.get('data', 0))
+        return None
@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.services.bitget_service import BitgetService, GRANULARITY_MS
+
+# 回补进度文件默认位置（与数据库放在一起）
+DEFAULT_PROGRESS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                                     'database', 'backfill_progress.json')
+
+
+class BackfillService:
+    """历史K线分页并行回补：按 endTime 向前切分页面，并发拉取、去重后写入本地存储，支持断点续传"""
+
+    PAGE_SIZE = 200  # history-candles 接口单次最多返回200条
+
+    def __init__(self, bitget_service: BitgetService,
+                 sink: Optional[Callable[[str, str, List[List]], None]] = None,
+                 max_workers: int = 8, max_retries: int = 3,
+                 progress_path: Optional[str] = DEFAULT_PROGRESS_PATH):
+        """
+        Args:
+            bitget_service: 上游服务，请求受其共享限流器约束
+            sink: 写入本地存储的回调 sink(symbol, granularity, klines)，每页完成后调用一次
+            max_workers: 并发拉取的页面数
+            max_retries: 单页失败重试次数
+            progress_path: 进度文件路径，为None时不记录进度
+        """
+        self.bitget_service = bitget_service
+        self.sink = sink
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.progress_path = progress_path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def plan_pages(granularity: str, start_time: int, end_time: int,
+                   page_size: int = PAGE_SIZE) -> List[Tuple[int, int]]:
+        """
+        将 [start_time, end_time] 按页切分，从最新一页开始向前排列
+
+        页面边界不对齐到UTC整周期：日线及以上的K线按UTC+8划分（开盘于16:00 UTC），
+        对齐会漏掉区间两端的K线。每页跨度为 page_size 个周期，无论K线起点的偏移是多少，
+        一页内的K线都不超过 page_size 根。
+
+        Returns:
+            [(页起始时间, 页结束时间), ...]，两端均包含
+        """
+        step = GRANULARITY_MS.get(granularity)
+        if step is None:
+            raise ValueError(f"不支持回补的K线粒度: {granularity}")
+
+        span = step * page_size
+
+        pages = []
+        page_end = end_time
+        while page_end >= start_time:
+            page_start = max(start_time, page_end - span + 1)
+            pages.append((page_start, page_end))
+            page_end = page_start - 1
+        return pages
+
+    def backfill(self, symbol: str, granularity: str, start_time: int,
+                 end_time: Optional[int] = None, resume: bool = True) -> Dict:
+        """
+        回补 [start_time, end_time] 区间的历史K线
+
+        Args:
+            symbol: 交易币对，如 ETHUSDT
+            granularity: K线粒度
+            start_time: 起始时间戳（毫秒）
+            end_time: 结束时间戳（毫秒），默认续用未完成任务的结束时间或当前时间
+            resume: 是否跳过进度文件中已完成的页面（已完成页面的数据已经写入 sink）
+
+        Returns:
+            统计信息；未配置 sink 时 'klines' 字段包含去重后的K线
+        """
+        progress = self._load_progress() if resume else {}
+        if end_time is None:
+            # 未指定结束时间时沿用同一起点未完成任务的结束时间，保证可续传
+            prefix = f"{symbol}:{granularity}:{start_time}:"
+            unfinished = [key for key in progress if key.startswith(prefix)]
+            end_time = int(unfinished[0][len(prefix):]) if unfinished else int(time.time() * 1000)
+
+        job_key = f"{symbol}:{granularity}:{start_time}:{end_time}"
+        pages = self.plan_pages(granularity, start_time, end_time)
+        done = set(progress.get(job_key, []))
+        pending = [page for page in pages if page[0] not in done]
+
+        stats = {
+            'pages': len(pages),
+            'skipped': len(pages) - len(pending),
+            'fetched': 0,
+            'failed': 0,
+            'candles': 0,
+            'elapsed': 0.0
+        }
+        collected: Dict[int, List] = {}
+        started = time.time()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='backfill') as executor:
+            futures = {
+                executor.submit(self._fetch_page, symbol, granularity, page_start, page_end): page_start
+                for page_start, page_end in pending
+            }
+            for future in as_completed(futures):
+                page_start = futures[future]
+                try:
+                    klines = future.result()
+                except Exception as e:
+                    print(f"回补页面失败 {symbol} {granularity} {page_start}: {e}")
+                    stats['failed'] += 1
+                    continue
+
+                if self.sink is not None:
+                    self.sink(symbol, granularity, klines)
+                else:
+                    # 相邻页面可能重叠，按时间戳去重
+                    for kline in klines:
+                        collected[kline[0]] = kline
+
+                stats['fetched'] += 1
+                stats['candles'] += len(klines)
+                self._mark_done(job_key, page_start)
+
+        self._compact_progress(job_key, finished=stats['failed'] == 0)
+
+        stats['elapsed'] = round(time.time() - started, 3)
+        if self.sink is None:
+            stats['klines'] = [collected[ts] for ts in sorted(collected)]
+            stats['candles'] = len(stats['klines'])
+        return stats
+
+    def _fetch_page(self, symbol: str, granularity: str, page_start: int, page_end: int) -> List[List]:
+        last_error = None
+        for attempt in range(self.max_retries):
+            try:
+                klines = self.bitget_service.get_history_klines(
+                    symbol, granularity, page_start, page_end, str(self.PAGE_SIZE))
+                return [k for k in klines if page_start <= k[0] <= page_end]
+            except ConnectionError as e:
+                last_error = e
+                time.sleep(0.5 * (2 ** attempt))
+        raise last_error
+
+    def _load_progress(self) -> Dict[str, List[int]]:
+        """进度文件的内容加上追加日志中上次整理之后完成的页面"""
+        if not self.progress_path:
+            return {}
+        progress: Dict[str, List[int]] = {}
+        if os.path.exists(self.progress_path):
+            try:
+                with open(self.progress_path, 'r', encoding='utf-8') as f:
+                    progress = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"回补进度文件读取失败: {e}")
+        log_path = self.progress_path + '.log'
+        if os.path.exists(log_path):
+            try:
+                with open(log_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        # 中断时可能留下写了一半的最后一行，忽略
+                        job_key, sep, page_start = line.rstrip('\n').rpartition(' ')
+                        if line.endswith('\n') and sep:
+                            progress.setdefault(job_key, []).append(int(page_start))
+            except (OSError, ValueError) as e:
+                print(f"回补进度日志读取失败: {e}")
+        return progress
+
+    def _save_progress(self, progress: Dict[str, List[int]]):
+        # 先写临时文件再原子替换，避免中断时损坏进度文件
+        tmp_path = self.progress_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(progress, f)
+        os.replace(tmp_path, self.progress_path)
+
+    def _mark_done(self, job_key: str, page_start: int):
+        # 每页只向日志追加一行，不重写整个进度文件；任务结束时再整理
+        if not self.progress_path:
+            return
+        with self._lock:
+            with open(self.progress_path + '.log', 'a', encoding='utf-8') as f:
+                f.write(f"{job_key} {page_start}\n")
+
+    def _compact_progress(self, job_key: str, finished: bool):
+        """把追加日志合并进进度文件；任务全部完成时删除它的进度"""
+        if not self.progress_path:
+            return
+        with self._lock:
+            log_path = self.progress_path + '.log'
+            if not finished and not os.path.exists(log_path):
+                return
+            progress = self._load_progress()
+            if finished:
+                progress.pop(job_key, None)
+            elif job_key in progress:
+                progress[job_key] = sorted(set(progress[job_key]))
+            self._save_progress(progress)
+            # 进度文件替换完成后再删除日志，中途中断时日志中的页面只是重复记录
+            if os.path.exists(log_path):
+                os.remove(log_path)
@@ -0,0 +1,152 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.services.candle_columns import CandleColumns
+from src.services.simple_technical_analysis import SimpleTechnicalAnalysis
+
+# 工作进程中的分析器（由进程池初始化函数创建）
+_worker_analyzer = None
+
+
+def _init_worker(analyzer):
+    global _worker_analyzer
+    _worker_analyzer = analyzer
+
+
+def _analyze_one(candles: CandleColumns, fields: Optional[List[str]]) -> Dict:
+    # 单独成函数，返回时分析过程中引用共享内存的中间数组随之释放
+    if fields is not None and hasattr(_worker_analyzer, 'analyze_lazy'):
+        return _worker_analyzer.analyze_lazy(candles).to_dict(fields)
+    return _worker_analyzer.analyze(candles)
+
+
+def _analyze_chunk(shm_name: str, items: List[Tuple[str, int, int]],
+                   fields: Optional[List[str]] = None) -> List[Tuple[str, Dict]]:
+    """
+    工作进程：附加共享内存，零拷贝地把各币对的列映射为 memoryview 后逐个分析
+
+    Args:
+        items: [(币对, 在共享内存中的字节偏移, K线数), ...]
+        fields: 只计算并返回的分析部分，None 表示全部
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    results = []
+    try:
+        buf = shm.buf
+        for symbol, offset, rows in items:
+            size = rows * 8
+            columns = [buf[offset + i * size:offset + (i + 1) * size].cast('q' if i == 0 else 'd')
+                       for i in range(len(CandleColumns.FIELDS))]
+            try:
+                results.append((symbol, _analyze_one(CandleColumns(*columns), fields)))
+            except Exception as e:
+                results.append((symbol, {'error': str(e)}))
+            finally:
+                # 关闭共享内存前必须释放所有视图
+                for column in columns:
+                    column.release()
+        del buf
+    finally:
+        shm.close()
+    return results
+
+
+class BatchAnalysisService:
+    """
+    多币对批量技术分析：把各币对分摊到进程池并行计算，绕开GIL
+
+    一批K线按列写入一块共享内存，工作进程按偏移直接映射，不需要序列化K线数据；
+    只有体积很小的分析结果经由管道传回，并按完成顺序逐批返回。
+    """
+
+    def __init__(self, analyzer=None, max_workers: Optional[int] = None, chunks_per_worker: int = 4):
+        """
+        Args:
+            analyzer: 在工作进程中使用的分析器（需可序列化），默认 SimpleTechnicalAnalysis()
+            max_workers: 进程数，默认为CPU核数
+            chunks_per_worker: 每个进程平均分到的任务数，越大结果返回越平滑、调度开销越大
+        """
+        self.analyzer = analyzer if analyzer is not None else SimpleTechnicalAnalysis()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunks_per_worker = chunks_per_worker
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.stats = {'batches': 0, 'symbols': 0, 'errors': 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # 服务进程中有采集等后台线程，不使用 fork 启动工作进程
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = ProcessPoolExecutor(self.max_workers, mp_context=context,
+                                                     initializer=_init_worker, initargs=(self.analyzer,))
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def analyze_many(self, series: Dict[str, CandleColumns],
+                     fields: Optional[List[str]] = None) -> Iterator[Tuple[str, Dict]]:
+        """
+        并行分析多个币对，按完成顺序逐个产出 (币对, 分析结果)
+
+        Args:
+            series: {币对: K线}，调用期间K线不能被修改（如 CandleStore.get 的快照）
+            fields: 只计算并返回的分析部分（见 SECTION_DEPENDENCIES），None 表示全部
+        """
+        series = {symbol: CandleColumns.from_rows(klines) for symbol, klines in series.items() if klines}
+        if not series:
+            return
+
+        # 各币对的7列依次排布在同一块共享内存中
+        layout = []
+        offset = 0
+        for symbol, klines in series.items():
+            layout.append((symbol, offset, len(klines)))
+            offset += len(klines) * 8 * len(CandleColumns.FIELDS)
+
+        shm = shared_memory.SharedMemory(create=True, size=offset)
+        try:
+            for symbol, start, rows in layout:
+                position = start
+                for column in series[symbol].columns():
+                    data = memoryview(column).cast('B')
+                    shm.buf[position:position + len(data)] = data
+                    data.release()
+                    position += rows * 8
+
+            chunk_count = min(len(layout), self.max_workers * self.chunks_per_worker)
+            chunks = [layout[i::chunk_count] for i in range(chunk_count)]
+            executor = self._get_executor()
+            futures = [executor.submit(_analyze_chunk, shm.name, chunk, fields) for chunk in chunks]
+            self.stats['batches'] += 1
+            try:
+                for future in as_completed(futures):
+                    for symbol, analysis in future.result():
+                        self.stats['symbols'] += 1
+                        if 'error' in analysis:
+                            self.stats['errors'] += 1
+                        yield symbol, analysis
+            finally:
+                # 调用方提前停止迭代时，等待已提交的任务结束后再释放共享内存
+                for future in futures:
+                    future.cancel()
+                for future in futures:
+                    if not future.cancelled():
+                        future.exception()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['workers'] = self.max_workers
+        return stats
@@ -1,13 +1,42 @@
 import requests
+import threading
 import time
 import os
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import json
+from src.services.rate_limiter import RateLimiter, default_rate_limiter
+from src.services.candle_columns import CandleColumns
+from src.services.circuit_breaker import CircuitBreaker
+from src.services.transports import transport_from_env
+
+# K线粒度对应的毫秒数（月线长度不固定，不在此列）
+GRANULARITY_MS = {
+    '1m': 60 * 1000,
+    '3m': 3 * 60 * 1000,
+    '5m': 5 * 60 * 1000,
+    '15m': 15 * 60 * 1000,
+    '30m': 30 * 60 * 1000,
+    '1H': 60 * 60 * 1000,
+    '4H': 4 * 60 * 60 * 1000,
+    '6H': 6 * 60 * 60 * 1000,
+    '12H': 12 * 60 * 60 * 1000,
+    '1D': 24 * 60 * 60 * 1000,
+    '3D': 3 * 24 * 60 * 60 * 1000,
+    '1W': 7 * 24 * 60 * 60 * 1000,
+}
+
+class _InFlightCall:
+    """正在进行中的上游请求，供相同参数的并发调用方等待并共享结果"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = []
 
 class BitgetService:
     """Bitget API服务类"""
     
-    def __init__(self, proxy_config: Optional[Dict] = None):
+    def __init__(self, proxy_config: Optional[Dict] = None,
+                 rate_limiter: Optional[RateLimiter] = None, transport=None):
         self.base_url = "https://api.bitget.com"
         self.session = requests.Session()
         self.proxies = {
@@ -24,41 +53,86 @@ class BitgetService:
             'User-Agent': 'ETH-Trading-Dashboard/1.0'
         })
         
-        # 请求限制
-        self.last_request_time = 0
-        self.min_request_interval = 0.1  # 100ms最小间隔
+        # 传输层：默认直接请求上游；可按环境变量或参数替换为录制/回放（见 transports.py）
+        self.transport = transport or transport_from_env(self.session)
+        
+        # 请求限制：按接口的令牌桶，默认与其他实例（包括异步客户端）共享额度
+        self.rate_limiter = rate_limiter or default_rate_limiter
+        self.max_rate_limit_wait = 2.0  # 阻塞模式下最多等待令牌的秒数
+        self.throttled_requests = 0
+        
+        # 熔断：上游（或代理）连续失败后暂停请求，按指数退避探测恢复
+        self.circuit_breaker = CircuitBreaker()
+        
+        # 单飞（single-flight）合并：相同参数的并发K线请求只发起一次上游调用
+        self._inflight_lock = threading.Lock()
+        self._inflight: Dict[tuple, _InFlightCall] = {}
+        self.coalesce_stats = {
+            'requests': 0,       # 可合并请求（K线、ticker）的调用总数
+            'upstream_calls': 0, # 实际发起的上游请求数
+            'coalesced': 0       # 被合并（等待共享结果）的调用数
+        }
+        
+        # 最新价格短时缓存：(product_type, symbol) -> (ticker, 获取时间)
+        self.price_cache_ttl = 1.0
+        self._price_cache_lock = threading.Lock()
+        self._price_cache: Dict[tuple, tuple] = {}
     
-    def _make_request(self, endpoint: str, params: Dict = None) -> Optional[Dict]:
-        """发起API请求"""
+    def _make_request(self, endpoint: str, params: Dict = None,
+                      blocking: bool = True) -> Optional[Dict]:
+        """
+        发起API请求
+        
+        Args:
+            blocking: 额度不足时是否等待令牌；为False时立即返回None，由调用方使用缓存数据
+        """
+        # 熔断期间直接失败，调用方继续使用已有数据
+        if not self.circuit_breaker.allow_request():
+            return None
+        
         try:
             # 请求频率限制
-            current_time = time.time()
-            time_since_last = current_time - self.last_request_time
-            if time_since_last < self.min_request_interval:
-                time.sleep(self.min_request_interval - time_since_last)
+            if blocking:
+                acquired = self.rate_limiter.acquire(endpoint, timeout=self.max_rate_limit_wait)
+            else:
+                acquired = self.rate_limiter.try_acquire(endpoint)
+            if not acquired:
+                self.throttled_requests += 1
+                print(f"请求被限流: {endpoint}")
+                return None
             
             url = f"{self.base_url}{endpoint}"
-            response = self.session.get(url, params=params, timeout=10,proxies=self.proxies)
-            self.last_request_time = time.time()
+            response = self.transport.get(url, params=params, timeout=10, proxies=self.proxies)
             
             if response.status_code == 200:
-                return response.json()
+                data = response.json()
+                self.circuit_breaker.record_success()
+                return data
             else:
                 print(f"API请求失败: {response.status_code} - {response.text}")
+                # 限频和服务端错误计入熔断，参数错误等4xx不计
+                if response.status_code == 429 or response.status_code >= 500:
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.record_success()
                 return None
                 
         except requests.exceptions.RequestException as e:
             print(f"网络请求错误: {e}")
+            self.circuit_breaker.record_failure()
             return None
         except json.JSONDecodeError as e:
             print(f"JSON解析错误: {e}")
+            self.circuit_breaker.record_failure()
             return None
         except Exception as e:
             print(f"未知错误: {e}")
+            self.circuit_breaker.record_failure()
             return None
     
     def get_klines(self, symbol: str = "ETHUSDT", granularity: str = "1m", 
-                   limit: str = "1000", product_type: str = "usdt-futures") -> List[List]:
+                   limit: str = "1000", product_type: str = "usdt-futures",
+                   start_time: Optional[int] = None, blocking: bool = True) -> List[List]:
         """
         获取K线数据
         
@@ -67,13 +141,78 @@ class BitgetService:
             granularity: K线粒度，如 1m, 5m, 1H, 1D
             limit: 返回数据条数，最大1000
             product_type: 产品类型，默认 usdt-futures
+            start_time: 起始时间戳（毫秒，含），用于增量拉取；为空时返回最近 limit 条
+            blocking: 限流额度不足时是否等待；为False时直接返回空列表
         
         Returns:
             K线数据列表，每个元素包含 [时间戳, 开盘价, 最高价, 最低价, 收盘价, 成交量, 成交额]
         """
-        endpoint = "/api/v2/mix/market/candles"
+        key = (symbol, granularity, str(limit), product_type, start_time)
+        result = self._single_flight(key, lambda: self._fetch_klines(
+            symbol, granularity, limit, product_type, start_time, blocking))
+        return list(result)
+    
+    def get_klines_columnar(self, symbol: str = "ETHUSDT", granularity: str = "1m",
+                            limit: str = "1000", product_type: str = "usdt-futures",
+                            start_time: Optional[int] = None, blocking: bool = True) -> CandleColumns:
+        """
+        获取列式K线数据，参数同 get_klines
+        
+        响应直接解码为列式数组，不经过逐行列表；返回对象在并发调用方之间共享，调用方不应修改。
+        """
+        key = ('columnar', symbol, granularity, str(limit), product_type, start_time)
+        
+        def fetch() -> CandleColumns:
+            endpoint = "/api/v2/mix/market/candles"
+            params = self.build_klines_params(symbol, granularity, limit, product_type, start_time)
+            response = self._make_request(endpoint, params, blocking)
+            if response and response.get('code') == '00000':
+                return CandleColumns.from_bitget(response.get('data', []))
+            error_msg = response.get('msg', '未知错误') if response else '请求失败'
+            print(f"获取K线数据失败: {error_msg}")
+            return CandleColumns()
+        
+        return self._single_flight(key, fetch)
+    
+    def _single_flight(self, key: tuple, fetch):
+        """相同 key 的并发调用只执行一次 fetch，其余调用等待并共享结果"""
+        with self._inflight_lock:
+            self.coalesce_stats['requests'] += 1
+            call = self._inflight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlightCall()
+                self._inflight[key] = call
+                self.coalesce_stats['upstream_calls'] += 1
+            else:
+                self.coalesce_stats['coalesced'] += 1
+        
+        if not is_leader:
+            # 等待进行中的请求完成，共享其解析结果
+            call.event.wait()
+            return call.result
         
-        # 构建请求参数
+        try:
+            call.result = fetch()
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            call.event.set()
+        return call.result
+    
+    def _fetch_klines(self, symbol: str, granularity: str, limit: str,
+                      product_type: str, start_time: Optional[int] = None,
+                      blocking: bool = True) -> List[List]:
+        """向上游请求K线数据并解析"""
+        endpoint = "/api/v2/mix/market/candles"
+        params = self.build_klines_params(symbol, granularity, limit, product_type, start_time)
+        response = self._make_request(endpoint, params, blocking)
+        return self.parse_klines_response(response)
+    
+    @staticmethod
+    def build_klines_params(symbol: str, granularity: str, limit: str, product_type: str,
+                            start_time: Optional[int] = None) -> Dict:
+        """构建K线请求参数"""
         params = {
             'symbol': symbol,
             'granularity': granularity,
@@ -84,8 +223,15 @@ class BitgetService:
         # 添加结束时间（当前时间）
         params['endTime'] = str(int(time.time() * 1000))
         
-        response = self._make_request(endpoint, params)
+        # 增量模式：只请求起始时间之后的K线
+        if start_time is not None:
+            params['startTime'] = str(int(start_time))
         
+        return params
+    
+    @staticmethod
+    def parse_klines_response(response: Optional[Dict]) -> List[List]:
+        """解析K线接口响应，返回按时间升序排列的K线列表"""
         if response and response.get('code') == '00000':
             data = response.get('data', [])
             # 转换数据格式，确保数值类型正确
@@ -114,11 +260,161 @@ class BitgetService:
             print(f"获取K线数据失败: {error_msg}")
             return []
     
+    def get_coalesce_stats(self) -> Dict:
+        """获取请求合并统计"""
+        with self._inflight_lock:
+            return dict(self.coalesce_stats)
+    
+    def get_history_klines(self, symbol: str, granularity: str, start_time: int, end_time: int,
+                           limit: str = "200", product_type: str = "usdt-futures") -> List[List]:
+        """
+        获取历史K线数据（可查询超出最近1000条范围的数据）
+        
+        Args:
+            symbol: 交易币对，如 ETHUSDT
+            granularity: K线粒度，如 1m, 5m, 1H, 1D
+            start_time: 起始时间戳（毫秒）
+            end_time: 结束时间戳（毫秒）
+            limit: 返回数据条数，最大200
+            product_type: 产品类型，默认 usdt-futures
+        
+        Returns:
+            K线数据列表，格式同 get_klines
+        
+        Raises:
+            ConnectionError: 请求失败或接口返回错误
+        """
+        endpoint = "/api/v2/mix/market/history-candles"
+        params = {
+            'symbol': symbol,
+            'granularity': granularity,
+            'limit': limit,
+            'productType': product_type,
+            'startTime': str(int(start_time)),
+            'endTime': str(int(end_time))
+        }
+        response = self._make_request(endpoint, params)
+        if not response or response.get('code') != '00000':
+            # 与"该区间确实没有数据"区分开，便于回补任务重试
+            error_msg = response.get('msg', '未知错误') if response else '请求失败'
+            raise ConnectionError(f"获取历史K线失败: {error_msg}")
+        return self.parse_klines_response(response)
+    
+    @staticmethod
+    def parse_ticker(item: Dict) -> Optional[Dict]:
+        """解析ticker接口的单条数据"""
+        try:
+            return {
+                'symbol': item['symbol'],
+                'price': float(item['lastPr']),
+                'bid': float(item['bidPr']) if item.get('bidPr') else None,
+                'ask': float(item['askPr']) if item.get('askPr') else None,
+                'high_24h': float(item['high24h']) if item.get('high24h') else None,
+                'low_24h': float(item['low24h']) if item.get('low24h') else None,
+                'change_24h': float(item['change24h']) if item.get('change24h') else None,
+                'ts': int(item['ts'])
+            }
+        except (KeyError, ValueError, TypeError) as e:
+            print(f"ticker数据格式错误: {e}, 原始数据: {item}")
+            return None
+    
+    def _cache_tickers(self, product_type: str, tickers: List[Dict], missing: List[str] = ()):
+        """写入价格缓存；missing 为确认不存在的币对，同样缓存以免反复请求"""
+        now = time.time()
+        with self._price_cache_lock:
+            for ticker in tickers:
+                self._price_cache[(product_type, ticker['symbol'])] = (ticker, now)
+            for symbol in missing:
+                self._price_cache[(product_type, symbol)] = (None, now)
+    
+    def _cached_ticker(self, product_type: str, symbol: str) -> Tuple[bool, Optional[Dict]]:
+        """返回 (是否命中缓存, ticker)"""
+        with self._price_cache_lock:
+            entry = self._price_cache.get((product_type, symbol))
+        if entry and time.time() - entry[1] <= self.price_cache_ttl:
+            return True, entry[0]
+        return False, None
+    
+    def get_ticker(self, symbol: str = "ETHUSDT",
+                   product_type: str = "usdt-futures") -> Optional[Dict]:
+        """
+        获取单个币对的ticker（最新成交价、买一卖一、24小时高低等）
+        
+        Returns:
+            {'symbol', 'price', 'bid', 'ask', 'high_24h', 'low_24h', 'change_24h', 'ts'}，失败时返回None
+        """
+        hit, cached = self._cached_ticker(product_type, symbol)
+        if hit:
+            return cached
+        
+        def fetch() -> List[Dict]:
+            response = self._make_request("/api/v2/mix/market/ticker",
+                                          {'symbol': symbol, 'productType': product_type})
+            if not response or response.get('code') != '00000':
+                error_msg = response.get('msg', '未知错误') if response else '请求失败'
+                print(f"获取ticker失败: {error_msg}")
+                return []
+            tickers = [t for t in map(self.parse_ticker, response.get('data') or []) if t]
+            self._cache_tickers(product_type, tickers)
+            return tickers
+        
+        tickers = self._single_flight(('ticker', symbol, product_type), fetch)
+        return tickers[0] if tickers else None
+    
+    def get_all_tickers(self, product_type: str = "usdt-futures") -> Dict[str, Dict]:
+        """
+        一次请求获取某产品类型下全部币对的ticker，结果写入价格缓存
+        
+        Returns:
+            {symbol: ticker}
+        """
+        def fetch() -> List[Dict]:
+            response = self._make_request("/api/v2/mix/market/tickers", {'productType': product_type})
+            if not response or response.get('code') != '00000':
+                error_msg = response.get('msg', '未知错误') if response else '请求失败'
+                print(f"获取全部ticker失败: {error_msg}")
+                return []
+            tickers = [t for t in map(self.parse_ticker, response.get('data') or []) if t]
+            self._cache_tickers(product_type, tickers)
+            return tickers
+        
+        tickers = self._single_flight(('tickers', product_type), fetch)
+        return {ticker['symbol']: ticker for ticker in tickers}
+    
+    def get_latest_prices(self, symbols: List[str],
+                          product_type: str = "usdt-futures") -> Dict[str, Optional[float]]:
+        """
+        批量获取最新价格：缓存未命中时只发起一次全量ticker请求，而不是逐个请求
+        
+        Returns:
+            {symbol: 最新价格}，未找到的币对为None
+        """
+        prices = {}
+        missing = []
+        for symbol in symbols:
+            hit, cached = self._cached_ticker(product_type, symbol)
+            if hit:
+                prices[symbol] = cached['price'] if cached else None
+            else:
+                missing.append(symbol)
+        
+        if len(missing) == 1:
+            ticker = self.get_ticker(missing[0], product_type)
+            prices[missing[0]] = ticker['price'] if ticker else None
+        elif missing:
+            tickers = self.get_all_tickers(product_type)
+            if tickers:
+                self._cache_tickers(product_type, [], [s for s in missing if s not in tickers])
+            for symbol in missing:
+                prices[symbol] = tickers[symbol]['price'] if symbol in tickers else None
+        
+        return prices
+    
     def get_latest_price(self, symbol: str = "ETHUSDT") -> Optional[float]:
         """获取最新价格"""
-        klines = self.get_klines(symbol, "1m", "1")
-        if klines:
-            return klines[-1][4]  # 返回最新收盘价
+        ticker = self.get_ticker(symbol)
+        if ticker:
+            return ticker['price']  # 返回最新成交价
         return None
     
     def test_connection(self) -> bool:
@@ -0,0 +1,334 @@
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+try:
+    import websocket
+except ImportError:  # websocket-client 为可选依赖，未安装时仅使用REST轮询
+    websocket = None
+
+from src.services.candle_columns import CandleColumns
+from src.services.candle_store import CandleStore
+from src.services.ingestion_service import IngestionService
+
+
+class BitgetWebSocketClient:
+    """Bitget 公共行情 WebSocket 客户端（K线与ticker频道）"""
+
+    PUBLIC_WS_URL = "wss://ws.bitget.com/v2/ws/public"
+
+    def __init__(self, store: CandleStore, ingestion_service: Optional[IngestionService] = None,
+                 url: str = PUBLIC_WS_URL, inst_type: str = "USDT-FUTURES",
+                 proxy: Optional[str] = None, ping_interval: float = 25.0,
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0,
+                 stable_after: float = 30.0, record_path: Optional[str] = None):
+        """
+        Args:
+            store: 行情写入的K线存储（与路由读取的是同一个）
+            ingestion_service: 用于合并推送K线、刷新分析，以及重连后的REST补数
+            url: WebSocket地址，测试时可指向本地回放服务器
+            inst_type: 产品类型，默认 USDT-FUTURES
+            proxy: HTTP代理地址，如 http://127.0.0.1:7890
+            ping_interval: 心跳间隔（秒），Bitget要求30秒内发送一次ping
+            reconnect_delay: 首次重连等待时间（秒），之后指数退避
+            max_reconnect_delay: 最大重连等待时间（秒）
+            stable_after: 连接保持该时长（秒）后断开才重置退避，连上即断开的连接继续指数退避
+            record_path: 若指定，将收到的原始帧按JSON Lines格式录制到该文件
+        """
+        self.store = store
+        self.ingestion_service = ingestion_service
+        self.url = url
+        self.inst_type = inst_type
+        self.proxy = proxy
+        self.ping_interval = ping_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.stable_after = stable_after
+        self.record_path = record_path
+
+        self._lock = threading.Lock()
+        self._candle_subs: Set[Tuple[str, str]] = set()
+        self._ticker_subs: Set[str] = set()
+        self._streaming: Set[Tuple[str, str]] = set()
+        self._ws = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._record_file = None
+        self._record_start = 0.0
+
+        self.stats = {
+            'connects': 0,
+            'reconnects': 0,
+            'messages': 0,
+            'candle_updates': 0,
+            'ticker_updates': 0,
+            'backfills': 0
+        }
+
+    def subscribe_candles(self, symbol: str, granularity: str):
+        """订阅K线频道，已连接时立即发送订阅"""
+        key = (symbol, granularity)
+        with self._lock:
+            if key in self._candle_subs:
+                return
+            self._candle_subs.add(key)
+        self._send_subscribe([self._candle_arg(symbol, granularity)])
+
+    def subscribe_ticker(self, symbol: str):
+        """订阅ticker频道，已连接时立即发送订阅"""
+        with self._lock:
+            if symbol in self._ticker_subs:
+                return
+            self._ticker_subs.add(symbol)
+        self._send_subscribe([self._ticker_arg(symbol)])
+
+    def start(self) -> bool:
+        """启动后台连接线程，缺少 websocket-client 依赖时返回False"""
+        if websocket is None:
+            print("未安装 websocket-client，WebSocket行情不可用")
+            return False
+
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return True
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='bitget-ws', daemon=True)
+            self._thread.start()
+        return True
+
+    def stop(self, timeout: float = 5.0):
+        """断开连接并停止后台线程"""
+        self._stop_event.set()
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_connected(self) -> bool:
+        return self._ws is not None
+
+    def get_stats(self) -> Dict:
+        """获取连接与消息统计"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['streaming'] = [f'{s}:{g}' for s, g in sorted(self._streaming)]
+        stats['connected'] = self.is_connected()
+        return stats
+
+    def _candle_arg(self, symbol: str, granularity: str) -> Dict:
+        return {'instType': self.inst_type, 'channel': f'candle{granularity}', 'instId': symbol}
+
+    def _ticker_arg(self, symbol: str) -> Dict:
+        return {'instType': self.inst_type, 'channel': 'ticker', 'instId': symbol}
+
+    def _all_args(self) -> List[Dict]:
+        with self._lock:
+            args = [self._candle_arg(s, g) for s, g in sorted(self._candle_subs)]
+            args += [self._ticker_arg(s) for s in sorted(self._ticker_subs)]
+        return args
+
+    def _send_subscribe(self, args: List[Dict]):
+        ws = self._ws
+        if ws is None or not args:
+            return
+        try:
+            ws.send(json.dumps({'op': 'subscribe', 'args': args}))
+        except Exception as e:
+            print(f"WebSocket订阅发送失败: {e}")
+
+    def _connect(self):
+        options = {'timeout': 10}
+        if self.proxy:
+            proxy = urlparse(self.proxy)
+            options.update({
+                'http_proxy_host': proxy.hostname,
+                'http_proxy_port': proxy.port,
+                'proxy_type': 'http'
+            })
+        ws = websocket.create_connection(self.url, **options)
+        ws.settimeout(1.0)
+        return ws
+
+    def _run(self):
+        """
+        连接循环：断线后指数退避重连，重新订阅并通过REST补齐断线期间的K线
+
+        连接保持 stable_after 秒以上才视为恢复正常并重置退避，
+        避免握手成功后立即被断开（如被限流）时以最短间隔反复重连。
+        """
+        delay = self.reconnect_delay
+        connected_before = False
+
+        if self.record_path:
+            self._record_file = open(self.record_path, 'a', encoding='utf-8')
+            self._record_start = time.time()
+
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    self._ws = self._connect()
+                except Exception as e:
+                    print(f"WebSocket连接失败: {e}，{delay:.1f}秒后重试")
+                    self._stop_event.wait(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+                    continue
+
+                connected_at = time.time()
+                with self._lock:
+                    self.stats['connects'] += 1
+                    if connected_before:
+                        self.stats['reconnects'] += 1
+
+                self._send_subscribe(self._all_args())
+                if connected_before:
+                    self._backfill()
+                connected_before = True
+
+                try:
+                    self._receive_loop()
+                except Exception as e:
+                    if not self._stop_event.is_set():
+                        print(f"WebSocket连接中断: {e}")
+                finally:
+                    self._on_disconnect()
+
+                if time.time() - connected_at >= self.stable_after:
+                    delay = self.reconnect_delay
+                if not self._stop_event.is_set():
+                    self._stop_event.wait(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+        finally:
+            if self._record_file is not None:
+                self._record_file.close()
+                self._record_file = None
+
+    def _receive_loop(self):
+        """接收消息并维持心跳，超过两个心跳周期无任何消息视为连接失效"""
+        ws = self._ws
+        last_ping = time.time()
+        last_recv = time.time()
+
+        while not self._stop_event.is_set():
+            now = time.time()
+            if now - last_ping >= self.ping_interval:
+                ws.send('ping')
+                last_ping = now
+            if now - last_recv > self.ping_interval * 2:
+                raise ConnectionError('心跳超时')
+
+            try:
+                raw = ws.recv()
+            except websocket.WebSocketTimeoutException:
+                continue
+
+            if raw is None or raw == '':
+                raise ConnectionError('连接已关闭')
+
+            last_recv = time.time()
+            if raw == 'pong':
+                continue
+            self._record(raw)
+            self._handle_message(raw)
+
+    def _on_disconnect(self):
+        ws = self._ws
+        self._ws = None
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+        # 推送中断期间交还给REST轮询
+        with self._lock:
+            streaming = list(self._streaming)
+            self._streaming.clear()
+        if self.ingestion_service is not None:
+            for symbol, granularity in streaming:
+                self.ingestion_service.set_streaming(symbol, granularity, False)
+
+    def _backfill(self):
+        """重连后通过REST增量拉取断线期间缺失的K线"""
+        if self.ingestion_service is None:
+            return
+        with self._lock:
+            subs = list(self._candle_subs)
+        for symbol, granularity in subs:
+            try:
+                if self.ingestion_service.ingest_once(symbol, granularity):
+                    with self._lock:
+                        self.stats['backfills'] += 1
+            except Exception as e:
+                print(f"重连补数失败 {symbol} {granularity}: {e}")
+
+    def _record(self, raw: str):
+        if self._record_file is None:
+            return
+        entry = {'t': round(time.time() - self._record_start, 3), 'frame': raw}
+        self._record_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._record_file.flush()
+
+    def _handle_message(self, raw: str):
+        """解析推送消息并写入存储"""
+        try:
+            message = json.loads(raw)
+        except json.JSONDecodeError:
+            print(f"WebSocket消息解析错误: {raw[:200]}")
+            return
+
+        if 'event' in message:
+            if message['event'] == 'error':
+                print(f"WebSocket订阅错误: {message.get('msg', message)}")
+            return
+
+        arg = message.get('arg') or {}
+        channel = arg.get('channel', '')
+        symbol = arg.get('instId')
+        data = message.get('data') or []
+        if not symbol or not data:
+            return
+
+        with self._lock:
+            self.stats['messages'] += 1
+
+        if channel.startswith('candle'):
+            self._handle_candles(symbol, channel[len('candle'):], data)
+        elif channel == 'ticker':
+            self._handle_tickers(symbol, data)
+
+    def _handle_candles(self, symbol: str, granularity: str, data: List[List]):
+        # 推送与REST接口的K线行格式相同
+        klines = CandleColumns.from_bitget(data)
+        if not klines:
+            return
+
+        key = (symbol, granularity)
+        if self.ingestion_service is not None:
+            self.ingestion_service.apply_candles(symbol, granularity, klines)
+        else:
+            self.store.merge(symbol, granularity, klines)
+
+        with self._lock:
+            self.stats['candle_updates'] += 1
+            newly_streaming = key not in self._streaming and key in self._candle_subs
+            if newly_streaming:
+                self._streaming.add(key)
+        if newly_streaming and self.ingestion_service is not None:
+            self.ingestion_service.set_streaming(symbol, granularity, True)
+
+    def _handle_tickers(self, symbol: str, data: List[Dict]):
+        for item in data:
+            try:
+                self.store.set_ticker(symbol, float(item['lastPr']), int(item['ts']))
+            except (KeyError, ValueError, TypeError) as e:
+                print(f"ticker数据格式错误: {e}, 原始数据: {item}")
+                continue
+            with self._lock:
+                self.stats['ticker_updates'] += 1
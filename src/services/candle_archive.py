@@ -0,0 +1,218 @@
+import bisect
+import mmap
+import os
+import re
+import struct
+import threading
+from array import array
+from typing import Dict, List, Optional, Union
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，仅读取为数组时需要
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，只能在进程内互斥写入
+    fcntl = None
+
+from src.services.candle_columns import CandleColumns
+
+# 列式归档默认位置（与数据库放在一起）
+DEFAULT_ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'archive')
+
+
+class ArchiveSeries:
+    """
+    单个币对/粒度的列式归档：每列一个定长（8字节，本机字节序）文件，外加记录已提交行数的 length 文件
+
+    追加流程：先把新行写到各列文件已提交长度之后并落盘，最后才更新 length。
+    中途崩溃时 length 仍是旧值，多写的数据会被忽略并在下次追加时覆盖，因此追加是崩溃安全的。
+    读取方通过 mmap 把各列映射为 NumPy 数组，每次读取都重新检查 length，
+    其他进程追加的新行无需重新打开即可看到。
+    """
+
+    COLUMN_TYPES = {'timestamp': 'q', 'open': 'd', 'high': 'd', 'low': 'd',
+                    'close': 'd', 'volume': 'd', 'amount': 'd'}
+    ITEM_SIZE = 8
+    GROW_ROWS = 64 * 1024  # 列文件按此行数为单位预分配，减少重新映射的次数
+
+    _LENGTH = struct.Struct('q')
+
+    def __init__(self, directory: str, durable: bool = True):
+        """
+        Args:
+            directory: 该序列的归档目录
+            durable: 追加后是否 fsync，关闭后速度更快但断电可能丢失最近的追加
+        """
+        self.directory = directory
+        self.durable = durable
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._length_fd = os.open(os.path.join(directory, 'length'), os.O_RDWR | os.O_CREAT, 0o644)
+        self._fds = {name: os.open(os.path.join(directory, f'{name}.col'), os.O_RDWR | os.O_CREAT, 0o644)
+                     for name in CandleColumns.FIELDS}
+        # 读取用的映射：列名 -> (mmap, 映射的字节数)
+        self._maps: Dict[str, tuple] = {}
+
+    def __len__(self) -> int:
+        """已提交的行数"""
+        raw = os.pread(self._length_fd, self._LENGTH.size, 0)
+        return self._LENGTH.unpack(raw)[0] if len(raw) == self._LENGTH.size else 0
+
+    def last_timestamp(self) -> Optional[int]:
+        """最后一根已归档K线的时间戳，无数据时返回None"""
+        length = len(self)
+        if length == 0:
+            return None
+        raw = os.pread(self._fds['timestamp'], self.ITEM_SIZE, (length - 1) * self.ITEM_SIZE)
+        return array('q', raw)[0]
+
+    def append(self, klines: Union[CandleColumns, List[List]]) -> int:
+        """
+        追加K线，只接受晚于已归档最后一根的K线（应传入已收盘的K线）
+
+        Returns:
+            实际追加的行数
+        """
+        klines = CandleColumns.from_rows(klines)
+        if not klines:
+            return 0
+
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._length_fd, fcntl.LOCK_EX)
+            try:
+                length = len(self)
+                last_ts = self.last_timestamp()
+                # 跳过已归档的部分（时间戳升序）
+                start = 0 if last_ts is None else bisect.bisect_right(klines.timestamp, last_ts)
+                count = len(klines) - start
+                if count == 0:
+                    return 0
+
+                offset = length * self.ITEM_SIZE
+                needed = (length + count) * self.ITEM_SIZE
+                for name, column in zip(CandleColumns.FIELDS, klines.columns()):
+                    fd = self._fds[name]
+                    if os.fstat(fd).st_size < needed:
+                        rows = -(-(length + count) // self.GROW_ROWS) * self.GROW_ROWS
+                        os.ftruncate(fd, rows * self.ITEM_SIZE)
+                    os.pwrite(fd, column[start:].tobytes(), offset)
+                    if self.durable:
+                        os.fsync(fd)
+
+                # 数据落盘后再提交长度
+                os.pwrite(self._length_fd, self._LENGTH.pack(length + count), 0)
+                if self.durable:
+                    os.fsync(self._length_fd)
+                return count
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._length_fd, fcntl.LOCK_UN)
+
+    def _column(self, name: str, length: int) -> 'np.ndarray':
+        mapped = self._maps.get(name)
+        if mapped is None or mapped[1] < length * self.ITEM_SIZE:
+            size = os.fstat(self._fds[name]).st_size
+            # 旧映射可能仍被之前返回的数组引用，交给垃圾回收释放
+            mapped = (mmap.mmap(self._fds[name], size, access=mmap.ACCESS_READ), size)
+            self._maps[name] = mapped
+        dtype = np.int64 if self.COLUMN_TYPES[name] == 'q' else np.float64
+        return np.frombuffer(mapped[0], dtype=dtype, count=length)
+
+    def read(self, start_time: Optional[int] = None, end_time: Optional[int] = None) -> Dict[str, 'np.ndarray']:
+        """
+        以零拷贝方式读取 [start_time, end_time] 范围内的各列（两端均包含）
+
+        Returns:
+            {列名: 只读NumPy数组}，可直接传给 TechnicalAnalysis.analyze
+        """
+        if np is None:
+            raise ImportError("读取列式归档需要安装 numpy")
+
+        with self._lock:
+            length = len(self)
+            if length == 0:
+                return {name: np.empty(0, dtype=np.int64 if code == 'q' else np.float64)
+                        for name, code in self.COLUMN_TYPES.items()}
+            columns = {name: self._column(name, length) for name in CandleColumns.FIELDS}
+
+        timestamps = columns['timestamp']
+        lo = 0 if start_time is None else int(np.searchsorted(timestamps, start_time, side='left'))
+        hi = length if end_time is None else int(np.searchsorted(timestamps, end_time, side='right'))
+        if lo == 0 and hi == length:
+            return columns
+        return {name: column[lo:hi] for name, column in columns.items()}
+
+    def close(self):
+        with self._lock:
+            self._maps.clear()
+            for fd in self._fds.values():
+                os.close(fd)
+            os.close(self._length_fd)
+            self._fds = {}
+
+
+class CandleArchive:
+    """按 币对/粒度 组织的列式归档集合，适合多年的1分钟级历史数据"""
+
+    def __init__(self, root: str = DEFAULT_ARCHIVE_DIR, durable: bool = True):
+        self.root = root
+        self.durable = durable
+        self._lock = threading.Lock()
+        self._series: Dict[tuple, ArchiveSeries] = {}
+
+    def series(self, symbol: str, granularity: str) -> ArchiveSeries:
+        """获取（必要时创建）某个币对/粒度的归档"""
+        key = (symbol, granularity)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # 目录名只保留安全字符，避免路径穿越
+                parts = [re.sub(r'[^A-Za-z0-9_-]+', '_', part) for part in key]
+                series = ArchiveSeries(os.path.join(self.root, *parts), self.durable)
+                self._series[key] = series
+            return series
+
+    def append(self, symbol: str, granularity: str, klines: Union[CandleColumns, List[List]]) -> int:
+        """追加已收盘的K线，返回实际追加的行数"""
+        return self.series(symbol, granularity).append(klines)
+
+    def read(self, symbol: str, granularity: str, start_time: Optional[int] = None,
+             end_time: Optional[int] = None) -> Dict[str, 'np.ndarray']:
+        """以零拷贝方式读取某个序列，见 ArchiveSeries.read"""
+        return self.series(symbol, granularity).read(start_time, end_time)
+
+    def import_from_database(self, database, symbol: str, granularity: str,
+                             chunk_size: int = 100000) -> int:
+        """
+        把 CandleDatabase 中晚于归档末尾的K线按时间顺序分批导入归档
+        （历史回补的页面是乱序写入数据库的，不能直接追加到归档）。
+        数据库中最后一根K线可能尚未收盘，不导入。
+
+        Returns:
+            导入的行数
+        """
+        series = self.series(symbol, granularity)
+        until = database.last_timestamp(symbol, granularity)
+        if until is None:
+            return 0
+        last_ts = series.last_timestamp()
+        start = last_ts + 1 if last_ts is not None else None
+
+        imported = 0
+        for klines in database.iter_range(symbol, granularity, start, chunk_size):
+            closed = klines[:bisect.bisect_left(klines.timestamp, until)]
+            imported += series.append(closed)
+            if len(closed) < len(klines):
+                break
+        return imported
+
+    def close(self):
+        with self._lock:
+            for series in self._series.values():
+                series.close()
+            self._series.clear()
@@ -0,0 +1,154 @@
+import operator
+from array import array
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，仅 to_numpy 需要
+    np = None
+
+
+class CandleColumns:
+    """
+    列式K线数据：时间戳/开/高/低/收/成交量/成交额各占一个连续数组
+
+    行为上兼容原来的行列表：len()、下标取行（klines[-1][4]）和切片（klines[-50:]）
+    都可直接使用，分析引擎和路由无需先转换回列表。
+    """
+
+    FIELDS = ('timestamp', 'open', 'high', 'low', 'close', 'volume', 'amount')
+    __slots__ = FIELDS
+
+    def __init__(self, timestamp: Optional[array] = None, open: Optional[array] = None,
+                 high: Optional[array] = None, low: Optional[array] = None,
+                 close: Optional[array] = None, volume: Optional[array] = None,
+                 amount: Optional[array] = None):
+        self.timestamp = timestamp if timestamp is not None else array('q')
+        self.open = open if open is not None else array('d')
+        self.high = high if high is not None else array('d')
+        self.low = low if low is not None else array('d')
+        self.close = close if close is not None else array('d')
+        self.volume = volume if volume is not None else array('d')
+        self.amount = amount if amount is not None else array('d')
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence]) -> 'CandleColumns':
+        """由 [[时间戳, 开, 高, 低, 收, 量, 额], ...] 行数据构建"""
+        if isinstance(rows, CandleColumns):
+            return rows
+        rows = list(rows)
+        if not rows:
+            return cls()
+        transposed = list(zip(*rows))
+        return cls(array('q', map(int, transposed[0])),
+                   *(array('d', map(float, transposed[i])) for i in range(1, 7)))
+
+    @classmethod
+    def from_bitget(cls, data: List[List]) -> 'CandleColumns':
+        """
+        将Bitget接口返回的字符串行直接解码为列式数组
+
+        按列整体转换而不是逐行构造列表；上游已按时间单调排列时跳过排序，
+        遇到格式错误的行时退回逐行解析并跳过该行。
+        """
+        if not data:
+            return cls()
+
+        # 各行长度一致且列数足够时按列整体转换，否则（或遇到非数字内容）逐行解析
+        width = len(data[0])
+        columns = None
+        if width >= 7 and all(len(item) == width for item in data):
+            transposed = list(zip(*data))
+            try:
+                # 先整列转换为列表再装入数组，比逐个追加到数组更快
+                columns = cls(
+                    array('q', list(map(int, transposed[0]))),
+                    *(array('d', list(map(float, transposed[i]))) for i in range(1, 7))
+                )
+            except (ValueError, TypeError):
+                columns = None
+
+        if columns is None:
+            columns = cls()
+            for item in data:
+                try:
+                    row = [int(item[0])] + [float(item[i]) for i in range(1, 7)]
+                except (ValueError, IndexError, TypeError) as e:
+                    print(f"数据格式错误: {e}, 原始数据: {item}")
+                    continue
+                columns.append(row)
+
+        return columns.sorted()
+
+    def sorted(self) -> 'CandleColumns':
+        """返回按时间戳升序排列的数据，已升序或整体倒序时直接在自身上处理"""
+        ts = self.timestamp
+        if all(map(operator.lt, ts, islice(ts, 1, None))):
+            return self
+        if all(map(operator.gt, ts, islice(ts, 1, None))):
+            # 整体倒序（如Bitget按时间倒序返回）时原地反转即可
+            for col in self.columns():
+                col.reverse()
+            return self
+        order = sorted(range(len(ts)), key=ts.__getitem__)
+        return CandleColumns(*(array(col.typecode, map(col.__getitem__, order))
+                               for col in self.columns()))
+
+    def columns(self) -> List[array]:
+        """按 FIELDS 顺序返回各列数组"""
+        return [self.timestamp, self.open, self.high, self.low, self.close, self.volume, self.amount]
+
+    def append(self, row: Sequence):
+        self.timestamp.append(int(row[0]))
+        self.open.append(float(row[1]))
+        self.high.append(float(row[2]))
+        self.low.append(float(row[3]))
+        self.close.append(float(row[4]))
+        self.volume.append(float(row[5]))
+        self.amount.append(float(row[6]))
+
+    def extend(self, other: 'CandleColumns'):
+        for mine, theirs in zip(self.columns(), other.columns()):
+            mine.extend(theirs)
+
+    def row(self, index: int) -> List:
+        """取单行 [时间戳, 开, 高, 低, 收, 量, 额]"""
+        return [col[index] for col in self.columns()]
+
+    def to_rows(self) -> List[List]:
+        """转换为行列表（用于JSON序列化）"""
+        return [list(row) for row in zip(*self.columns())]
+
+    def to_numpy(self) -> Dict[str, 'np.ndarray']:
+        """以零拷贝方式把各列暴露为NumPy数组"""
+        if np is None:
+            raise ImportError("to_numpy 需要安装 numpy")
+        return {
+            'timestamp': np.frombuffer(self.timestamp, dtype=np.int64),
+            **{name: np.frombuffer(getattr(self, name), dtype=np.float64) for name in self.FIELDS[1:]}
+        }
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CandleColumns(*(col[index] for col in self.columns()))
+        return self.row(index)
+
+    def __iter__(self):
+        return (list(row) for row in zip(*self.columns()))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CandleColumns):
+            return NotImplemented
+        return self.columns() == other.columns()
+
+    def __add__(self, other: 'CandleColumns') -> 'CandleColumns':
+        result = CandleColumns(*(array(col.typecode, col) for col in self.columns()))
+        result.extend(CandleColumns.from_rows(other))
+        return result
+
+    def __repr__(self) -> str:
+        return f'<CandleColumns {len(self)} rows>'
@@ -0,0 +1,198 @@
+import os
+import sqlite3
+import threading
+from array import array
+from typing import Iterator, List, Optional, Tuple, Union
+
+from src.services.candle_columns import CandleColumns
+
+# K线数据库默认位置（与应用数据库放在同一目录）
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'candles.db')
+
+
+class CandleDatabase:
+    """
+    K线持久化存储（SQLite，WAL模式）
+
+    以 (symbol, granularity, ts) 为主键，批量写入、按时间范围读取；
+    进程重启后可直接从本地恢复历史序列，只需向上游补拉缺失部分。
+    每个线程使用各自的连接，WAL模式下读写互不阻塞，多个进程也可共用同一文件。
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, batch_size: int = 500):
+        """
+        Args:
+            path: 数据库文件路径
+            batch_size: 批量写入时每个事务包含的最大行数
+        """
+        self.path = path
+        self.batch_size = batch_size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # WAL模式下 NORMAL 已能保证数据库不损坏，只可能丢失最近一次事务
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS candles (
+                    symbol TEXT NOT NULL,
+                    granularity TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    open REAL NOT NULL,
+                    high REAL NOT NULL,
+                    low REAL NOT NULL,
+                    close REAL NOT NULL,
+                    volume REAL NOT NULL,
+                    amount REAL NOT NULL,
+                    PRIMARY KEY (symbol, granularity, ts)
+                ) WITHOUT ROWID
+            ''')
+
+    def upsert(self, symbol: str, granularity: str,
+               klines: Union[CandleColumns, List[List]]) -> int:
+        """
+        批量写入K线，已存在的时间戳覆盖（最后一根K线在收盘前会不断更新）
+
+        签名与 BackfillService 的 sink 一致，可直接作为回补的写入目标。
+
+        Returns:
+            写入的行数
+        """
+        klines = CandleColumns.from_rows(klines)
+        if not klines:
+            return 0
+
+        rows = zip([symbol] * len(klines), [granularity] * len(klines), *klines.columns())
+        conn = self._connect()
+        written = 0
+        while True:
+            batch = list(zip(range(self.batch_size), rows))
+            if not batch:
+                break
+            with conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO candles '
+                    '(symbol, granularity, ts, open, high, low, close, volume, amount) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (row for _, row in batch))
+            written += len(batch)
+        return written
+
+    def read_range(self, symbol: str, granularity: str, start_time: Optional[int] = None,
+                   end_time: Optional[int] = None, limit: Optional[int] = None) -> CandleColumns:
+        """
+        读取 [start_time, end_time] 范围内的K线（两端均包含），按时间升序返回
+
+        Args:
+            limit: 最多返回的条数，超出时保留最新的部分
+        """
+        sql = 'SELECT ts, open, high, low, close, volume, amount FROM candles WHERE symbol = ? AND granularity = ?'
+        params: list = [symbol, granularity]
+        if start_time is not None:
+            sql += ' AND ts >= ?'
+            params.append(start_time)
+        if end_time is not None:
+            sql += ' AND ts <= ?'
+            params.append(end_time)
+        if limit is not None:
+            # 倒序取最新的 limit 条，再翻转为升序
+            sql += ' ORDER BY ts DESC LIMIT ?'
+            params.append(limit)
+        else:
+            sql += ' ORDER BY ts'
+
+        rows = self._connect().execute(sql, params).fetchall()
+        if not rows:
+            return CandleColumns()
+        if limit is not None:
+            rows.reverse()
+        transposed = list(zip(*rows))
+        return CandleColumns(array('q', transposed[0]),
+                             *(array('d', transposed[i]) for i in range(1, 7)))
+
+    def iter_range(self, symbol: str, granularity: str, start_time: Optional[int] = None,
+                   chunk_size: int = 100000, end_time: Optional[int] = None) -> Iterator[CandleColumns]:
+        """按时间升序分批读取 [start_time, end_time]（两端均包含），每批最多 chunk_size 条"""
+        end = end_time if end_time is not None else 2 ** 63 - 1
+        while True:
+            sql = ('SELECT ts, open, high, low, close, volume, amount FROM candles '
+                   'WHERE symbol = ? AND granularity = ? AND ts >= ? AND ts <= ? ORDER BY ts LIMIT ?')
+            start = start_time if start_time is not None else -(2 ** 63)
+            rows = self._connect().execute(sql, (symbol, granularity, start, end, chunk_size)).fetchall()
+            if not rows:
+                return
+            transposed = list(zip(*rows))
+            yield CandleColumns(array('q', transposed[0]),
+                                *(array('d', transposed[i]) for i in range(1, 7)))
+            if len(rows) < chunk_size:
+                return
+            start_time = transposed[0][-1] + 1
+
+    def latest(self, symbol: str, granularity: str, limit: int) -> CandleColumns:
+        """读取最新的 limit 条K线"""
+        return self.read_range(symbol, granularity, limit=limit)
+
+    def last_timestamp(self, symbol: str, granularity: str) -> Optional[int]:
+        """已持久化的最后一根K线时间戳，无数据时返回None"""
+        row = self._connect().execute(
+            'SELECT MAX(ts) FROM candles WHERE symbol = ? AND granularity = ?',
+            (symbol, granularity)).fetchone()
+        return row[0] if row else None
+
+    def count(self, symbol: str, granularity: str) -> int:
+        """某个序列已持久化的K线条数"""
+        row = self._connect().execute(
+            'SELECT COUNT(*) FROM candles WHERE symbol = ? AND granularity = ?',
+            (symbol, granularity)).fetchone()
+        return row[0]
+
+    def delete_range(self, symbol: str, granularity: str, start_time: Optional[int] = None,
+                     end_time: Optional[int] = None) -> int:
+        """删除 [start_time, end_time] 内的K线（如已迁移到冷存储），返回删除的行数"""
+        sql = 'DELETE FROM candles WHERE symbol = ? AND granularity = ?'
+        params: list = [symbol, granularity]
+        if start_time is not None:
+            sql += ' AND ts >= ?'
+            params.append(start_time)
+        if end_time is not None:
+            sql += ' AND ts <= ?'
+            params.append(end_time)
+        conn = self._connect()
+        with conn:
+            return conn.execute(sql, params).rowcount
+
+    def delete_timestamps(self, symbol: str, granularity: str, timestamps) -> int:
+        """删除指定时间戳的K线，返回删除的行数"""
+        conn = self._connect()
+        deleted = 0
+        with conn:
+            for ts in timestamps:
+                deleted += conn.execute(
+                    'DELETE FROM candles WHERE symbol = ? AND granularity = ? AND ts = ?',
+                    (symbol, granularity, int(ts))).rowcount
+        return deleted
+
+    def keys(self) -> List[Tuple[str, str]]:
+        """返回已持久化的 (symbol, granularity) 列表"""
+        return self._connect().execute(
+            'SELECT DISTINCT symbol, granularity FROM candles').fetchall()
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,263 @@
+import bisect
+import threading
+import time
+from array import array
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from src.services.backfill_service import BackfillService
+from src.services.bitget_service import BitgetService, GRANULARITY_MS
+from src.services.candle_archive import CandleArchive
+from src.services.candle_columns import CandleColumns
+from src.services.candle_db import CandleDatabase
+from src.services.cold_storage import ColdStorage
+from src.services.candle_store import CandleStore
+
+
+class CandleRangeQuery:
+    """
+    按时间范围查询K线：优先使用本地数据（冷存储、数据库或列式归档、内存序列），
+    各数据源内均按有序时间戳二分定位；只有本地缺失的区间才向上游补拉，
+    补拉结果写回数据库（未配置数据库时缓存在进程内），落在内存窗口内的部分同时补入内存序列，
+    之后同一范围不再产生上游请求。
+    """
+
+    def __init__(self, store: CandleStore, bitget_service: Optional[BitgetService] = None,
+                 database: Optional[CandleDatabase] = None, archive: Optional[CandleArchive] = None,
+                 cold_storage: Optional[ColdStorage] = None, max_fill_pages: int = 20,
+                 repair: Optional[Callable[[str, str, CandleColumns], int]] = None,
+                 max_cached_candles: int = 100000):
+        """
+        Args:
+            store: 内存K线存储（最新部分）
+            bitget_service: 用于补拉缺口，为None时不访问上游
+            database: 本地数据库（较早的历史）
+            archive: 列式归档，未配置数据库时作为历史数据源
+            cold_storage: 压缩冷存储（已封存的最早部分）
+            max_fill_pages: 单次查询最多向上游补拉的页数（每页200条）
+            repair: 把补拉到的K线补入内存序列的函数 repair(symbol, granularity, klines)，
+                    默认 store.patch；使用采集服务时应传入 IngestionService.apply_repair 以同步分析状态
+            max_cached_candles: 未配置数据库时进程内缓存的补拉K线上限，超出时清空
+        """
+        self.store = store
+        self.bitget_service = bitget_service
+        self.database = database
+        self.archive = archive
+        self.cold_storage = cold_storage
+        self.max_fill_pages = max_fill_pages
+        self.repair = repair if repair is not None else store.patch
+        self.max_cached_candles = max_cached_candles
+
+        # 上游也没有数据的区间（如上线之前），避免重复请求
+        self._lock = threading.Lock()
+        self._empty_ranges: Set[Tuple[str, str, int, int]] = set()
+        # 未配置数据库时：已补拉的K线及已向上游确认过的区间（合并后按时间排列，两端均包含）
+        self._cached: Dict[Tuple[str, str], Dict[int, List]] = {}
+        self._covered: Dict[Tuple[str, str], List[Tuple[int, int]]] = {}
+        self.stats = {'local_candles': 0, 'filled_candles': 0, 'fill_pages': 0, 'cached_candles': 0}
+
+    def iter_range(self, symbol: str, granularity: str, start_time: int, end_time: int,
+                   chunk_size: int = 5000) -> Iterator[CandleColumns]:
+        """
+        按时间升序分块返回 [start_time, end_time]（两端均包含）内的K线
+
+        Yields:
+            每块最多约 chunk_size 条的 CandleColumns
+        """
+        end_time = min(end_time, int(time.time() * 1000))
+        step = GRANULARITY_MS.get(granularity)
+        budget = [self.max_fill_pages]
+        # 下一根应出现的K线时间不早于它，用于发现缺口（不对齐到UTC整周期：日线及以上按UTC+8划分）
+        expected = start_time
+
+        for chunk in self._local_chunks(symbol, granularity, start_time, end_time, chunk_size):
+            self.stats['local_candles'] += len(chunk)
+            if step is None:
+                yield chunk
+                continue
+
+            # 按相邻时间戳之差切分出本地缺口
+            ts = chunk.timestamp
+            begin = 0
+            for i in range(len(ts)):
+                if ts[i] > expected:
+                    if i > begin:
+                        yield chunk[begin:i]
+                    yield from self._fill(symbol, granularity, expected, ts[i] - step, budget)
+                    begin = i
+                expected = ts[i] + step
+            if begin < len(ts):
+                yield chunk[begin:] if begin else chunk
+
+        if step is not None and expected <= end_time:
+            yield from self._fill(symbol, granularity, expected, end_time, budget)
+
+    def query(self, symbol: str, granularity: str, start_time: int, end_time: int) -> CandleColumns:
+        """返回 [start_time, end_time] 内的全部K线"""
+        result = CandleColumns()
+        for chunk in self.iter_range(symbol, granularity, start_time, end_time):
+            result.extend(CandleColumns.from_rows(chunk))
+        return result
+
+    def _local_chunks(self, symbol: str, granularity: str, start_time: int, end_time: int,
+                      chunk_size: int) -> Iterator[CandleColumns]:
+        """依次读取历史数据源和内存序列，内存中已有的部分以内存为准（包含形成中的K线）"""
+        series = self.store.get(symbol, granularity)
+        memory = series['klines'] if series and series['klines'] else None
+        history_end = end_time if memory is None else min(end_time, memory.timestamp[0] - 1)
+
+        if self.cold_storage is not None and start_time <= history_end:
+            sealed_until = self.cold_storage.sealed_until(symbol, granularity)
+            cold_end = min(history_end, sealed_until if sealed_until is not None else start_time - 1)
+            if start_time <= cold_end:
+                cold = self.cold_storage.read(symbol, granularity, start_time, cold_end)
+                if self.database is not None:
+                    # 封存之后补拉的缺口仍在数据库中
+                    patches = self.database.read_range(symbol, granularity, start_time, cold_end)
+                    if patches:
+                        merged = {row[0]: row for row in cold}
+                        merged.update((row[0], row) for row in patches)
+                        cold = CandleColumns.from_rows(merged[ts] for ts in sorted(merged))
+                for offset in range(0, len(cold), chunk_size):
+                    yield cold[offset:offset + chunk_size]
+                start_time = cold_end + 1
+
+        if start_time <= history_end:
+            if self.database is not None:
+                yield from self.database.iter_range(symbol, granularity, start_time, chunk_size, history_end)
+            elif self.archive is not None:
+                columns = self.archive.read(symbol, granularity, start_time, history_end)
+                for offset in range(0, len(columns['timestamp']), chunk_size):
+                    yield CandleColumns(*(
+                        array('q' if name == 'timestamp' else 'd', columns[name][offset:offset + chunk_size].tobytes())
+                        for name in CandleColumns.FIELDS))
+
+        if memory is not None:
+            lo = bisect.bisect_left(memory.timestamp, start_time)
+            hi = bisect.bisect_right(memory.timestamp, end_time)
+            for offset in range(lo, hi, chunk_size):
+                yield memory[offset:min(hi, offset + chunk_size)]
+
+    def _fill(self, symbol: str, granularity: str, start_time: int, end_time: int,
+              budget: list) -> Iterator[CandleColumns]:
+        """向上游补拉本地缺失的 [start_time, end_time]，写回数据库（或进程内缓存）和内存序列"""
+        step = GRANULARITY_MS[granularity]
+        now = int(time.time() * 1000)
+        # 只补拉已收盘（开盘至少一个周期）的K线；形成中的K线由采集服务负责，避免每次查询最新区间都请求上游
+        end_time = min(end_time, now - step)
+        if self.bitget_service is None or start_time > end_time:
+            return
+        key = (symbol, granularity, start_time, end_time)
+        with self._lock:
+            if key in self._empty_ranges:
+                return
+        # 刚收盘的K线上游历史接口可能尚未返回
+        settled = now - 2 * step
+
+        series_key = (symbol, granularity)
+        use_cache = self.database is None
+        missing = [(start_time, end_time)]
+        if use_cache:
+            with self._lock:
+                missing = _subtract(start_time, end_time, self._covered.get(series_key, []))
+
+        filled = {}
+        fetched = []
+        complete = True
+        for missing_start, missing_end in missing:
+            # plan_pages 从最新一页开始排列，补拉时按时间顺序
+            for page_start, page_end in reversed(BackfillService.plan_pages(granularity, missing_start, missing_end)):
+                if budget[0] <= 0:
+                    complete = False
+                    break
+                budget[0] -= 1
+                self.stats['fill_pages'] += 1
+                try:
+                    klines = self.bitget_service.get_history_klines(
+                        symbol, granularity, page_start, page_end, str(BackfillService.PAGE_SIZE))
+                except ConnectionError as e:
+                    print(f"补拉K线缺口失败 {symbol} {granularity} {page_start}: {e}")
+                    complete = False
+                    break
+                # 未确定的部分不计入已确认的区间
+                covered_end = min(page_end, missing_end, settled)
+                if covered_end >= page_start:
+                    fetched.append((max(page_start, missing_start), covered_end))
+                for kline in klines:
+                    if start_time <= kline[0] <= end_time:
+                        filled[kline[0]] = kline
+            if not complete:
+                break
+        self.stats['filled_candles'] += len(filled)
+
+        if use_cache:
+            with self._lock:
+                cached = self._cached.setdefault(series_key, {})
+                if sum(len(rows) for rows in self._cached.values()) + len(filled) > self.max_cached_candles:
+                    self._cached.clear()
+                    self._covered.clear()
+                    cached = self._cached.setdefault(series_key, {})
+                cached.update(filled)
+                self._covered[series_key] = _merge(self._covered.get(series_key, []) + fetched)
+                from_cache = {ts: row for ts, row in cached.items() if start_time <= ts <= end_time}
+            self.stats['cached_candles'] += len(from_cache) - len(filled)
+            filled = from_cache
+
+        if not filled:
+            if complete and end_time <= settled:
+                with self._lock:
+                    if len(self._empty_ranges) >= 10000:
+                        self._empty_ranges.clear()
+                    self._empty_ranges.add(key)
+            return
+
+        klines = CandleColumns.from_rows(filled[ts] for ts in sorted(filled))
+        if self.database is not None:
+            try:
+                self.database.upsert(symbol, granularity, klines)
+            except Exception as e:
+                print(f"补拉K线写入失败 {symbol} {granularity}: {e}")
+        self._repair_memory(symbol, granularity, klines)
+        yield klines
+
+    def _repair_memory(self, symbol: str, granularity: str, klines: CandleColumns):
+        """落在内存窗口内的K线补入内存序列，之后的查询直接从内存读到"""
+        with self.store.view(symbol, granularity) as memory:
+            if not memory:
+                return
+            first, last = memory.timestamp[0], memory.timestamp[-1]
+        lo = bisect.bisect_left(klines.timestamp, first)
+        hi = bisect.bisect_right(klines.timestamp, last)
+        if lo < hi:
+            try:
+                self.repair(symbol, granularity, klines[lo:hi])
+            except Exception as e:
+                print(f"补拉K线补入内存失败 {symbol} {granularity}: {e}")
+
+
+def _merge(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """合并重叠或相邻的闭区间"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract(start: int, end: int, covered: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """[start, end] 中未被 covered（已合并、有序）覆盖的部分"""
+    missing = []
+    for covered_start, covered_end in covered:
+        if covered_end < start:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > start:
+            missing.append((start, covered_start - 1))
+        start = max(start, covered_end + 1)
+        if start > end:
+            return missing
+    missing.append((start, end))
+    return missing
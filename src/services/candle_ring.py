@@ -0,0 +1,160 @@
+import bisect
+from array import array
+from typing import List, Optional, Sequence, Union
+
+from src.services.candle_columns import CandleColumns
+
+
+class CandleRingBuffer:
+    """
+    定长K线环形缓冲区：各列为预分配的 array（时间戳 'q'，其余 'd'），每根K线占56字节
+
+    有效窗口为 [start, end)，追加时 end 后移、超出容量时 start 后移（O(1)），
+    形成中的最后一根K线原地更新（O(1)）。数组末尾预留 slack 行，写满时把窗口整体
+    搬回开头（一次内存拷贝，均摊到每次追加为 O(capacity/slack)），因此窗口始终连续，
+    可以零拷贝地以 memoryview / NumPy 数组的形式交给分析引擎。
+    """
+
+    def __init__(self, capacity: int, slack: Optional[int] = None):
+        """
+        Args:
+            capacity: 最多保留的K线数
+            slack: 预留的追加空间（行），默认为容量的1/8（至少64行）
+        """
+        self.capacity = capacity
+        self.slack = slack if slack is not None else max(64, capacity // 8)
+        size = capacity + self.slack
+        self._columns = [array('q', bytes(8 * size))] + [array('d', bytes(8 * size)) for _ in range(6)]
+        self._start = 0
+        self._end = 0
+        self._snapshot: Optional[CandleColumns] = None
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def nbytes(self) -> int:
+        """缓冲区占用的字节数"""
+        return sum(col.itemsize * len(col) for col in self._columns)
+
+    def last_timestamp(self) -> Optional[int]:
+        return self._columns[0][self._end - 1] if self._end > self._start else None
+
+    def clear(self):
+        self._start = self._end = 0
+        self._snapshot = None
+
+    def _compact(self):
+        """把窗口搬回数组开头，腾出追加空间"""
+        count = self._end - self._start
+        for col in self._columns:
+            col[0:count] = col[self._start:self._end]
+        self._start, self._end = 0, count
+
+    def _write(self, index: int, row: Sequence):
+        cols = self._columns
+        cols[0][index] = int(row[0])
+        for i in range(1, 7):
+            cols[i][index] = float(row[i])
+
+    def append(self, row: Sequence):
+        """追加一根K线，超出容量时丢弃最旧的一根"""
+        if self._end == len(self._columns[0]):
+            self._compact()
+        self._write(self._end, row)
+        self._end += 1
+        if self._end - self._start > self.capacity:
+            self._start += 1
+        self._snapshot = None
+
+    def update_last(self, row: Sequence):
+        """原地更新最后一根（形成中的）K线"""
+        if self._end == self._start:
+            raise IndexError('缓冲区为空')
+        self._write(self._end - 1, row)
+        self._snapshot = None
+
+    def extend(self, klines: Union[CandleColumns, List[List]]):
+        """批量追加按时间升序的K线"""
+        klines = CandleColumns.from_rows(klines)
+        count = len(klines)
+        if count == 0:
+            return
+        if count >= self.capacity:
+            # 超过容量时只保留最新部分，直接整体写入
+            for col, src in zip(self._columns, klines.columns()):
+                col[0:self.capacity] = src[count - self.capacity:]
+            self._start, self._end = 0, self.capacity
+        else:
+            if self._end + count > len(self._columns[0]):
+                # 先丢弃会被挤出窗口的旧数据，再搬回开头
+                self._start = max(self._start, self._end + count - self.capacity)
+                self._compact()
+            for col, src in zip(self._columns, klines.columns()):
+                col[self._end:self._end + count] = src
+            self._end += count
+            self._start = max(self._start, self._end - self.capacity)
+        self._snapshot = None
+
+    def merge(self, klines: Union[CandleColumns, List[List]]) -> bool:
+        """
+        合并增量K线：时间戳不早于新数据首条的旧K线被替换，其余保持不变
+
+        常见情况（更新形成中的K线并追加新K线）只需移动 end 指针并写入新行。
+
+        Returns:
+            数据是否发生变化
+        """
+        klines = CandleColumns.from_rows(klines)
+        if not klines:
+            return False
+
+        timestamps = memoryview(self._columns[0])[self._start:self._end]
+        idx = self._start + bisect.bisect_left(timestamps, klines.timestamp[0])
+        timestamps.release()
+        tail = self.view(self._end - idx) if idx < self._end else CandleColumns()
+        if tail == klines:
+            return False
+
+        self._end = idx
+        self.extend(klines)
+        return True
+
+    def patch(self, klines: Union[CandleColumns, List[List]]) -> int:
+        """
+        按时间戳写入窗口范围内的K线（补齐中间缺失的K线或修正已有K线），不截断之后的数据
+
+        需要重建窗口，开销为 O(容量)，只用于缺口修复等低频操作。
+
+        Returns:
+            新插入的K线数
+        """
+        klines = CandleColumns.from_rows(klines)
+        if not klines or not len(self):
+            return 0
+        window = self.snapshot()
+        first, last = window.timestamp[0], window.timestamp[-1]
+        merged = {row[0]: row for row in window}
+        inserted = 0
+        for row in klines:
+            if first <= row[0] <= last:
+                inserted += row[0] not in merged
+                merged[row[0]] = row
+        self.clear()
+        self.extend(CandleColumns.from_rows(merged[ts] for ts in sorted(merged)))
+        return inserted
+
+    def view(self, n: Optional[int] = None) -> CandleColumns:
+        """
+        最近 n 根（默认全部）K线的零拷贝视图，各列为 memoryview
+
+        视图与缓冲区共享内存，只在下一次写入前有效；需要跨线程或长期持有时使用 snapshot。
+        """
+        start = self._start if n is None else max(self._start, self._end - n)
+        return CandleColumns(*(memoryview(col)[start:self._end] for col in self._columns))
+
+    def snapshot(self) -> CandleColumns:
+        """当前窗口的独立副本；两次写入之间重复调用返回同一个对象（调用方不应修改）"""
+        if self._snapshot is None:
+            self._snapshot = CandleColumns(*(col[self._start:self._end] for col in self._columns))
+        return self._snapshot
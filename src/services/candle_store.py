@@ -0,0 +1,178 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from src.services.candle_columns import CandleColumns
+from src.services.candle_ring import CandleRingBuffer
+
+
+class CandleStore:
+    """
+    进程内K线数据存储（线程安全），所有HTTP路由从这里读取数据
+
+    每个序列保存在定长环形缓冲区中，增量更新原地完成；读取方拿到的是
+    两次写入之间共享的只读快照，采集线程可通过 view() 零拷贝地分析。
+    每个序列带有单调递增的版本号，数据每次变化时加一，可作为分析结果等派生数据的缓存键。
+    """
+
+    def __init__(self, max_candles: int = 1000):
+        self.max_candles = max_candles
+        self._lock = threading.RLock()
+        self._series: Dict[Tuple[str, str], Dict] = {}
+        # 每个序列的写锁：写入与零拷贝视图互斥，不阻塞读取快照
+        self._write_locks: Dict[Tuple[str, str], threading.RLock] = {}
+        # symbol -> {'price', 'ts'}，由行情推送或ticker接口更新
+        self._tickers: Dict[str, Dict] = {}
+
+    def update(self, symbol: str, granularity: str, klines: Union[CandleColumns, List[List]],
+               fetched_at: Optional[int] = None):
+        """
+        写入某个币对/粒度的最新K线
+
+        Args:
+            symbol: 交易币对，如 ETHUSDT
+            granularity: K线粒度，如 1m, 5m, 1H, 1D
+            klines: 按时间升序排列的K线数据（列式或行列表），统一以列式存储
+            fetched_at: 数据从上游获得的时间（毫秒），默认为当前时间；从本地数据库恢复时传入更早的时间
+        """
+        now = int(time.time() * 1000)
+        key = (symbol, granularity)
+        with self._write_lock(key), self._lock:
+            series = self._series.get(key)
+            ring = series['ring'] if series else CandleRingBuffer(self.max_candles)
+            ring.clear()
+            ring.extend(klines)
+            self._series[key] = {
+                'ring': ring,
+                'version': series['version'] + 1 if series else 1,
+                'last_update': now,
+                # 最近一次成功从上游获得数据的时间，用于计算数据年龄
+                'fetched_at': fetched_at if fetched_at is not None else now
+            }
+
+    def merge(self, symbol: str, granularity: str,
+              new_klines: Union[CandleColumns, List[List]]) -> bool:
+        """
+        将增量K线合并进已有序列
+
+        时间戳不早于新数据首条的旧K线会被替换（包括仍在形成中的最后一根），
+        其余旧数据保持不变。
+
+        Returns:
+            序列是否发生变化
+        """
+        if not new_klines:
+            return False
+
+        key = (symbol, granularity)
+        with self._write_lock(key), self._lock:
+            series = self._series.get(key)
+            if series is None or not len(series['ring']):
+                self.update(symbol, granularity, new_klines)
+                return True
+
+            now = int(time.time() * 1000)
+            series['fetched_at'] = now
+            if not series['ring'].merge(new_klines):
+                return False
+            series['version'] += 1
+            series['last_update'] = now
+            return True
+
+    def patch(self, symbol: str, granularity: str,
+              klines: Union[CandleColumns, List[List]]) -> int:
+        """
+        补入序列中间缺失的K线（不影响之后的数据），只处理已有时间范围内的K线
+
+        Returns:
+            新插入的K线数
+        """
+        key = (symbol, granularity)
+        with self._write_lock(key), self._lock:
+            series = self._series.get(key)
+            if series is None:
+                return 0
+            inserted = series['ring'].patch(klines)
+            # 已有的K线也可能被修正，版本号总是前进
+            series['version'] += 1
+            if inserted:
+                series['last_update'] = int(time.time() * 1000)
+            return inserted
+
+    def _write_lock(self, key: Tuple[str, str]) -> threading.RLock:
+        with self._lock:
+            lock = self._write_locks.get(key)
+            if lock is None:
+                lock = self._write_locks[key] = threading.RLock()
+            return lock
+
+    @contextmanager
+    def view(self, symbol: str, granularity: str) -> Iterator[Optional[CandleColumns]]:
+        """
+        零拷贝地访问某个序列（各列为 memoryview），期间该序列的写入会等待
+
+        用法：
+            with store.view('ETHUSDT', '1m') as klines:
+                analysis = analyzer.analyze(klines)
+        """
+        key = (symbol, granularity)
+        with self._write_lock(key):
+            with self._lock:
+                series = self._series.get(key)
+            yield series['ring'].view() if series else None
+
+    def version(self, symbol: str, granularity: str) -> int:
+        """序列的版本号，数据每次变化时加一；序列不存在时为0"""
+        with self._lock:
+            series = self._series.get((symbol, granularity))
+            return series['version'] if series else 0
+
+    def last_timestamp(self, symbol: str, granularity: str) -> Optional[int]:
+        """已存储的最后一根K线时间戳，无数据时返回None"""
+        with self._lock:
+            series = self._series.get((symbol, granularity))
+            if not series:
+                return None
+            return series['ring'].last_timestamp()
+
+    def get(self, symbol: str, granularity: str) -> Optional[Dict]:
+        """获取某个币对/粒度的数据快照，不存在时返回None"""
+        with self._lock:
+            series = self._series.get((symbol, granularity))
+            if series is None:
+                return None
+            snapshot = dict(series)
+            snapshot['klines'] = snapshot.pop('ring').snapshot()
+            return snapshot
+
+    def has_data(self, symbol: str, granularity: str) -> bool:
+        """判断是否已有K线数据"""
+        with self._lock:
+            series = self._series.get((symbol, granularity))
+            return bool(series and len(series['ring']))
+
+    def set_ticker(self, symbol: str, price: float, ts: int):
+        """更新最新成交价"""
+        with self._lock:
+            current = self._tickers.get(symbol)
+            if current is None or ts >= current['ts']:
+                self._tickers[symbol] = {'price': price, 'ts': ts}
+
+    def get_ticker(self, symbol: str) -> Optional[Dict]:
+        """获取最新成交价 {'price', 'ts'}，不存在时返回None"""
+        with self._lock:
+            ticker = self._tickers.get(symbol)
+            return dict(ticker) if ticker else None
+
+    def last_update(self) -> int:
+        """所有序列中最近一次更新的时间戳（毫秒）"""
+        with self._lock:
+            if not self._series:
+                return 0
+            return max(s['last_update'] for s in self._series.values())
+
+    def keys(self) -> List[Tuple[str, str]]:
+        """返回已存储的 (symbol, granularity) 列表"""
+        with self._lock:
+            return list(self._series.keys())
@@ -0,0 +1,93 @@
+import threading
+import time
+from typing import Dict
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后断开，不再请求上游；
+    之后按指数退避的间隔放行单个探测请求，探测成功即恢复
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, base_backoff: float = 1.0,
+                 max_backoff: float = 60.0, probe_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: 连续失败多少次后断开
+            base_backoff: 首次断开后等待探测的秒数
+            max_backoff: 探测间隔上限（秒）
+            probe_timeout: 探测请求迟迟没有结果时，多久后允许下一个探测（秒）
+        """
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.probe_timeout = probe_timeout
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._backoff = base_backoff
+        self._next_probe = 0.0
+        self.stats = {
+            'failures': 0,
+            'short_circuited': 0,
+            'opened': 0,
+            'probes': 0
+        }
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow_request(self) -> bool:
+        """是否允许发起请求；断开期间到达探测时间时只放行一个探测请求"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            # 探测请求未回报结果（如被限流丢弃）时，超时后允许再次探测
+            if now >= self._next_probe:
+                self._state = self.HALF_OPEN
+                self._next_probe = now + self.probe_timeout
+                self.stats['probes'] += 1
+                return True
+            self.stats['short_circuited'] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._backoff = self.base_backoff
+
+    def record_failure(self):
+        with self._lock:
+            self.stats['failures'] += 1
+            self._consecutive_failures += 1
+
+            if self._state == self.HALF_OPEN:
+                # 探测失败，退避时间加倍
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+                self._open()
+            elif self._state == self.CLOSED and self._consecutive_failures >= self.failure_threshold:
+                self._backoff = self.base_backoff
+                self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._next_probe = time.monotonic() + self._backoff
+        self.stats['opened'] += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['state'] = self._state
+            stats['consecutive_failures'] = self._consecutive_failures
+            if self._state == self.OPEN:
+                stats['next_probe_in'] = round(max(0.0, self._next_probe - time.monotonic()), 3)
+        return stats
@@ -0,0 +1,246 @@
+import bisect
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from array import array
+from typing import Dict, List, Optional, Union
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，冷存储编解码需要
+    np = None
+
+from src.services.candle_columns import CandleColumns
+
+# 冷存储默认位置（与数据库放在一起）
+DEFAULT_COLD_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'cold')
+
+
+def encode_chunk(klines: CandleColumns) -> bytes:
+    """
+    压缩一块K线（无损）
+
+    时间戳保存首值、首个差值和二阶差分（固定周期时几乎全为0）；价格等浮点列与前一个值按位异或，
+    相近的数值异或后高位大多为0。两者再按字节重排（同一字节位放在一起）后用zlib压缩。
+    """
+    if np is None:
+        raise ImportError("冷存储需要安装 numpy")
+
+    columns = klines.to_numpy()
+    ts = columns['timestamp']
+    encoded_ts = np.empty_like(ts)
+    encoded_ts[:1] = ts[:1]
+    if len(ts) > 1:
+        deltas = np.diff(ts)
+        encoded_ts[1] = deltas[0]
+        encoded_ts[2:] = np.diff(deltas)
+
+    parts = [struct.pack('<I', len(ts)), _pack(encoded_ts)]
+    for name in CandleColumns.FIELDS[1:]:
+        bits = columns[name].view(np.uint64)
+        xored = bits.copy()
+        xored[1:] ^= bits[:-1]
+        parts.append(_pack(xored))
+    return b''.join(parts)
+
+
+def decode_chunk(data: bytes) -> CandleColumns:
+    """解压 encode_chunk 生成的数据"""
+    if np is None:
+        raise ImportError("冷存储需要安装 numpy")
+
+    count = struct.unpack_from('<I', data, 0)[0]
+    offset = 4
+    encoded_ts, offset = _unpack(data, offset, count, np.int64)
+    ts = encoded_ts.copy()
+    if count > 2:
+        # 由二阶差分还原差值，再还原时间戳
+        ts[1:] = np.cumsum(encoded_ts[1:])
+    ts = np.cumsum(ts) if count > 1 else ts
+
+    columns = [array('q', ts.tobytes())]
+    for _ in CandleColumns.FIELDS[1:]:
+        xored, offset = _unpack(data, offset, count, np.uint64)
+        columns.append(array('d', np.bitwise_xor.accumulate(xored).tobytes()))
+    return CandleColumns(*columns)
+
+
+def _pack(values: 'np.ndarray') -> bytes:
+    shuffled = values.view(np.uint8).reshape(-1, 8).T.tobytes()
+    compressed = zlib.compress(shuffled, 6)
+    return struct.pack('<I', len(compressed)) + compressed
+
+
+def _unpack(data: bytes, offset: int, count: int, dtype) -> tuple:
+    length = struct.unpack_from('<I', data, offset)[0]
+    offset += 4
+    raw = zlib.decompress(data[offset:offset + length])
+    values = np.frombuffer(raw, dtype=np.uint8).reshape(8, count).T.copy().view(dtype).ravel()
+    return values, offset + length
+
+
+class ColdSeries:
+    """
+    单个币对/粒度的冷存储：data 文件顺序存放压缩块，index 文件记录每块的
+    (首个时间戳, 最后时间戳, 偏移, 长度, 行数)，按时间二分查找只解压相关的块。
+
+    先写数据块再追加索引项；中途崩溃时未写入索引的数据块会被忽略并在下次写入时覆盖。
+    """
+
+    _ENTRY = struct.Struct('<qqqqq')
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._data_path = os.path.join(directory, 'data')
+        self._index_path = os.path.join(directory, 'index')
+        self._entries: List[tuple] = []
+        self._first_ts: List[int] = []
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, 'rb') as f:
+            raw = f.read()
+        # 忽略末尾不完整的索引项
+        usable = len(raw) - len(raw) % self._ENTRY.size
+        self._entries = [self._ENTRY.unpack_from(raw, i) for i in range(0, usable, self._ENTRY.size)]
+        self._first_ts = [entry[0] for entry in self._entries]
+
+    def __len__(self) -> int:
+        return sum(entry[4] for entry in self._entries)
+
+    def last_timestamp(self) -> Optional[int]:
+        return self._entries[-1][1] if self._entries else None
+
+    def nbytes(self) -> int:
+        """压缩后占用的字节数"""
+        return sum(entry[3] for entry in self._entries)
+
+    def append(self, klines: Union[CandleColumns, List[List]], chunk_rows: int) -> int:
+        """把晚于已封存末尾的K线压缩成块追加，返回写入的行数"""
+        klines = CandleColumns.from_rows(klines)
+        with self._lock:
+            last_ts = self.last_timestamp()
+            if last_ts is not None:
+                klines = klines[bisect.bisect_right(klines.timestamp, last_ts):]
+            if not klines:
+                return 0
+
+            offset = self._entries[-1][2] + self._entries[-1][3] if self._entries else 0
+            new_entries = []
+            with open(self._data_path, 'r+b' if os.path.exists(self._data_path) else 'w+b') as f:
+                for start in range(0, len(klines), chunk_rows):
+                    chunk = klines[start:start + chunk_rows]
+                    blob = encode_chunk(chunk)
+                    f.seek(offset)
+                    f.write(blob)
+                    new_entries.append((chunk.timestamp[0], chunk.timestamp[-1], offset, len(blob), len(chunk)))
+                    offset += len(blob)
+                f.flush()
+                os.fsync(f.fileno())
+
+            # 数据落盘后再追加索引
+            with open(self._index_path, 'ab') as f:
+                f.truncate(len(self._entries) * self._ENTRY.size)
+                for entry in new_entries:
+                    f.write(self._ENTRY.pack(*entry))
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._entries.extend(new_entries)
+            self._first_ts.extend(entry[0] for entry in new_entries)
+            return len(klines)
+
+    def read(self, start_time: Optional[int] = None, end_time: Optional[int] = None) -> CandleColumns:
+        """读取 [start_time, end_time] 内的K线（两端均包含），只解压涉及的块"""
+        with self._lock:
+            entries = self._entries
+            first = 0 if start_time is None else max(0, bisect.bisect_right(self._first_ts, start_time) - 1)
+            last = len(entries) if end_time is None else bisect.bisect_right(self._first_ts, end_time)
+            selected = [entry for entry in entries[first:last]
+                        if start_time is None or entry[1] >= start_time]
+
+        result = CandleColumns()
+        if not selected:
+            return result
+        with open(self._data_path, 'rb') as f:
+            for _, _, offset, length, _ in selected:
+                f.seek(offset)
+                chunk = decode_chunk(f.read(length))
+                lo = 0 if start_time is None else bisect.bisect_left(chunk.timestamp, start_time)
+                hi = len(chunk) if end_time is None else bisect.bisect_right(chunk.timestamp, end_time)
+                result.extend(chunk[lo:hi] if lo or hi < len(chunk) else chunk)
+        return result
+
+
+class ColdStorage:
+    """
+    已封存K线的压缩冷存储层，按 币对/粒度 组织
+
+    超过一定天数的K线从数据库迁移到这里，体积约为原始 float64 数据的几分之一，
+    按块随机访问，一个月的1分钟K线解压只需数十毫秒。
+    """
+
+    CHUNK_ROWS = 4096
+
+    def __init__(self, root: str = DEFAULT_COLD_DIR, chunk_rows: int = CHUNK_ROWS):
+        self.root = root
+        self.chunk_rows = chunk_rows
+        self._lock = threading.Lock()
+        self._series: Dict[tuple, ColdSeries] = {}
+
+    def series(self, symbol: str, granularity: str) -> ColdSeries:
+        """获取（必要时创建）某个币对/粒度的冷存储"""
+        key = (symbol, granularity)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # 目录名只保留安全字符，避免路径穿越
+                parts = [re.sub(r'[^A-Za-z0-9_-]+', '_', part) for part in key]
+                series = ColdSeries(os.path.join(self.root, *parts))
+                self._series[key] = series
+            return series
+
+    def sealed_until(self, symbol: str, granularity: str) -> Optional[int]:
+        """已封存的最后一根K线时间戳"""
+        return self.series(symbol, granularity).last_timestamp()
+
+    def append(self, symbol: str, granularity: str, klines: Union[CandleColumns, List[List]]) -> int:
+        """封存按时间升序的K线（只接受晚于已封存末尾的部分）"""
+        return self.series(symbol, granularity).append(klines, self.chunk_rows)
+
+    def read(self, symbol: str, granularity: str, start_time: Optional[int] = None,
+             end_time: Optional[int] = None) -> CandleColumns:
+        return self.series(symbol, granularity).read(start_time, end_time)
+
+    def seal_from_database(self, database, symbol: str, granularity: str,
+                           older_than_days: float = 30, delete: bool = True) -> int:
+        """
+        把数据库中早于 older_than_days 天的K线封存到冷存储
+
+        Args:
+            delete: 封存成功后是否从数据库删除这些K线
+
+        Returns:
+            封存的行数
+        """
+        cutoff = int((time.time() - older_than_days * 86400) * 1000)
+        series = self.series(symbol, granularity)
+        last_ts = series.last_timestamp()
+        start = last_ts + 1 if last_ts is not None else None
+
+        sealed = 0
+        for klines in database.iter_range(symbol, granularity, start, self.chunk_rows * 16, cutoff - 1):
+            appended = series.append(klines, self.chunk_rows)
+            sealed += appended
+            if delete and appended:
+                # 只删除本次写入冷存储的时间戳；早于已封存末尾的K线（缺口修复等后来补入的）
+                # 仍保留在数据库中，由范围查询叠加在冷数据之上
+                database.delete_timestamps(symbol, granularity, klines.timestamp[len(klines) - appended:])
+        return sealed
@@ -0,0 +1,215 @@
+import operator
+import threading
+import time
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，缺失时逐个比较相邻时间戳
+    np = None
+
+from src.services.backfill_service import BackfillService
+from src.services.bitget_service import GRANULARITY_MS
+from src.services.candle_columns import CandleColumns
+
+
+def find_gaps(timestamps: Sequence[int], step: int) -> List[Tuple[int, int]]:
+    """
+    在升序时间戳列中查找缺失的K线区间
+
+    Args:
+        timestamps: 升序时间戳（array / memoryview / 列表）
+        step: K线周期（毫秒）
+
+    Returns:
+        [(缺失的第一根K线时间, 缺失的最后一根K线时间), ...]
+    """
+    if len(timestamps) < 2:
+        return []
+    if np is not None:
+        # array / memoryview 零拷贝转换
+        ts = np.asarray(timestamps, dtype=np.int64) if isinstance(timestamps, list) \
+            else np.frombuffer(timestamps, dtype=np.int64)
+        # 相邻时间戳之差超过一个周期的位置即为缺口
+        idx = np.flatnonzero(np.diff(ts) > step)
+        return [(int(ts[i]) + step, int(ts[i + 1]) - step) for i in idx]
+    diffs = map(operator.sub, islice(timestamps, 1, None), timestamps)
+    return [(timestamps[i] + step, timestamps[i + 1] - step)
+            for i, diff in enumerate(diffs) if diff > step]
+
+
+class GapRepairService:
+    """
+    K线缺口检测与自动修复
+
+    后台定期扫描存储中每个序列的时间戳列，发现缺失的K线后排队，按页向历史接口补拉
+    （请求受共享限流器约束，每轮限制页数，不挤占实时采集的额度），补入的K线写回存储和数据库。
+    上游确认没有数据的缺口（如交易所停机）记为无法修复，不再重复请求。
+    """
+
+    def __init__(self, ingestion_service, scan_interval: float = 30.0, max_pages_per_cycle: int = 2):
+        """
+        Args:
+            ingestion_service: 采集服务，补入的K线经由它写入存储、数据库并更新派生周期
+            scan_interval: 扫描间隔（秒）
+            max_pages_per_cycle: 每秒最多补拉的页数
+        """
+        self.ingestion_service = ingestion_service
+        self.store = ingestion_service.store
+        self.bitget_service = ingestion_service.bitget_service
+        self.scan_interval = scan_interval
+        self.max_pages_per_cycle = max_pages_per_cycle
+
+        self._lock = threading.Lock()
+        self._queue: Deque[Tuple[str, str, int, int]] = deque()
+        self._queued: Set[Tuple[str, str, int, int]] = set()
+        # (symbol, granularity) -> 上游确认没有数据的区间列表
+        self._unrepairable: Dict[Tuple[str, str], List[Tuple[int, int]]] = {}
+        self._metrics: Dict[Tuple[str, str], Dict] = {}
+        self.stats = {'scans': 0, 'gaps_found': 0, 'pages': 0, 'repaired_candles': 0}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """启动后台修复线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='gap-repair', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def scan(self, symbol: str, granularity: str) -> List[Tuple[int, int]]:
+        """扫描一个序列，更新完整度指标并把新发现的缺口加入修复队列"""
+        step = GRANULARITY_MS.get(granularity)
+        if step is None:
+            return []
+        with self.store.view(symbol, granularity) as klines:
+            if not klines:
+                return []
+            gaps = find_gaps(klines.timestamp, step)
+            first, last, present = klines.timestamp[0], klines.timestamp[-1], len(klines)
+
+        key = (symbol, granularity)
+        expected = (last - first) // step + 1
+        with self._lock:
+            unrepairable = [gap for gap in gaps if self._is_unrepairable(key, *gap)]
+            missing = sum((end - start) // step + 1 for start, end in gaps)
+            self._metrics[key] = {
+                'expected': expected,
+                'present': present,
+                'missing': missing,
+                'gaps': len(gaps),
+                'unrepairable': len(unrepairable),
+                'completeness': round(present / expected, 6) if expected else 1.0,
+                'scanned_at': int(time.time() * 1000)
+            }
+            for start, end in gaps:
+                job = (symbol, granularity, start, end)
+                if (start, end) in unrepairable or job in self._queued:
+                    continue
+                self._queue.append(job)
+                self._queued.add(job)
+                self.stats['gaps_found'] += 1
+        self.stats['scans'] += 1
+        return gaps
+
+    def scan_all(self):
+        for symbol, granularity in self.store.keys():
+            try:
+                self.scan(symbol, granularity)
+            except Exception as e:
+                print(f"缺口扫描失败 {symbol} {granularity}: {e}")
+
+    def repair_pending(self, max_pages: Optional[int] = None) -> int:
+        """处理队列中的缺口，最多请求 max_pages 页，返回补入的K线数"""
+        budget = self.max_pages_per_cycle if max_pages is None else max_pages
+        repaired = 0
+        while budget > 0:
+            with self._lock:
+                if not self._queue:
+                    break
+                job = self._queue.popleft()
+            symbol, granularity, start, end = job
+            pages = BackfillService.plan_pages(granularity, start, end)
+            if len(pages) > budget:
+                # 本轮额度不足以补完整个缺口：先补最新的几页，剩余部分重新排队
+                pages = pages[:budget]
+                with self._lock:
+                    rest = (symbol, granularity, start, pages[-1][0] - 1)
+                    self._queue.append(rest)
+                    self._queued.add(rest)
+                start = pages[-1][0]
+            budget -= len(pages)
+
+            found: List[List] = []
+            failed = False
+            for page_start, page_end in pages:
+                self.stats['pages'] += 1
+                try:
+                    klines = self.bitget_service.get_history_klines(
+                        symbol, granularity, page_start, page_end, str(BackfillService.PAGE_SIZE))
+                except ConnectionError as e:
+                    print(f"缺口修复请求失败 {symbol} {granularity} {page_start}: {e}")
+                    failed = True
+                    break
+                found.extend(k for k in klines if max(start, page_start) <= k[0] <= min(end, page_end))
+
+            with self._lock:
+                self._queued.discard(job)
+                if failed:
+                    # 请求失败（限流或上游故障）时下次扫描会重新发现该缺口
+                    continue
+                if not found:
+                    self._mark_unrepairable((symbol, granularity), start, end)
+            if found:
+                repaired += self.ingestion_service.apply_repair(symbol, granularity, CandleColumns.from_rows(found))
+
+        self.stats['repaired_candles'] += repaired
+        return repaired
+
+    def _mark_unrepairable(self, key: Tuple[str, str], start: int, end: int):
+        """记录上游没有数据的区间，与相邻或重叠的区间合并"""
+        step = GRANULARITY_MS[key[1]]
+        merged = []
+        for lo, hi in sorted(self._unrepairable.get(key, []) + [(start, end)]):
+            if merged and lo <= merged[-1][1] + step:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+            else:
+                merged.append((lo, hi))
+        self._unrepairable[key] = merged
+
+    def _is_unrepairable(self, key: Tuple[str, str], start: int, end: int) -> bool:
+        return any(lo <= start and end <= hi for lo, hi in self._unrepairable.get(key, []))
+
+    def get_metrics(self) -> Dict[str, Dict]:
+        """各序列的完整度指标 {'symbol:granularity': {...}}"""
+        with self._lock:
+            metrics = {f'{symbol}:{granularity}': dict(m) for (symbol, granularity), m in self._metrics.items()}
+        return metrics
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['queued'] = len(self._queue)
+        return stats
+
+    def _run(self):
+        next_scan = 0.0
+        while not self._stop_event.is_set():
+            if time.time() >= next_scan:
+                self.scan_all()
+                next_scan = time.time() + self.scan_interval
+            try:
+                self.repair_pending()
+            except Exception as e:
+                print(f"缺口修复失败: {e}")
+            self._stop_event.wait(1.0)
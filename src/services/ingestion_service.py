@@ -0,0 +1,383 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from src.services.analysis_cache import AnalysisCache
+from src.services.bitget_service import BitgetService, GRANULARITY_MS
+from src.services.candle_columns import CandleColumns
+from src.services.candle_archive import CandleArchive
+from src.services.candle_db import CandleDatabase
+from src.services.candle_store import CandleStore
+from src.services.lazy_analysis import LazyAnalysis
+from src.services.range_index import CandleRangeIndex
+from src.services.resampler import CandleResampler
+from src.services.simple_technical_analysis import SimpleTechnicalAnalysis
+from src.services.streaming_analysis import StreamingTechnicalAnalysis
+
+
+class IngestionService:
+    """后台K线采集服务：每个币对/粒度按固定间隔只拉取一次上游数据，写入CandleStore"""
+
+    # 各粒度的拉取间隔（秒），未列出的粒度使用 default_interval
+    GRANULARITY_INTERVALS = {
+        '1m': 1.0,
+        '3m': 2.0,
+        '5m': 2.0,
+        '15m': 5.0,
+        '30m': 5.0,
+        '1H': 10.0,
+        '4H': 30.0,
+        '1D': 60.0,
+    }
+    # 上游支持的K线粒度（月线长度不固定，不在 GRANULARITY_MS 中）
+    SUPPORTED_GRANULARITIES = frozenset(GRANULARITY_MS) | {'1M'}
+
+    def __init__(self, bitget_service: BitgetService, store: CandleStore,
+                 analyzer=None, limit: str = "1000", default_interval: float = 10.0,
+                 incremental: bool = True, database: Optional[CandleDatabase] = None,
+                 archive: Optional[CandleArchive] = None, resample: bool = True,
+                 streaming_analysis: bool = False, analysis_cache: Optional[AnalysisCache] = None):
+        self.bitget_service = bitget_service
+        self.store = store
+        self.analyzer = analyzer
+        # 本地持久化：冷启动时先从数据库恢复序列，新数据同步写入
+        self.database = database
+        # 列式归档：已收盘的K线追加到按列存储的长期历史中
+        self.archive = archive
+        # 多周期合成：3m~1D 由1分钟序列本地推导，每个币对只需持续拉取1分钟数据
+        self.resampler = CandleResampler(store) if resample else None
+        # 增量分析：每个序列保留一个有状态引擎，新K线只更新变化的部分（仅支持 SimpleTechnicalAnalysis）
+        self.streaming_analysis = streaming_analysis and isinstance(analyzer, SimpleTechnicalAnalysis)
+        self._engines: Dict[Tuple[str, str], StreamingTechnicalAnalysis] = {}
+        # 区间最值索引：任意回看长度的最高/最低价 O(1) 查询，随新K线增量维护
+        self._range_indexes: Dict[Tuple[str, str], CandleRangeIndex] = {}
+        # 分析结果按序列版本缓存，读取时才计算，版本未变化时直接复用上次的结果
+        self.analysis_cache = analysis_cache if analysis_cache is not None else AnalysisCache()
+        self.limit = limit
+        self.default_interval = default_interval
+        # 增量模式下只请求上次存储之后的K线并合并进已有序列
+        self.incremental = incremental
+
+        self._lock = threading.Lock()
+        # (symbol, granularity) -> 下次应拉取的时间
+        self._watched: Dict[Tuple[str, str], float] = {}
+        # 由WebSocket实时推送的序列，轮询时跳过
+        self._streaming: Set[Tuple[str, str]] = set()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, symbol: str, granularity: str) -> bool:
+        """登记需要采集的币对/粒度，新登记时返回True"""
+        key = (symbol, granularity)
+        with self._lock:
+            if key in self._watched:
+                return False
+            self._watched[key] = 0.0
+            return True
+
+    def set_streaming(self, symbol: str, granularity: str, streaming: bool):
+        """标记序列是否由实时推送维护；推送中断时恢复轮询"""
+        key = (symbol, granularity)
+        with self._lock:
+            if streaming:
+                self._streaming.add(key)
+            else:
+                self._streaming.discard(key)
+                if key in self._watched:
+                    self._watched[key] = 0.0
+
+    def start(self):
+        """启动后台采集线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='candle-ingestion', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台采集线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def ensure_series(self, symbol: str, granularity: str) -> bool:
+        """
+        确保某个币对/粒度已在采集并且存储中有数据
+
+        首次请求时同步拉取一次（冷启动），成功后才登记采集，之后由后台线程负责刷新。
+        不支持的粒度直接返回False。
+        配置了数据库时先从本地恢复序列，只向上游补拉之后的增量。
+        可由1分钟数据合成的周期只在首次请求时拉取一次历史，之后随1分钟序列本地更新。
+        """
+        if granularity not in self.SUPPORTED_GRANULARITIES:
+            return False
+        if self.resampler is not None and self.resampler.can_derive(granularity):
+            if self._ensure_derived(symbol, granularity):
+                return True
+            # 1分钟数据不可用时退回独立轮询
+
+        if not self.store.has_data(symbol, granularity):
+            restored = self.warm_start(symbol, granularity)
+            # 补拉失败时仍可先返回本地数据（按数据年龄标记为过期）
+            if not (self.ingest_once(symbol, granularity) or restored):
+                # 未知币对等拉取不到任何数据的序列不登记采集，避免后台无限轮询
+                return False
+        self.watch(symbol, granularity)
+        self.start()
+        return True
+
+    def read_or_fetch(self, symbol: str, granularity: str) -> Optional[CandleColumns]:
+        """
+        读取序列用于一次性请求（如批量分析）：存储中已有数据时返回快照，
+        否则向上游拉取一次，结果不写入存储，也不登记后台采集。无数据时返回None。
+        """
+        if granularity not in self.SUPPORTED_GRANULARITIES:
+            return None
+        series = self.store.get(symbol, granularity)
+        if series and series['klines']:
+            return series['klines']
+        return self.bitget_service.get_klines_columnar(symbol, granularity, self.limit) or None
+
+    def read_or_fetch_many(self, symbols: Sequence[str], granularity: str,
+                           max_workers: int = 8) -> Dict[str, Optional[CandleColumns]]:
+        """
+        批量版 read_or_fetch：存储中没有的序列在线程池中并发拉取，
+        请求速率仍受上游服务共享限流器约束。单个币对拉取失败时其结果为None。
+        """
+        result: Dict[str, Optional[CandleColumns]] = {}
+        missing = []
+        for symbol in symbols:
+            series = self.store.get(symbol, granularity)
+            if series and series['klines']:
+                result[symbol] = series['klines']
+            else:
+                missing.append(symbol)
+
+        def fetch(symbol: str) -> Optional[CandleColumns]:
+            try:
+                return self.read_or_fetch(symbol, granularity)
+            except Exception as e:
+                print(f"拉取K线失败 {symbol} {granularity}: {e}")
+                return None
+
+        if len(missing) == 1:
+            result[missing[0]] = fetch(missing[0])
+        elif missing:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(missing)),
+                                    thread_name_prefix='read-or-fetch') as executor:
+                result.update(zip(missing, executor.map(fetch, missing)))
+        return {symbol: result[symbol] for symbol in symbols}
+
+    def upstream_granularity(self, granularity: str) -> str:
+        """实际需要向上游订阅的粒度（可合成的周期只订阅1分钟）"""
+        if self.resampler is not None and self.resampler.can_derive(granularity):
+            return CandleResampler.SOURCE_GRANULARITY
+        return granularity
+
+    def _ensure_derived(self, symbol: str, granularity: str) -> bool:
+        """确保派生周期已用上游历史初始化，之后由1分钟序列推导"""
+        if not self.ensure_series(symbol, CandleResampler.SOURCE_GRANULARITY):
+            return False
+        if self.resampler.is_seeded(symbol, granularity):
+            return self.store.has_data(symbol, granularity)
+
+        # 历史部分只拉取一次；上游不可用时使用本地数据库中的历史
+        restored = self.warm_start(symbol, granularity)
+        if not self._ingest_full(symbol, granularity) and not restored:
+            return False
+        if not self.resampler.seed(symbol, granularity):
+            return False
+        with self._lock:
+            # 之前退回独立轮询的序列改为由1分钟数据推导
+            self._watched.pop((symbol, granularity), None)
+        self._derive(symbol)
+        return True
+
+    def _derive(self, symbol: str):
+        """1分钟序列更新后，把推导出的派生周期K线合并进存储"""
+        if self.resampler is None:
+            return
+        for granularity, bars in self.resampler.update(symbol).items():
+            if bars and self.store.merge(symbol, granularity, bars):
+                self._persist(symbol, granularity, bars)
+
+    def warm_start(self, symbol: str, granularity: str) -> bool:
+        """从本地数据库恢复最近的K线到存储，有数据时返回True"""
+        if self.database is None:
+            return False
+        try:
+            klines = self.database.latest(symbol, granularity, self.store.max_candles)
+        except Exception as e:
+            print(f"读取本地K线失败 {symbol} {granularity}: {e}")
+            return False
+        if not klines:
+            return False
+
+        self._discard_state(symbol, granularity)
+        # 数据年龄从最后一根K线算起，未补拉成功前会被标记为过期
+        self.store.update(symbol, granularity, klines, fetched_at=klines.timestamp[-1])
+        return True
+
+    def ingest_once(self, symbol: str, granularity: str) -> bool:
+        """拉取一次K线并写入存储，成功返回True"""
+        last_ts = self.store.last_timestamp(symbol, granularity) if self.incremental else None
+
+        if last_ts is None:
+            return self._ingest_full(symbol, granularity)
+
+        # 增量模式：只拉取最后一根K线（可能仍在形成中）及之后的数据
+        klines = self.bitget_service.get_klines_columnar(symbol, granularity, self.limit, start_time=last_ts)
+        if not klines:
+            return False
+        if klines.timestamp[0] > last_ts:
+            # 新数据与已有序列不衔接（停顿过久），退回全量拉取
+            return self._ingest_full(symbol, granularity)
+        self.apply_candles(symbol, granularity, klines)
+        return True
+
+    def apply_candles(self, symbol: str, granularity: str,
+                      klines: Union[CandleColumns, List[List]]) -> bool:
+        """合并外部推送（如WebSocket）或增量拉取的K线，序列有变化时返回True"""
+        if not self.store.merge(symbol, granularity, klines):
+            return False
+        self._persist(symbol, granularity, klines)
+        if granularity == CandleResampler.SOURCE_GRANULARITY:
+            self._derive(symbol)
+        return True
+
+    def apply_repair(self, symbol: str, granularity: str,
+                     klines: Union[CandleColumns, List[List]]) -> int:
+        """补入序列中间缺失的K线（缺口修复），返回新插入的K线数"""
+        klines = CandleColumns.from_rows(klines)
+        # 补入与丢弃增量状态在同一写锁内完成：否则并发的分析可能用旧状态计算新版本的数据并缓存
+        # patch 即使没有插入也可能修正已有K线并推进版本号，状态总是丢弃
+        with self.store.view(symbol, granularity):
+            inserted = self.store.patch(symbol, granularity, klines)
+            self._discard_state(symbol, granularity)
+        if not inserted:
+            return 0
+        self._persist(symbol, granularity, klines)
+        if self.resampler is not None and granularity == CandleResampler.SOURCE_GRANULARITY:
+            # 受影响的派生周期K线按补齐后的1分钟数据重算
+            for derived, bars in self.resampler.rebuild(symbol, klines.timestamp[0], klines.timestamp[-1]).items():
+                self.store.patch(symbol, derived, bars)
+                self._persist(symbol, derived, bars)
+            self._derive(symbol)
+        return inserted
+
+    def _ingest_full(self, symbol: str, granularity: str) -> bool:
+        """全量拉取最近 limit 条K线并整体替换序列"""
+        klines = self.bitget_service.get_klines_columnar(symbol, granularity, self.limit)
+        if not klines:
+            return False
+
+        self._discard_state(symbol, granularity)
+        self.store.update(symbol, granularity, klines)
+        self._persist(symbol, granularity, klines)
+        if granularity == CandleResampler.SOURCE_GRANULARITY:
+            self._derive(symbol)
+        return True
+
+    def _persist(self, symbol: str, granularity: str, klines: Union[CandleColumns, List[List]]):
+        """写入本地数据库和列式归档；写入失败不影响内存中的数据"""
+        if self.database is not None:
+            try:
+                self.database.upsert(symbol, granularity, klines)
+            except Exception as e:
+                print(f"K线持久化失败 {symbol} {granularity}: {e}")
+
+        if self.archive is not None:
+            series = self.store.get(symbol, granularity)
+            try:
+                # 最后一根K线仍在形成中，只归档之前已收盘的部分
+                if series and len(series['klines']) > 1:
+                    self.archive.append(symbol, granularity, series['klines'][:-1])
+            except Exception as e:
+                print(f"K线归档失败 {symbol} {granularity}: {e}")
+
+    def get_analysis(self, symbol: str, granularity: str) -> Optional[LazyAnalysis]:
+        """
+        当前序列的技术分析结果（各部分在第一次访问时才计算，见 LazyAnalysis）
+
+        序列版本自上次分析后未变化时直接返回缓存的结果，否则重新分析（增量引擎只处理变化的K线）。
+        无数据或未配置分析器时返回None。
+        """
+        if self.analyzer is None:
+            return None
+        key = (symbol, granularity)
+        # 零拷贝地分析环形缓冲区中的序列，期间该序列的写入会等待，版本号与数据一致
+        with self.store.view(symbol, granularity) as klines:
+            if not klines:
+                return None
+            version = self.store.version(symbol, granularity)
+            return self.analysis_cache.get_or_compute(
+                symbol, granularity, self.analyzer.cache_key(), version,
+                lambda: self._analyze(key, klines))
+
+    def _analyze(self, key: Tuple[str, str], klines: CandleColumns) -> LazyAnalysis:
+        if not self.streaming_analysis:
+            if not hasattr(self.analyzer, 'analyze_lazy'):
+                return LazyAnalysis.from_dict(self.analyzer.analyze(klines))
+            # 按需计算时结果对象会在释放视图后才访问数据，改用独立的快照
+            return self.analyzer.analyze_lazy(self.store.get(*key)['klines'])
+        engine = self._engines.get(key)
+        if engine is None:
+            engine = self._engines[key] = StreamingTechnicalAnalysis(self.analyzer)
+        return engine.sync(klines)
+
+    def get_levels(self, symbol: str, granularity: str, lookbacks: Sequence[int]) -> Optional[Dict]:
+        """
+        按多个回看长度计算斐波那契回撤和枢轴点（见 SimpleTechnicalAnalysis.levels_by_lookback）
+
+        各回看长度的区间最值由该序列的 CandleRangeIndex 查询，不重新扫描K线。
+        无数据或分析器不是 SimpleTechnicalAnalysis 时返回None。
+        """
+        if not isinstance(self.analyzer, SimpleTechnicalAnalysis):
+            return None
+        key = (symbol, granularity)
+        with self.store.view(symbol, granularity) as klines:
+            if not klines:
+                return None
+            index = self._range_indexes.get(key)
+            if index is None:
+                index = self._range_indexes[key] = CandleRangeIndex(self.store.max_candles)
+            return self.analyzer.levels_by_lookback(index.sync(klines), lookbacks)
+
+    def _discard_state(self, symbol: str, granularity: str):
+        """序列被整体替换或中间K线被修改后，丢弃按增量维护的分析状态"""
+        self._engines.pop((symbol, granularity), None)
+        self._range_indexes.pop((symbol, granularity), None)
+
+    def stale_after_ms(self, granularity: str) -> int:
+        """数据超过该年龄（毫秒）未刷新即视为过期（连续错过约三次拉取）"""
+        return int(max(5.0, self._interval_for(granularity) * 3) * 1000)
+
+    def _interval_for(self, granularity: str) -> float:
+        return self.GRANULARITY_INTERVALS.get(granularity, self.default_interval)
+
+    def _run(self):
+        """后台循环：依次处理到期的序列"""
+        while not self._stop_event.is_set():
+            now = time.time()
+            with self._lock:
+                due = [key for key, next_time in self._watched.items()
+                       if next_time <= now and key not in self._streaming]
+
+            for symbol, granularity in due:
+                try:
+                    self.ingest_once(symbol, granularity)
+                except Exception as e:
+                    print(f"K线采集失败 {symbol} {granularity}: {e}")
+                with self._lock:
+                    self._watched[(symbol, granularity)] = time.time() + self._interval_for(granularity)
+
+            with self._lock:
+                pending = [t for key, t in self._watched.items() if key not in self._streaming]
+                next_due = min(pending) if pending else now + 1.0
+            self._stop_event.wait(max(0.05, min(1.0, next_due - time.time())))
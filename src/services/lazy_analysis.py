@@ -0,0 +1,86 @@
+import threading
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+# 分析结果的各部分及其依赖的其他部分（按 analyze() 输出的顺序）
+SECTION_DEPENDENCIES: Dict[str, Tuple[str, ...]] = {
+    'current_price': (),
+    'timestamp': (),
+    'moving_averages': ('current_price',),
+    'fibonacci_retracements': (),
+    'pivot_points': (),
+    'trend_lines': (),
+    'support_resistance': (),
+    'optimized_levels': ('current_price', 'fibonacci_retracements', 'pivot_points'),
+}
+
+
+class LazyAnalysis(Mapping):
+    """
+    按需计算的技术分析结果
+
+    各部分在第一次访问时才计算并缓存，依赖的其他部分先自动计算。
+    可以像字典一样按部分名访问，to_dict(fields) 只计算请求的部分（及其依赖）。
+    对象可以在线程间共享，同一部分只计算一次。
+    """
+
+    def __init__(self, compute: Optional[Callable[[str, Dict], object]], error: Optional[str] = None):
+        """
+        Args:
+            compute: compute(部分名, 已计算的部分) -> 该部分的结果
+            error: 无法分析时的错误信息（如数据不足），此时 to_dict 只返回错误
+        """
+        self._compute = compute
+        self.error = error
+        self._lock = threading.RLock()
+        self._sections: Dict[str, object] = {}
+
+    @classmethod
+    def failed(cls, error: str) -> 'LazyAnalysis':
+        return cls(None, error)
+
+    @classmethod
+    def from_dict(cls, analysis: Dict) -> 'LazyAnalysis':
+        """包装已完整计算的结果（用于不支持按需计算的分析器）"""
+        if 'error' in analysis:
+            return cls.failed(analysis['error'])
+        return cls(lambda name, resolved: analysis.get(name))
+
+    def __getitem__(self, name: str):
+        if self.error is not None or name not in SECTION_DEPENDENCIES:
+            raise KeyError(name)
+        with self._lock:
+            if name not in self._sections:
+                for dependency in SECTION_DEPENDENCIES[name]:
+                    self[dependency]
+                self._sections[name] = self._compute(name, self._sections)
+            return self._sections[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(() if self.error is not None else SECTION_DEPENDENCIES)
+
+    def __len__(self) -> int:
+        return 0 if self.error is not None else len(SECTION_DEPENDENCIES)
+
+    def computed(self) -> Tuple[str, ...]:
+        """已计算的部分"""
+        with self._lock:
+            return tuple(self._sections)
+
+    def to_dict(self, fields: Optional[Iterable[str]] = None) -> Dict:
+        """
+        转换为普通字典（用于JSON序列化）
+
+        Args:
+            fields: 需要的部分，None 表示全部
+
+        Raises:
+            KeyError: 包含未知的部分名
+        """
+        if self.error is not None:
+            return {'error': self.error}
+        names = SECTION_DEPENDENCIES if fields is None else list(fields)
+        unknown = [name for name in names if name not in SECTION_DEPENDENCIES]
+        if unknown:
+            raise KeyError(', '.join(unknown))
+        return {name: self[name] for name in names}
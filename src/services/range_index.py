@@ -0,0 +1,168 @@
+import bisect
+from array import array
+from typing import List, Sequence, Tuple, Union
+
+from src.services.candle_columns import CandleColumns
+
+
+class RangeExtremaIndex:
+    """
+    稀疏表：O(1) 查询任意区间的最大（或最小）值及其首次出现的位置
+
+    第 k 层第 j 项为区间 [j, j+2^k-1] 内最值的下标。追加一个值只需为每层补上以它结尾的一项，
+    修改最后一个值也只重算每层的最后一项，均为 O(log n)。查询把区间拆成两个可重叠的 2^k 区间
+    取较优者，相等时取较早的下标，与 max(range(n), key=...) 的结果一致。
+    """
+
+    __slots__ = ('is_max', 'values', '_levels')
+
+    def __init__(self, is_max: bool):
+        self.is_max = is_max
+        self.values: List[float] = []
+        self._levels: List[List[int]] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _pick(self, left: int, right: int) -> int:
+        """left 在 right 之前，right 严格更优时才选 right"""
+        values = self.values
+        if self.is_max:
+            return right if values[right] > values[left] else left
+        return right if values[right] < values[left] else left
+
+    def load(self, values: Sequence[float]):
+        """由完整序列构建（O(n log n)）"""
+        self.values = list(values)
+        size = len(self.values)
+        self._levels = [list(range(size))] if size else []
+        width = 2
+        while width <= size:
+            prev, half = self._levels[-1], width // 2
+            self._levels.append([self._pick(prev[j], prev[j + half]) for j in range(size - width + 1)])
+            width *= 2
+
+    def append(self, value: float):
+        self.values.append(value)
+        end = len(self.values) - 1
+        if not self._levels:
+            self._levels.append([])
+        self._levels[0].append(end)
+        k = 1
+        while (1 << k) <= end + 1:
+            if k == len(self._levels):
+                self._levels.append([])
+            self._levels[k].append(self._combine(k, end))
+            k += 1
+
+    def replace_last(self, value: float):
+        self.values[-1] = value
+        end = len(self.values) - 1
+        for k in range(1, len(self._levels)):
+            self._levels[k][-1] = self._combine(k, end)
+
+    def _combine(self, k: int, end: int) -> int:
+        """以 end 结尾、长度 2^k 的区间由第 k-1 层的两半合并"""
+        prev, half = self._levels[k - 1], 1 << (k - 1)
+        return self._pick(prev[end - 2 * half + 1], prev[end - half + 1])
+
+    def query(self, start: int, end: int) -> int:
+        """区间 [start, end]（两端包含）内最值首次出现的下标"""
+        k = (end - start + 1).bit_length() - 1
+        level = self._levels[k]
+        return self._pick(level[start], level[end - (1 << k) + 1])
+
+
+class CandleRangeIndex:
+    """
+    单个K线序列的区间最值索引：最高价的最大值、最低价的最小值各一张稀疏表
+
+    随新K线和形成中K线的更新增量维护，最近任意 lookback 根K线的最高/最低价及其位置
+    都是 O(1) 查询，同一请求可以对多个回看长度计算斐波那契回撤和枢轴点而不重新扫描K线。
+    只保留最近 capacity 根K线，超过两倍时整体压缩重建一次（均摊 O(log n)）。
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self):
+        self.timestamp = array('q')
+        self.close = array('d')
+        self._highs = RangeExtremaIndex(True)
+        self._lows = RangeExtremaIndex(False)
+
+    def __len__(self) -> int:
+        return min(len(self.timestamp), self.capacity)
+
+    def load(self, klines: Union[CandleColumns, List[List]]):
+        """以完整序列初始化"""
+        klines = CandleColumns.from_rows(klines)[-self.capacity:]
+        self.timestamp = array('q', klines.timestamp)
+        self.close = array('d', klines.close)
+        self._highs.load(klines.high)
+        self._lows.load(klines.low)
+
+    def append(self, candle: Sequence):
+        """追加一根新K线 [时间戳, 开, 高, 低, 收, ...]"""
+        if len(self.timestamp) >= 2 * self.capacity:
+            self._compact()
+        self.timestamp.append(int(candle[0]))
+        self.close.append(float(candle[4]))
+        self._highs.append(float(candle[2]))
+        self._lows.append(float(candle[3]))
+
+    def replace_last(self, candle: Sequence):
+        """更新形成中的最后一根K线"""
+        if not self.timestamp:
+            raise IndexError('序列为空')
+        self.close[-1] = float(candle[4])
+        self._highs.replace_last(float(candle[2]))
+        self._lows.replace_last(float(candle[3]))
+
+    def _compact(self):
+        keep = self.capacity
+        self.timestamp = self.timestamp[-keep:]
+        self.close = self.close[-keep:]
+        self._highs.load(self._highs.values[-keep:])
+        self._lows.load(self._lows.values[-keep:])
+
+    def sync(self, klines: CandleColumns) -> 'CandleRangeIndex':
+        """
+        与存储中的序列同步：从索引最后一根K线的位置起更新尾部，
+        找不到该K线时（如序列被整体替换）重新构建。中间K线被修改时应丢弃索引重建。
+        """
+        ts = klines.timestamp
+        if not len(ts):
+            self.reset()
+            return self
+        start = None
+        if self.timestamp:
+            start = bisect.bisect_left(ts, self.timestamp[-1])
+            if start == len(ts) or ts[start] != self.timestamp[-1]:
+                start = None
+
+        if start is None:
+            self.load(klines)
+        else:
+            self.replace_last(klines.row(start))
+            for i in range(start + 1, len(ts)):
+                self.append(klines.row(i))
+        return self
+
+    def extremes(self, lookback: int) -> Tuple[float, float, int, int]:
+        """
+        最近 lookback 根K线（不足时为全部）的最高价、最低价及其在窗口内首次出现的位置，
+        与 PythonAnalysisBackend.extremes 的结果相同
+
+        Returns:
+            (最高价, 最低价, 最高价位置, 最低价位置)
+        """
+        lookback = min(lookback, len(self))
+        if lookback < 1:
+            raise ValueError('lookback 必须为正数且序列不能为空')
+        end = len(self.timestamp) - 1
+        start = end - lookback + 1
+        high_idx = self._highs.query(start, end)
+        low_idx = self._lows.query(start, end)
+        return self._highs.values[high_idx], self._lows.values[low_idx], high_idx - start, low_idx - start
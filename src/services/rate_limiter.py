@@ -0,0 +1,158 @@
+import os
+import re
+import struct
+import threading
+import time
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，只能在进程内共享
+    fcntl = None
+
+
+class TokenBucket:
+    """线程安全的令牌桶限流器"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量（允许的突发请求数），默认等于 rate
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+
+    def _take(self, tokens: float, tokens_now: float, elapsed: float) -> tuple:
+        """按经过的时间补充令牌并尝试扣减，返回 (剩余令牌, 需等待秒数)"""
+        available = min(self.capacity, tokens_now + elapsed * self.rate)
+        if available >= tokens:
+            return available - tokens, 0.0
+        return available, (tokens - available) / self.rate
+
+    def _reserve(self, tokens: float) -> float:
+        """尝试扣减令牌，成功返回0，否则返回需等待的秒数（不扣减）"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens, wait = self._take(tokens, self._tokens, now - self._last)
+            self._last = now
+            return wait
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """非阻塞获取令牌，令牌不足时立即返回False"""
+        return self._reserve(tokens) == 0.0
+
+    def wait_time(self, tokens: float = 1) -> float:
+        """估算获得令牌还需等待的秒数（不扣减）"""
+        self._reserve(0)  # 仅刷新令牌数
+        with self._lock:
+            deficit = tokens - self._tokens
+        return deficit / self.rate if deficit > 0 else 0.0
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        """阻塞获取令牌，超过 timeout 秒仍未获得时返回False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._reserve(tokens)
+            if wait == 0.0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class FileTokenBucket(TokenBucket):
+    """跨进程共享的令牌桶，状态保存在文件中并通过文件锁互斥（如gunicorn多worker）"""
+
+    _STATE = struct.Struct('dd')  # (剩余令牌, 上次更新时间)
+
+    def __init__(self, path: str, rate: float, capacity: Optional[float] = None):
+        super().__init__(rate, capacity)
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def _reserve(self, tokens: float) -> float:
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                # 使用墙上时间，保证不同进程之间可比较
+                now = time.time()
+                raw = os.pread(self._fd, self._STATE.size, 0)
+                if len(raw) == self._STATE.size:
+                    stored_tokens, last = self._STATE.unpack(raw)
+                else:
+                    stored_tokens, last = self.capacity, now
+                remaining, wait = self._take(tokens, stored_tokens, max(0.0, now - last))
+                os.pwrite(self._fd, self._STATE.pack(remaining, now), 0)
+                self._tokens = remaining
+                return wait
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+class RateLimiter:
+    """按Bitget接口分别限流的令牌桶集合，所有上游调用共享"""
+
+    # Bitget公共行情接口限频（次/秒/IP）
+    ENDPOINT_LIMITS = {
+        '/api/v2/mix/market/candles': 20,
+        '/api/v2/mix/market/history-candles': 20,
+        '/api/v2/mix/market/ticker': 20,
+        '/api/v2/mix/market/tickers': 20,
+        '/api/v2/public/time': 20,
+    }
+    DEFAULT_LIMIT = 10
+
+    def __init__(self, limits: Optional[Dict[str, float]] = None, shared_dir: Optional[str] = None):
+        """
+        Args:
+            limits: 覆盖默认的接口限频配置
+            shared_dir: 若指定，令牌桶状态保存在该目录下，多个进程共享同一额度
+        """
+        self.limits = dict(self.ENDPOINT_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self.shared_dir = shared_dir if fcntl is not None else None
+        if shared_dir and fcntl is None:
+            print("当前平台不支持文件锁，限流器仅在进程内共享")
+        if self.shared_dir:
+            os.makedirs(self.shared_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def bucket(self, endpoint: str) -> TokenBucket:
+        """获取某个接口对应的令牌桶"""
+        with self._lock:
+            bucket = self._buckets.get(endpoint)
+            if bucket is None:
+                rate = self.limits.get(endpoint, self.DEFAULT_LIMIT)
+                if self.shared_dir:
+                    name = re.sub(r'[^A-Za-z0-9]+', '_', endpoint).strip('_') + '.bucket'
+                    bucket = FileTokenBucket(os.path.join(self.shared_dir, name), rate)
+                else:
+                    bucket = TokenBucket(rate)
+                self._buckets[endpoint] = bucket
+            return bucket
+
+    def try_acquire(self, endpoint: str) -> bool:
+        """非阻塞获取某个接口的调用额度"""
+        return self.bucket(endpoint).try_acquire()
+
+    def acquire(self, endpoint: str, timeout: Optional[float] = None) -> bool:
+        """阻塞获取某个接口的调用额度"""
+        return self.bucket(endpoint).acquire(timeout=timeout)
+
+    def wait_time(self, endpoint: str) -> float:
+        """估算某个接口还需等待的秒数"""
+        return self.bucket(endpoint).wait_time()
+
+
+# 进程内默认共享的限流器；设置 BITGET_RATE_LIMIT_DIR 后在多个进程间共享额度
+default_rate_limiter = RateLimiter(shared_dir=os.environ.get('BITGET_RATE_LIMIT_DIR') or None)
@@ -0,0 +1,172 @@
+import bisect
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from src.services.bitget_service import GRANULARITY_MS
+from src.services.candle_columns import CandleColumns
+from src.services.candle_store import CandleStore
+
+
+class CandleResampler:
+    """
+    由1分钟K线增量合成更大周期的K线（3m/5m/15m/30m/1H/4H/1D）
+
+    每个派生序列只在首次使用时从上游拉取一次历史作为种子，之后完全由1分钟序列推导：
+    已收盘的1分钟K线逐根折叠进当前周期，仍在形成中的最后一根1分钟K线每次重新叠加，
+    因此当前周期的K线与1分钟数据保持一致，且不依赖内存中保留整个周期的1分钟数据。
+    """
+
+    SOURCE_GRANULARITY = '1m'
+    DERIVED_GRANULARITIES = ('3m', '5m', '15m', '30m', '1H', '4H', '1D')
+
+    def __init__(self, store: CandleStore):
+        self.store = store
+        self._lock = threading.Lock()
+        # (symbol, granularity) -> 折叠状态
+        self._states: Dict[Tuple[str, str], Dict] = {}
+
+    def can_derive(self, granularity: str) -> bool:
+        return granularity in self.DERIVED_GRANULARITIES
+
+    def is_seeded(self, symbol: str, granularity: str) -> bool:
+        with self._lock:
+            return (symbol, granularity) in self._states
+
+    def seed(self, symbol: str, granularity: str) -> bool:
+        """
+        以存储中已有的派生序列（上游种子）和1分钟序列初始化折叠状态
+
+        1分钟数据覆盖当前周期起点时，当前周期完全由1分钟数据重新计算；
+        否则（如日线）以上游返回的当前周期K线作为已收盘部分，扣除其中形成中的1分钟成交量后继续折叠。
+
+        Returns:
+            是否初始化成功（需要已有1分钟数据）
+        """
+        source = self.store.get(symbol, self.SOURCE_GRANULARITY)
+        if not source or not source['klines']:
+            return False
+        src = source['klines']
+        derived = self.store.get(symbol, granularity)
+        bars = derived['klines'] if derived else CandleColumns()
+
+        step = GRANULARITY_MS[granularity]
+        # 周期起点的偏移（如按UTC+8划分的日线）从上游K线推断
+        phase = bars.timestamp[-1] % step if bars else 0
+        forming = src.row(-1)
+        bucket = self._bucket(forming[0], step, phase)
+
+        state = {'step': step, 'phase': phase, 'bucket': bucket, 'closed': None}
+        if bars and bars.timestamp[-1] == bucket and src.timestamp[0] > bucket:
+            closed = bars.row(-1)
+            closed[5] = max(0.0, closed[5] - forming[5])
+            closed[6] = max(0.0, closed[6] - forming[6])
+            state['closed'] = closed
+            state['folded_ts'] = forming[0] - 1
+        else:
+            state['folded_ts'] = bucket - 1
+
+        with self._lock:
+            self._states[(symbol, granularity)] = state
+        return True
+
+    def update(self, symbol: str) -> Dict[str, CandleColumns]:
+        """
+        1分钟序列更新后调用，推导各派生序列发生变化的K线
+
+        Returns:
+            {granularity: 需要合并进存储的K线（已收盘的新周期 + 当前周期）}
+        """
+        source = self.store.get(symbol, self.SOURCE_GRANULARITY)
+        if not source or not source['klines']:
+            return {}
+        src = source['klines']
+
+        with self._lock:
+            states = [(key[1], state) for key, state in self._states.items() if key[0] == symbol]
+            return {granularity: self._advance(state, src) for granularity, state in states}
+
+    def rebuild(self, symbol: str, start_time: int, end_time: int) -> Dict[str, CandleColumns]:
+        """
+        1分钟序列中 [start_time, end_time] 的K线被补齐或修正后，重新计算受影响的派生周期K线
+
+        只重算1分钟数据完整覆盖其起点的周期；当前周期同时修正已折叠的部分。
+
+        Returns:
+            {granularity: 需要补入存储的K线}
+        """
+        source = self.store.get(symbol, self.SOURCE_GRANULARITY)
+        if not source or not source['klines']:
+            return {}
+        src = source['klines']
+
+        result = {}
+        with self._lock:
+            for (state_symbol, granularity), state in self._states.items():
+                if state_symbol != symbol:
+                    continue
+                step, phase = state['step'], state['phase']
+                bars = CandleColumns()
+                bucket = self._bucket(start_time, step, phase)
+                while bucket <= end_time:
+                    if bucket >= src.timestamp[0]:
+                        lo = bisect.bisect_left(src.timestamp, bucket)
+                        hi = bisect.bisect_left(src.timestamp, bucket + step)
+                        if bucket == state['bucket']:
+                            # 当前周期：已折叠部分按修正后的1分钟数据重算，形成中的K线仍由 update 叠加
+                            hi = bisect.bisect_right(src.timestamp, state['folded_ts'])
+                            bar = None
+                            for i in range(lo, hi):
+                                bar = self._fold(bar, src.row(i), bucket)
+                            state['closed'] = bar
+                        elif lo < hi:
+                            bar = None
+                            for i in range(lo, hi):
+                                bar = self._fold(bar, src.row(i), bucket)
+                            bars.append(bar)
+                    bucket += step
+                if bars:
+                    result[granularity] = bars
+        return result
+
+    def _advance(self, state: Dict, src: CandleColumns) -> CandleColumns:
+        step, phase = state['step'], state['phase']
+        output = CandleColumns()
+
+        # 折叠新收盘的1分钟K线（最后一根仍在形成中，不折叠）
+        start = bisect.bisect_right(src.timestamp, state['folded_ts'])
+        for i in range(start, len(src) - 1):
+            row = src.row(i)
+            bucket = self._bucket(row[0], step, phase)
+            if bucket != state['bucket']:
+                if state['closed'] is not None:
+                    output.append(state['closed'])
+                state['bucket'], state['closed'] = bucket, None
+            state['closed'] = self._fold(state['closed'], row, bucket)
+            state['folded_ts'] = row[0]
+
+        # 叠加形成中的1分钟K线得到当前周期
+        forming = src.row(-1)
+        current = state['closed']
+        if forming[0] > state['folded_ts']:
+            bucket = self._bucket(forming[0], step, phase)
+            if bucket != state['bucket']:
+                if state['closed'] is not None:
+                    output.append(state['closed'])
+                state['bucket'], state['closed'] = bucket, None
+                current = None
+            current = self._fold(current, forming, bucket)
+        if current is not None:
+            output.append(current)
+        return output
+
+    @staticmethod
+    def _bucket(ts: int, step: int, phase: int) -> int:
+        return ts - (ts - phase) % step
+
+    @staticmethod
+    def _fold(bar: Optional[List], row: List, bucket: int) -> List:
+        """把一根1分钟K线并入周期K线，返回新的周期K线"""
+        if bar is None:
+            return [bucket] + list(row[1:])
+        return [bucket, bar[1], max(bar[2], row[2]), min(bar[3], row[3]), row[4],
+                bar[5] + row[5], bar[6] + row[6]]
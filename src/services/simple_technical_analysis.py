@@ -1,76 +1,97 @@
 import math
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Sequence, Tuple, Optional, Union
+from src.services.analysis_backends import PYTHON_BACKEND, PythonAnalysisBackend, select_backend
+from src.services.candle_columns import CandleColumns
+from src.services.lazy_analysis import LazyAnalysis
+from src.services.range_index import CandleRangeIndex
 
 class SimpleTechnicalAnalysis:
-    """简化版技术分析服务类（不依赖numpy）"""
+    """简化版技术分析服务类（numpy可选：安装时较长的序列自动使用向量化后端）"""
     
-    def __init__(self):
+    def __init__(self, backend: str = 'auto'):
+        """
+        Args:
+            backend: 计算后端，'auto'（按K线数量和可用依赖自动选择）、'python' 或 'numpy'
+        """
         self.fibonacci_levels = [0.236, 0.382, 0.5, 0.618, 0.786]
         self.ma_periods = [5, 10, 20, 50, 100, 200]
+        self.backend = backend
+        select_backend(0, backend)  # 提前校验配置
     
-    def analyze(self, klines: List[List]) -> Dict:
+    def cache_key(self) -> Tuple:
+        """分析配置的标识：配置相同时对同一序列的结果相同，用作分析结果缓存的键"""
+        return (type(self).__name__, tuple(self.ma_periods), tuple(self.fibonacci_levels))
+    
+    def analyze(self, klines: Union[CandleColumns, List[List], Dict]) -> Dict:
         """
         综合技术分析
         
         Args:
-            klines: K线数据 [[timestamp, open, high, low, close, volume, amount], ...]
+            klines: K线数据 [[timestamp, open, high, low, close, volume, amount], ...]，
+                    或列式的 CandleColumns（直接按列计算，无需转换），
+                    或 {列名: NumPy数组}（如 CandleArchive.read 的结果，使用NumPy后端）
         
         Returns:
             技术分析结果字典
         """
-        if not klines or len(klines) < 20:
-            return {'error': 'K线数据不足，至少需要20条数据'}
-        
-        current_price = float(klines[-1][4])
+        return self.analyze_lazy(klines).to_dict()
+    
+    def analyze_lazy(self, klines: Union[CandleColumns, List[List], Dict]) -> LazyAnalysis:
+        """
+        按需计算的技术分析：各部分在第一次访问时才计算
         
-        analysis = {
-            'current_price': current_price,
-            'timestamp': int(klines[-1][0]),
-            'moving_averages': self._calculate_moving_averages(klines),
-            'fibonacci_retracements': self._calculate_fibonacci_retracements(klines),
-            'pivot_points': self._calculate_pivot_points(klines),
-            'trend_lines': self._calculate_trend_lines(klines),
-            'support_resistance': self._calculate_support_resistance(klines),
-            'optimized_levels': {}
+        返回的对象引用传入的数据，使用期间数据不能被修改（如传入 CandleStore.get 的快照，
+        而不是 CandleStore.view 的零拷贝视图）。
+        """
+        size = len(klines['close']) if isinstance(klines, dict) else len(klines or [])
+        if size < 20:
+            return LazyAnalysis.failed('K线数据不足，至少需要20条数据')
+        
+        backend = select_backend(size, 'numpy' if isinstance(klines, dict) else self.backend)
+        # 统一转换为列式，各指标直接取所需的列
+        candles = backend.prepare(klines)
+        sections = {
+            'current_price': lambda: float(candles.close[-1]),
+            'timestamp': lambda: int(candles.timestamp[-1]),
+            'moving_averages': lambda: self._calculate_moving_averages(candles, backend),
+            'fibonacci_retracements': lambda: self._calculate_fibonacci_retracements(candles, backend),
+            'pivot_points': lambda: self._calculate_pivot_points(candles, backend),
+            'trend_lines': lambda: self._calculate_trend_lines(candles, backend),
+            'support_resistance': lambda: self._calculate_support_resistance(candles, backend),
         }
         
-        # 应用整数价位和价格修正理论优化
-        analysis['optimized_levels'] = self._optimize_price_levels(analysis, current_price)
+        def compute(name: str, resolved: Dict):
+            if name == 'optimized_levels':
+                # 应用整数价位和价格修正理论优化
+                return self._optimize_price_levels(resolved, resolved['current_price'])
+            return sections[name]()
         
-        return analysis
+        return LazyAnalysis(compute)
     
-    def _calculate_moving_averages(self, klines: List[List]) -> Dict:
+    def _calculate_moving_averages(self, candles: CandleColumns,
+                                   backend: PythonAnalysisBackend = PYTHON_BACKEND) -> Dict:
         """计算移动平均线"""
-        ma_data = {}
-        current_price = float(klines[-1][4])
-        closes = [float(k[4]) for k in klines]
-        
-        for period in self.ma_periods:
-            if len(closes) >= period:
-                ma_value = sum(closes[-period:]) / period
-                ma_data[f'MA{period}'] = {
-                    'value': ma_value,
-                    'support_resistance': 'support' if current_price > ma_value else 'resistance',
-                    'distance_percent': ((current_price - ma_value) / ma_value) * 100
-                }
-        
-        return ma_data
+        current_price = float(candles.close[-1])
+        values = backend.moving_averages(candles.close, self.ma_periods)
+        return {f'MA{period}': self._moving_average_entry(value, current_price)
+                for period, value in values.items()}
     
-    def _calculate_fibonacci_retracements(self, klines: List[List]) -> Dict:
+    @staticmethod
+    def _moving_average_entry(ma_value: float, current_price: float) -> Dict:
+        return {
+            'value': ma_value,
+            'support_resistance': 'support' if current_price > ma_value else 'resistance',
+            'distance_percent': ((current_price - ma_value) / ma_value) * 100
+        }
+    
+    def _calculate_fibonacci_retracements(self, candles: CandleColumns,
+                                          backend: PythonAnalysisBackend = PYTHON_BACKEND) -> Dict:
         """计算斐波那契回撤与扩展"""
-        # 使用最近100个数据点
-        recent_data = klines[-100:] if len(klines) > 100 else klines
-        
-        highs = [float(k[2]) for k in recent_data]
-        lows = [float(k[3]) for k in recent_data]
-        
-        high_price = max(highs)
-        low_price = min(lows)
-        
-        # 找到高点和低点的位置
-        high_idx = highs.index(high_price)
-        low_idx = lows.index(low_price)
-        
+        # 使用最近100个数据点，高点和低点的位置取首次出现处
+        return self._fibonacci_levels_for(*backend.extremes(candles.high, candles.low, 100))
+    
+    def _fibonacci_levels_for(self, high_price: float, low_price: float, high_idx: int, low_idx: int) -> Dict:
+        """由区间最高/最低价及其位置计算回撤与扩展位"""
         # 确定趋势方向
         if high_idx > low_idx:
             # 上升趋势中的回撤
@@ -112,18 +133,20 @@ class SimpleTechnicalAnalysis:
             'range': price_range
         }
     
-    def _calculate_pivot_points(self, klines: List[List]) -> Dict:
+    def _calculate_pivot_points(self, candles: CandleColumns,
+                                backend: PythonAnalysisBackend = PYTHON_BACKEND) -> Dict:
         """计算枢轴点"""
-        if len(klines) < 2:
+        if len(candles) < 2:
             return {}
         
         # 取最近24个数据点（假设1分钟K线）
-        recent_data = klines[-24:] if len(klines) > 24 else klines
-        
-        recent_high = max(float(k[2]) for k in recent_data)
-        recent_low = min(float(k[3]) for k in recent_data)
-        recent_close = float(klines[-2][4])  # 前一个收盘价
+        recent_high, recent_low, _, _ = backend.extremes(candles.high, candles.low, 24)
+        recent_close = float(candles.close[-2])  # 前一个收盘价
         
+        return self._pivot_levels_for(recent_high, recent_low, recent_close)
+    
+    @staticmethod
+    def _pivot_levels_for(recent_high: float, recent_low: float, recent_close: float) -> Dict:
         # 标准枢轴点计算
         pivot = (recent_high + recent_low + recent_close) / 3
         
@@ -153,24 +176,42 @@ class SimpleTechnicalAnalysis:
             'close': recent_close
         }
     
-    def _calculate_trend_lines(self, klines: List[List]) -> Dict:
-        """计算趋势线（简化版）"""
-        if len(klines) < 50:
-            return {}
-        
-        # 使用最近50个数据点
-        recent_data = klines[-50:]
+    def levels_by_lookback(self, index: CandleRangeIndex, lookbacks: Sequence[int]) -> Dict:
+        """
+        按多个回看长度计算斐波那契回撤和枢轴点
         
-        # 简化的趋势线计算
-        closes = [float(k[4]) for k in recent_data]
+        Args:
+            index: 序列的区间最值索引，各回看长度的最高/最低价 O(1) 取得
+            lookbacks: 回看的K线数，超过序列长度时使用整个序列
         
-        # 计算简单的线性趋势
-        n = len(closes)
-        sum_x = sum(range(n))
-        sum_y = sum(closes)
-        sum_xy = sum(i * closes[i] for i in range(n))
-        sum_x2 = sum(i * i for i in range(n))
+        Returns:
+            {回看长度: {'candles': 实际使用的K线数, 'fibonacci_retracements': ..., 'pivot_points': ...}}
+        """
+        levels = {}
+        for lookback in lookbacks:
+            high_price, low_price, high_idx, low_idx = index.extremes(lookback)
+            levels[lookback] = {
+                'candles': min(lookback, len(index)),
+                'fibonacci_retracements': self._fibonacci_levels_for(high_price, low_price, high_idx, low_idx),
+                # 与 _calculate_pivot_points 相同，使用前一个收盘价
+                'pivot_points': (self._pivot_levels_for(high_price, low_price, index.close[-2])
+                                 if len(index) >= 2 else {})
+            }
+        return levels
+    
+    def _calculate_trend_lines(self, candles: CandleColumns,
+                               backend: PythonAnalysisBackend = PYTHON_BACKEND) -> Dict:
+        """计算趋势线（简化版）"""
+        if len(candles) < 50:
+            return {}
         
+        # 使用最近50个数据点计算简单的线性趋势
+        return self._trend_lines_for(*backend.regression(candles.close, 50))
+    
+    @staticmethod
+    def _trend_lines_for(n: int, sum_x: float, sum_y: float, sum_xy: float, sum_x2: float,
+                         highest_close: float, lowest_close: float) -> Dict:
+        """由线性回归的累加量计算趋势线"""
         slope = (n * sum_xy - sum_x * sum_y) / (n * sum_x2 - sum_x * sum_x)
         intercept = (sum_y - slope * sum_x) / n
         
@@ -186,42 +227,23 @@ class SimpleTechnicalAnalysis:
             },
             'resistance_trend': {
                 'slope': slope * 1.1,  # 简化的阻力线
-                'intercept': intercept + (max(closes) - min(closes)) * 0.1,
+                'intercept': intercept + (highest_close - lowest_close) * 0.1,
                 'current_price': current_trend_price * 1.01,
                 'trend_direction': 'up' if slope > 0 else 'down',
                 'strength': abs(slope)
             }
         }
     
-    def _calculate_support_resistance(self, klines: List[List]) -> Dict:
+    def _calculate_support_resistance(self, candles: CandleColumns,
+                                      backend: PythonAnalysisBackend = PYTHON_BACKEND) -> Dict:
         """计算支撑阻力位（简化版）"""
-        if len(klines) < 20:
+        if len(candles) < 20:
             return {}
         
-        # 使用最近100个数据点
-        recent_data = klines[-100:] if len(klines) > 100 else klines
-        
-        highs = [float(k[2]) for k in recent_data]
-        lows = [float(k[3]) for k in recent_data]
-        
-        # 简化的支撑阻力位计算
-        resistance_levels = []
-        support_levels = []
-        
-        # 找到局部高点和低点
-        for i in range(2, len(recent_data) - 2):
-            high = highs[i]
-            low = lows[i]
-            
-            # 局部高点
-            if (high > highs[i-1] and high > highs[i-2] and 
-                high > highs[i+1] and high > highs[i+2]):
-                resistance_levels.append({'price': high, 'strength': 1})
-            
-            # 局部低点
-            if (low < lows[i-1] and low < lows[i-2] and 
-                low < lows[i+1] and low < lows[i+2]):
-                support_levels.append({'price': low, 'strength': 1})
+        # 在最近100个数据点中找到局部高点和低点（高于/低于左右各两根K线）
+        highs, lows = backend.local_extremes(candles.high, candles.low, 100, 2)
+        resistance_levels = [{'price': price, 'strength': 1} for price in highs]
+        support_levels = [{'price': price, 'strength': 1} for price in lows]
         
         # 按强度排序并取前5个
         resistance_levels.sort(key=lambda x: x['strength'], reverse=True)
@@ -0,0 +1,317 @@
+import bisect
+from collections import deque
+from itertools import islice
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple, Union
+
+from src.services.candle_columns import CandleColumns
+from src.services.lazy_analysis import LazyAnalysis
+from src.services.simple_technical_analysis import SimpleTechnicalAnalysis
+
+
+class _RollingExtreme:
+    """
+    单调队列：维护已收盘K线最近 window 根中的最大（或最小）值及其首次出现的位置
+
+    队列中的下标对应的值单调不增（最小值时单调不减），新值只弹出严格更差的队尾，
+    因此相等的值保留较早的下标，与 max(range(n), key=...) 取首次出现的结果一致。
+    """
+
+    __slots__ = ('window', 'values', 'is_max', 'indexes')
+
+    def __init__(self, window: int, values: List[float], is_max: bool):
+        self.window = window
+        self.values = values
+        self.is_max = is_max
+        self.indexes: Deque[int] = deque()
+
+    def push(self, index: int, value: float):
+        indexes, values, size = self.indexes, self.values, len(self.values)
+        if self.is_max:
+            while indexes and values[indexes[-1] % size] < value:
+                indexes.pop()
+        else:
+            while indexes and values[indexes[-1] % size] > value:
+                indexes.pop()
+        indexes.append(index)
+        if indexes[0] <= index - self.window:
+            indexes.popleft()
+
+    def best(self) -> Optional[int]:
+        """窗口内最值所在的下标，窗口为空时返回None"""
+        return self.indexes[0] if self.indexes else None
+
+
+class StreamingTechnicalAnalysis:
+    """
+    增量技术分析：单个K线序列的有状态分析引擎，每根K线的更新为 O(1)
+
+    已收盘的K线只进入一次状态：均线为滑动窗口累加和，区间最高/最低价由单调队列维护，
+    趋势线的回归累加量随窗口滑动增减，局部高低点在其右侧两根K线收盘时判定一次。
+    形成中的最后一根K线单独保存，每次分析时与已收盘部分的状态合并，因此 replace_last
+    不需要回退任何状态。analyze() 的输出与 SimpleTechnicalAnalysis.analyze 对同一序列的
+    结果相同（累加和的浮点舍入顺序不同，数值可能相差最后几位；价格恰好等于均线时
+    support/resistance 的判定可能因此不同）。
+    """
+
+    # 与 SimpleTechnicalAnalysis 中各指标使用的数据点数一致
+    FIBONACCI_LOOKBACK = 100
+    PIVOT_LOOKBACK = 24
+    TREND_LOOKBACK = 50
+    SUPPORT_RESISTANCE_LOOKBACK = 100
+    MIN_CANDLES = 20
+    # 每收盘这么多根K线后从窗口重新求和一次，避免累加和的舍入误差积累
+    RESUM_INTERVAL = 1024
+
+    def __init__(self, analyzer: Optional[SimpleTechnicalAnalysis] = None):
+        """
+        Args:
+            analyzer: 提供均线周期、斐波那契比例和结果格式的批量分析器，默认新建一个
+        """
+        self.analyzer = analyzer if analyzer is not None else SimpleTechnicalAnalysis()
+        self.ma_periods = list(self.analyzer.ma_periods)
+        self._size = max(self.ma_periods + [self.FIBONACCI_LOOKBACK, self.TREND_LOOKBACK,
+                                            self.SUPPORT_RESISTANCE_LOOKBACK]) + 8
+        self.reset()
+
+    def reset(self):
+        size = self._size
+        # 已收盘K线的环形缓冲（按绝对下标 % size 存取）
+        self._closes = [0.0] * size
+        self._highs = [0.0] * size
+        self._lows = [0.0] * size
+        self._count = 0
+        self._last_closed_ts: Optional[int] = None
+        self._forming: Optional[Tuple[int, float, float, float]] = None
+
+        # 各均线周期：最近 period-1 根已收盘K线的收盘价之和（再加上形成中的K线即为完整窗口）
+        self._ma_sums = {period: 0.0 for period in self.ma_periods}
+        self._fib_high = _RollingExtreme(self.FIBONACCI_LOOKBACK - 1, self._highs, True)
+        self._fib_low = _RollingExtreme(self.FIBONACCI_LOOKBACK - 1, self._lows, False)
+        self._pivot_high = _RollingExtreme(self.PIVOT_LOOKBACK - 1, self._highs, True)
+        self._pivot_low = _RollingExtreme(self.PIVOT_LOOKBACK - 1, self._lows, False)
+        self._trend_high = _RollingExtreme(self.TREND_LOOKBACK - 1, self._closes, True)
+        self._trend_low = _RollingExtreme(self.TREND_LOOKBACK - 1, self._closes, False)
+        # 趋势线：最近 TREND_LOOKBACK-1 根已收盘收盘价 y 及 x*y 之和（x 为窗口内位置）
+        self._trend_count = 0
+        self._trend_sum_y = 0.0
+        self._trend_sum_xy = 0.0
+        # 已判定的局部高点/低点 (绝对下标, 价格)，按下标升序
+        self._resistance: Deque[Tuple[int, float]] = deque()
+        self._support: Deque[Tuple[int, float]] = deque()
+
+    def __len__(self) -> int:
+        return self._count + (self._forming is not None)
+
+    def load(self, klines: Union[CandleColumns, List[List]]):
+        """以完整序列初始化（O(n)，之后用 update / replace_last 增量更新）"""
+        self.reset()
+        klines = CandleColumns.from_rows(klines)
+        ts, highs, lows, closes = klines.timestamp, klines.high, klines.low, klines.close
+        for i in range(len(klines)):
+            self._advance(ts[i], highs[i], lows[i], closes[i])
+
+    def update(self, candle: Sequence):
+        """追加一根新K线：原来的最后一根视为已收盘"""
+        self._advance(int(candle[0]), float(candle[2]), float(candle[3]), float(candle[4]))
+
+    def replace_last(self, candle: Sequence):
+        """更新形成中的最后一根K线"""
+        if self._forming is None:
+            raise IndexError('序列为空')
+        self._forming = (int(candle[0]), float(candle[2]), float(candle[3]), float(candle[4]))
+
+    def sync(self, klines: CandleColumns) -> LazyAnalysis:
+        """
+        与存储中的序列同步后分析（见 analyze_lazy）：只处理上次同步之后变化的尾部K线，
+        已收盘部分与状态不一致时（如修复了中间的缺口）整体重新初始化
+        """
+        count = len(klines)
+        if not count:
+            return LazyAnalysis.failed('K线数据不足，至少需要20条数据')
+        ts = klines.timestamp
+        start = None
+        if self._forming is not None:
+            start = bisect.bisect_left(ts, self._forming[0])
+            if start == count or ts[start] != self._forming[0]:
+                start = None
+            elif self._count and (start == 0 or ts[start - 1] != self._last_closed_ts
+                                  or klines.close[start - 1] != self._closes[(self._count - 1) % self._size]):
+                start = None
+
+        if start is None:
+            self.load(klines)
+        else:
+            highs, lows, closes = klines.high, klines.low, klines.close
+            self._forming = (ts[start], highs[start], lows[start], closes[start])
+            for i in range(start + 1, count):
+                self._advance(ts[i], highs[i], lows[i], closes[i])
+        return self.analyze_lazy()
+
+    def _advance(self, timestamp: int, high: float, low: float, close: float):
+        if self._forming is not None:
+            self._close(*self._forming)
+        self._forming = (timestamp, high, low, close)
+
+    def _close(self, timestamp: int, high: float, low: float, close: float):
+        """把一根K线计入已收盘状态"""
+        index, size = self._count, self._size
+        closes = self._closes
+        closes[index % size] = close
+        self._highs[index % size] = high
+        self._lows[index % size] = low
+        self._count = index + 1
+        self._last_closed_ts = timestamp
+
+        for period in self.ma_periods:
+            self._ma_sums[period] += close
+            if index >= period - 1:
+                self._ma_sums[period] -= closes[(index - period + 1) % size]
+
+        window = self.TREND_LOOKBACK - 1
+        if self._trend_count < window:
+            self._trend_sum_xy += self._trend_count * close
+            self._trend_count += 1
+        else:
+            # 窗口左移一位：丢弃最旧的收盘价，其余 x 各减1
+            oldest = closes[(index - window) % size]
+            self._trend_sum_y -= oldest
+            self._trend_sum_xy -= self._trend_sum_y
+            self._trend_sum_xy += (window - 1) * close
+        self._trend_sum_y += close
+
+        for extreme, value in ((self._fib_high, high), (self._fib_low, low), (self._pivot_high, high),
+                               (self._pivot_low, low), (self._trend_high, close), (self._trend_low, close)):
+            extreme.push(index, value)
+
+        # 右侧两根K线都已收盘，判定 index-2 处是否为局部高点/低点
+        center = index - 2
+        if center >= 2:
+            level = self._local_extreme(center, high, low)
+            if level[0] is not None:
+                self._resistance.append((center, level[0]))
+            if level[1] is not None:
+                self._support.append((center, level[1]))
+        self._expire_levels(self._count + 1)
+
+        if self._count % self.RESUM_INTERVAL == 0:
+            self._resum()
+
+    def _local_extreme(self, center: int, right_high: float, right_low: float) -> Tuple[Optional[float], Optional[float]]:
+        """判断 center 是否为局部高点/低点（左右各两根K线），最右侧一根的高低价由参数给出"""
+        size, highs, lows = self._size, self._highs, self._lows
+        high, low = highs[center % size], lows[center % size]
+        neighbors = [(center - 2) % size, (center - 1) % size, (center + 1) % size]
+        is_high = (high > right_high and all(high > highs[i] for i in neighbors))
+        is_low = (low < right_low and all(low < lows[i] for i in neighbors))
+        return (high if is_high else None, low if is_low else None)
+
+    def _resum(self):
+        """从环形缓冲重新计算累加和"""
+        size, closes, count = self._size, self._closes, self._count
+        for period in self.ma_periods:
+            self._ma_sums[period] = sum(closes[i % size] for i in range(max(0, count - period + 1), count))
+        first = count - self._trend_count
+        self._trend_sum_y = sum(closes[(first + x) % size] for x in range(self._trend_count))
+        self._trend_sum_xy = sum(x * closes[(first + x) % size] for x in range(self._trend_count))
+
+    def analyze(self) -> Dict:
+        """分析当前序列，结果格式与 SimpleTechnicalAnalysis.analyze 相同"""
+        return self.analyze_lazy().to_dict()
+
+    def analyze_lazy(self) -> LazyAnalysis:
+        """
+        按需生成分析结果：各部分所需的数值（O(1)）立即从当前状态取出，
+        结果字典在第一次访问该部分时才构建，之后引擎继续更新也不影响已返回的对象
+        """
+        total = len(self)
+        if total < self.MIN_CANDLES:
+            return LazyAnalysis.failed('K线数据不足，至少需要20条数据')
+
+        timestamp, _, _, current_price = self._forming
+        builders = {
+            'current_price': lambda: current_price,
+            'timestamp': lambda: int(timestamp),
+            'moving_averages': self._moving_averages(total),
+            'fibonacci_retracements': self._fibonacci(total),
+            'pivot_points': self._pivot_points(),
+            'trend_lines': self._trend_lines(total),
+            'support_resistance': self._support_resistance(total),
+        }
+
+        def compute(name: str, resolved: Dict):
+            if name == 'optimized_levels':
+                return self.analyzer._optimize_price_levels(resolved, resolved['current_price'])
+            return builders[name]()
+
+        return LazyAnalysis(compute)
+
+    def _window_extreme(self, extreme: _RollingExtreme, forming_value: float) -> Tuple[float, int]:
+        """已收盘部分的最值与形成中K线合并，返回 (值, 绝对下标)；相等时取较早的"""
+        index = extreme.best()
+        if index is not None:
+            value = extreme.values[index % self._size]
+            if value == forming_value or (value > forming_value) == extreme.is_max:
+                return value, index
+        return forming_value, self._count
+
+    # 以下各方法取出某部分所需的数值，返回构建结果字典的函数
+
+    def _moving_averages(self, total: int) -> Callable[[], Dict]:
+        current_price = self._forming[3]
+        values = {period: (self._ma_sums[period] + current_price) / period
+                  for period in self.ma_periods if total >= period}
+        return lambda: {f'MA{period}': self.analyzer._moving_average_entry(value, current_price)
+                        for period, value in values.items()}
+
+    def _fibonacci(self, total: int) -> Callable[[], Dict]:
+        _, high, low, _ = self._forming
+        high_price, high_idx = self._window_extreme(self._fib_high, high)
+        low_price, low_idx = self._window_extreme(self._fib_low, low)
+        return lambda: self.analyzer._fibonacci_levels_for(high_price, low_price, high_idx, low_idx)
+
+    def _pivot_points(self) -> Callable[[], Dict]:
+        _, high, low, _ = self._forming
+        recent_high, _ = self._window_extreme(self._pivot_high, high)
+        recent_low, _ = self._window_extreme(self._pivot_low, low)
+        recent_close = self._closes[(self._count - 1) % self._size]
+        return lambda: self.analyzer._pivot_levels_for(recent_high, recent_low, recent_close)
+
+    def _trend_lines(self, total: int) -> Callable[[], Dict]:
+        if total < self.TREND_LOOKBACK:
+            return dict
+        n = self.TREND_LOOKBACK
+        close = self._forming[3]
+        highest, _ = self._window_extreme(self._trend_high, close)
+        lowest, _ = self._window_extreme(self._trend_low, close)
+        args = (n, n * (n - 1) // 2, self._trend_sum_y + close, self._trend_sum_xy + (n - 1) * close,
+                (n - 1) * n * (2 * n - 1) // 6, highest, lowest)
+        return lambda: self.analyzer._trend_lines_for(*args)
+
+    def _expire_levels(self, total: int) -> int:
+        """丢弃已滑出窗口的局部高低点，返回窗口内第一个可能的位置（窗口内第 i 根，i>=2）"""
+        first_center = max(0, total - self.SUPPORT_RESISTANCE_LOOKBACK) + 2
+        for levels in (self._resistance, self._support):
+            while levels and levels[0][0] < first_center:
+                levels.popleft()
+        return first_center
+
+    def _support_resistance(self, total: int) -> Callable[[], Dict]:
+        first_center = self._expire_levels(total)
+        resistance = [{'price': price, 'strength': 1} for _, price in islice(self._resistance, 5)]
+        support = [{'price': price, 'strength': 1} for _, price in islice(self._support, 5)]
+
+        # 倒数第三根K线的右侧包含形成中的K线，每次分析时单独判定
+        center = self._count - 2
+        if center >= first_center:
+            _, high, low, _ = self._forming
+            level_high, level_low = self._local_extreme(center, high, low)
+            if level_high is not None and len(resistance) < 5:
+                resistance.append({'price': level_high, 'strength': 1})
+            if level_low is not None and len(support) < 5:
+                support.append({'price': level_low, 'strength': 1})
+
+        levels = {
+            'resistance_levels': resistance,
+            'support_levels': support
+        }
+        return lambda: levels
@@ -1,39 +1,54 @@
 import numpy as np
 import pandas as pd
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Union
 import math
+from src.services.candle_columns import CandleColumns
 
 class TechnicalAnalysis:
     """技术分析服务类"""
     
-    def __init__(self):
+    def __init__(self, fractal_width: int = 2, support_resistance_lookback: Optional[int] = 100):
+        """
+        Args:
+            fractal_width: 局部高低点判定时左右各比较的K线数
+            support_resistance_lookback: 寻找支撑阻力位使用的最近K线数，None 表示全部
+        """
+        if fractal_width < 1:
+            raise ValueError("fractal_width 至少为1")
         self.fibonacci_levels = [0.236, 0.382, 0.5, 0.618, 0.786]
         self.ma_periods = [5, 10, 20, 50, 100, 200]
+        self.fractal_width = fractal_width
+        self.support_resistance_lookback = support_resistance_lookback
+    
+    def cache_key(self) -> Tuple:
+        """分析配置的标识：配置相同时对同一序列的结果相同，用作分析结果缓存的键"""
+        return (type(self).__name__, tuple(self.ma_periods), tuple(self.fibonacci_levels),
+                self.fractal_width, self.support_resistance_lookback)
     
-    def analyze(self, klines: List[List]) -> Dict:
+    def analyze(self, klines: Union[CandleColumns, List[List], Dict[str, np.ndarray]]) -> Dict:
         """
         综合技术分析
         
         Args:
-            klines: K线数据 [[timestamp, open, high, low, close, volume, amount], ...]
+            klines: K线数据 [[timestamp, open, high, low, close, volume, amount], ...]，
+                    或列式的 CandleColumns / {列名: NumPy数组}（如 CandleArchive.read 的结果），
+                    列式数据零拷贝构建DataFrame
         
         Returns:
             技术分析结果字典
         """
-        if not klines or len(klines) < 20:
+        # 列式归档的数据以数组字典传入，长度以收盘价列为准
+        size = len(klines['close']) if isinstance(klines, dict) else len(klines or [])
+        if size < 20:
             return {'error': 'K线数据不足，至少需要20条数据'}
         
         # 转换为DataFrame便于计算
-        df = pd.DataFrame(klines, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'amount'])
-        df = df.astype({
-            'timestamp': 'int64',
-            'open': 'float64',
-            'high': 'float64', 
-            'low': 'float64',
-            'close': 'float64',
-            'volume': 'float64',
-            'amount': 'float64'
-        })
+        if isinstance(klines, dict):
+            df = pd.DataFrame(klines, copy=False)
+        elif isinstance(klines, CandleColumns):
+            df = pd.DataFrame(klines.to_numpy(), copy=False)
+        else:
+            df = self._rows_to_dataframe(klines)
         
         current_price = float(df['close'].iloc[-1])
         
@@ -53,6 +68,19 @@ class TechnicalAnalysis:
         
         return analysis
     
+    def _rows_to_dataframe(self, klines: List[List]) -> pd.DataFrame:
+        """将行列表转换为DataFrame"""
+        df = pd.DataFrame(klines, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'amount'])
+        return df.astype({
+            'timestamp': 'int64',
+            'open': 'float64',
+            'high': 'float64', 
+            'low': 'float64',
+            'close': 'float64',
+            'volume': 'float64',
+            'amount': 'float64'
+        })
+    
     def _calculate_moving_averages(self, df: pd.DataFrame) -> Dict:
         """计算移动平均线"""
         ma_data = {}
@@ -218,26 +246,11 @@ class TechnicalAnalysis:
             return {}
         
         # 使用最近的价格数据寻找关键价位
-        recent_data = df.tail(100)
+        recent_data = df if self.support_resistance_lookback is None else df.tail(self.support_resistance_lookback)
         
         # 寻找局部高点和低点
-        highs = []
-        lows = []
-        
-        for i in range(2, len(recent_data) - 2):
-            # 局部高点
-            if (recent_data.iloc[i]['high'] > recent_data.iloc[i-1]['high'] and 
-                recent_data.iloc[i]['high'] > recent_data.iloc[i-2]['high'] and
-                recent_data.iloc[i]['high'] > recent_data.iloc[i+1]['high'] and
-                recent_data.iloc[i]['high'] > recent_data.iloc[i+2]['high']):
-                highs.append(recent_data.iloc[i]['high'])
-            
-            # 局部低点
-            if (recent_data.iloc[i]['low'] < recent_data.iloc[i-1]['low'] and 
-                recent_data.iloc[i]['low'] < recent_data.iloc[i-2]['low'] and
-                recent_data.iloc[i]['low'] < recent_data.iloc[i+1]['low'] and
-                recent_data.iloc[i]['low'] < recent_data.iloc[i+2]['low']):
-                lows.append(recent_data.iloc[i]['low'])
+        highs = self._find_fractals(recent_data['high'].to_numpy(), self.fractal_width, True).tolist()
+        lows = self._find_fractals(recent_data['low'].to_numpy(), self.fractal_width, False).tolist()
         
         # 聚类相近的价位
         resistance_levels = self._cluster_price_levels(highs) if highs else []
@@ -248,6 +261,27 @@ class TechnicalAnalysis:
             'support_levels': support_levels
         }
     
+    @staticmethod
+    def _find_fractals(values: np.ndarray, width: int, is_high: bool) -> np.ndarray:
+        """
+        向量化查找分形极值：严格高于（低于）左右各 width 个值的点，按时间顺序返回其值
+        
+        对整个窗口做 2*width 次错位比较，不逐行访问数据。
+        """
+        n = len(values)
+        if n < 2 * width + 1:
+            return values[:0]
+        center = values[width:n - width]
+        mask = np.ones(len(center), dtype=bool)
+        for offset in range(1, width + 1):
+            left = values[width - offset:n - width - offset]
+            right = values[width + offset:n - width + offset]
+            if is_high:
+                mask &= (center > left) & (center > right)
+            else:
+                mask &= (center < left) & (center < right)
+        return center[mask]
+    
     def _cluster_price_levels(self, prices: List[float], tolerance: float = 0.005) -> List[Dict]:
         """聚类相近的价位"""
         if not prices:
@@ -0,0 +1,207 @@
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+
+def request_key(url: str, params: Optional[Dict] = None) -> str:
+    """由接口路径和参数生成录制/回放的键（参数按名称排序）"""
+    path = url.split('://', 1)[-1]
+    path = path[path.find('/'):] if '/' in path else '/'
+    items = sorted((str(k), str(v)) for k, v in (params or {}).items())
+    return path + '?' + '&'.join(f'{k}={v}' for k, v in items)
+
+
+class RecordedResponse:
+    """回放的响应，提供 _make_request 用到的 requests.Response 接口"""
+
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class HttpTransport:
+    """默认传输层：直接通过 requests.Session 请求上游"""
+
+    def __init__(self, session: requests.Session):
+        self.session = session
+
+    def get(self, url: str, params: Optional[Dict] = None, timeout: float = 10,
+            proxies: Optional[Dict] = None):
+        return self.session.get(url, params=params, timeout=timeout, proxies=proxies)
+
+    def close(self):
+        pass
+
+
+class RecordingTransport(HttpTransport):
+    """
+    录制传输层：照常请求上游，同时把响应追加写入 gzip 压缩的 JSON Lines 文件
+
+    每条记录包含键（接口路径+参数）、状态码、响应正文和耗时；
+    每次打开文件都会追加一个新的 gzip 成员，可多次录制到同一文件。
+    """
+
+    def __init__(self, session: requests.Session, path: str):
+        super().__init__(session)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+        self.recorded = 0
+        atexit.register(self.close)
+
+    def get(self, url: str, params: Optional[Dict] = None, timeout: float = 10,
+            proxies: Optional[Dict] = None):
+        started = time.perf_counter()
+        response = super().get(url, params=params, timeout=timeout, proxies=proxies)
+        record = {
+            'key': request_key(url, params),
+            'status': response.status_code,
+            'elapsed': round(time.perf_counter() - started, 4),
+            'body': response.text
+        }
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+                # 逐条刷新，进程被杀时已录制的内容仍可读出
+                self._file.flush()
+                self.recorded += 1
+        return response
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class ReplayTransport:
+    """
+    回放传输层：从录制文件返回响应，不访问网络，用于离线可复现的压测
+
+    同一个键录制了多条响应时按录制顺序依次返回，用完后循环。精确匹配失败时
+    忽略 loose_params 中的时间参数再匹配一次（增量拉取的 startTime 每次都不同）。
+    找不到录制时抛出 ConnectionError，与断网时的表现一致。
+    """
+
+    LOOSE_PARAMS = ('startTime', 'endTime')
+
+    def __init__(self, path: str, latency: float = 0.0, use_recorded_latency: bool = False,
+                 loose_params: tuple = LOOSE_PARAMS):
+        """
+        Args:
+            path: RecordingTransport 生成的录制文件
+            latency: 每个请求额外模拟的延迟（秒）
+            use_recorded_latency: 是否按录制时的耗时模拟延迟（与 latency 叠加）
+            loose_params: 精确匹配失败时忽略的参数
+        """
+        self.path = path
+        self.latency = latency
+        self.use_recorded_latency = use_recorded_latency
+        self.loose_params = tuple(loose_params)
+
+        self._lock = threading.Lock()
+        self._records: Dict[str, List[Dict]] = {}
+        self._loose: Dict[str, List[Dict]] = {}
+        self._cursors: Dict[str, int] = {}
+        self.stats = {'hits': 0, 'loose_hits': 0, 'misses': 0}
+        self._load()
+
+    def _load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        # 录制中断时最后一行可能不完整
+                        print(f"录制文件格式错误，已跳过: {e}")
+                        continue
+                    self._records.setdefault(record['key'], []).append(record)
+                    loose_key = self._loose_key(record['key'])
+                    self._loose.setdefault(loose_key, []).append(record)
+            except EOFError:
+                # 录制进程未正常退出时缺少gzip结尾，保留已读出的记录
+                pass
+
+    def _loose_key(self, key: str) -> str:
+        path, _, query = key.partition('?')
+        kept = [item for item in query.split('&')
+                if item and item.split('=', 1)[0] not in self.loose_params]
+        return path + '?' + '&'.join(kept)
+
+    def _next(self, table: Dict[str, List[Dict]], key: str, cursor_key: str) -> Optional[Dict]:
+        records = table.get(key)
+        if not records:
+            return None
+        index = self._cursors.get(cursor_key, 0)
+        self._cursors[cursor_key] = index + 1
+        return records[index % len(records)]
+
+    def get(self, url: str, params: Optional[Dict] = None, timeout: float = 10,
+            proxies: Optional[Dict] = None) -> RecordedResponse:
+        key = request_key(url, params)
+        with self._lock:
+            record = self._next(self._records, key, key)
+            if record is not None:
+                self.stats['hits'] += 1
+            else:
+                loose_key = self._loose_key(key)
+                record = self._next(self._loose, loose_key, '~' + loose_key)
+                self.stats['loose_hits' if record is not None else 'misses'] += 1
+
+        if record is None:
+            raise requests.exceptions.ConnectionError(f"录制文件中没有该请求: {key}")
+
+        delay = self.latency + (record.get('elapsed', 0.0) if self.use_recorded_latency else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        return RecordedResponse(record['status'], record['body'])
+
+    def close(self):
+        pass
+
+
+# 环境变量指定的录制/回放传输层在进程内共享，避免多个实例同时写同一个录制文件
+_env_transport = None
+_env_transport_lock = threading.Lock()
+
+
+def transport_from_env(session: requests.Session):
+    """
+    按环境变量选择传输层：
+        BITGET_RECORD=path    录制上游响应到 path
+        BITGET_REPLAY=path    从 path 回放，不访问网络
+        BITGET_REPLAY_LATENCY 回放时每个请求模拟的延迟（秒），或 'recorded' 按录制耗时
+    """
+    global _env_transport
+    replay_path = os.environ.get('BITGET_REPLAY')
+    record_path = os.environ.get('BITGET_RECORD')
+    if not replay_path and not record_path:
+        return HttpTransport(session)
+
+    with _env_transport_lock:
+        if _env_transport is None:
+            if replay_path:
+                latency = os.environ.get('BITGET_REPLAY_LATENCY', '')
+                if latency == 'recorded':
+                    _env_transport = ReplayTransport(replay_path, use_recorded_latency=True)
+                else:
+                    _env_transport = ReplayTransport(replay_path, latency=float(latency or 0))
+            else:
+                _env_transport = RecordingTransport(session, record_path)
+        return _env_transport
@@ -0,0 +1,186 @@
+import base64
+import hashlib
+import json
+import socketserver
+import struct
+import threading
+from typing import Dict, List, Optional
+
+# RFC 6455 握手使用的固定GUID
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def load_frames(path: str) -> List[Dict]:
+    """读取 BitgetWebSocketClient 录制的帧文件（JSON Lines，每行 {'t': 秒, 'frame': 文本}）"""
+    frames = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                frames.append(json.loads(line))
+    return frames
+
+
+class _ReplayHandler(socketserver.StreamRequestHandler):
+    """单个客户端连接：完成握手后按录制时间间隔回放帧，并应答ping"""
+
+    def handle(self):
+        server: 'WebSocketReplayServer' = self.server.replay
+        if not self._handshake():
+            return
+
+        server._on_connect()
+        self._closed = threading.Event()
+        self._send_lock = threading.Lock()
+        reader = threading.Thread(target=self._read_loop, daemon=True)
+        reader.start()
+
+        try:
+            last_t = 0.0
+            for entry in server.frames:
+                wait = max(0.0, (entry.get('t', 0.0) - last_t) / server.speed)
+                last_t = entry.get('t', 0.0)
+                if self._closed.wait(wait):
+                    return
+                self._send_text(entry['frame'])
+
+            if server.close_after_replay:
+                self._send_frame(0x8, b'')
+                return
+            # 回放结束后保持连接，仅应答心跳
+            while not self._closed.wait(0.1) and not server.stopped:
+                pass
+        except OSError:
+            pass
+
+    def _handshake(self) -> bool:
+        request_line = self.rfile.readline()
+        if not request_line:
+            return False
+        headers = {}
+        while True:
+            line = self.rfile.readline().decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        key = headers.get('sec-websocket-key')
+        if not key:
+            return False
+        accept = base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+        self.wfile.write((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode())
+        return True
+
+    def _read_loop(self):
+        server: 'WebSocketReplayServer' = self.server.replay
+        try:
+            while True:
+                frame = self._read_frame()
+                if frame is None:
+                    break
+                opcode, payload = frame
+                if opcode == 0x8:
+                    break
+                if opcode == 0x9:
+                    self._send_frame(0xA, payload)
+                elif opcode == 0x1:
+                    text = payload.decode('utf-8', errors='replace')
+                    server._on_client_message(text)
+                    if text == 'ping':
+                        self._send_text('pong')
+        except (OSError, ValueError):  # handle 返回后连接的读写流已关闭
+            pass
+        finally:
+            self._closed.set()
+
+    def _read_frame(self) -> Optional[tuple]:
+        header = self.rfile.read(2)
+        if len(header) < 2:
+            return None
+        opcode = header[0] & 0x0F
+        masked = header[1] & 0x80
+        length = header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if masked else b''
+        payload = self.rfile.read(length)
+        if masked:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return opcode, payload
+
+    def _send_text(self, text: str):
+        self._send_frame(0x1, text.encode('utf-8'))
+
+    def _send_frame(self, opcode: int, payload: bytes):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        with self._send_lock:
+            self.wfile.write(header + payload)
+            self.wfile.flush()
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class WebSocketReplayServer:
+    """本地 WebSocket 替身服务器：回放录制的行情帧，用于离线测试 BitgetWebSocketClient"""
+
+    def __init__(self, frames: List[Dict], host: str = '127.0.0.1', port: int = 0,
+                 speed: float = 1.0, close_after_replay: bool = False):
+        """
+        Args:
+            frames: 录制的帧列表，可由 load_frames 读取
+            host: 监听地址
+            port: 监听端口，0表示自动分配
+            speed: 回放速度倍数，越大越快
+            close_after_replay: 回放完毕后主动断开连接（用于测试重连）
+        """
+        self.frames = frames
+        self.speed = speed if speed > 0 else 1.0
+        self.close_after_replay = close_after_replay
+        self.stopped = False
+
+        self.connections = 0
+        self.client_messages: List[str] = []
+        self._lock = threading.Lock()
+
+        self._server = _ThreadingServer((host, port), _ReplayHandler)
+        self._server.replay = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"ws://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.stopped = True
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _on_connect(self):
+        with self._lock:
+            self.connections += 1
+
+    def _on_client_message(self, text: str):
+        with self._lock:
+            self.client_messages.append(text)
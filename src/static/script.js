@@ -95,7 +95,12 @@ function startDataUpdates() {
                 updatePriceDisplay(oldPrice);
                 updateAnalysisDisplays();
                 updateChart();
-                updateStatus('connected', '实时更新中...');
+                if (result.data.stale) {
+                    // 上游异常时服务端返回最后一次成功获取的数据
+                    updateStatus('connecting', `数据延迟 ${Math.round(result.data.data_age_ms / 1000)}秒`);
+                } else {
+                    updateStatus('connected', '实时更新中...');
+                }
             }
         } catch (error) {
             console.error('更新数据失败:', error);
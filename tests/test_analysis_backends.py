@@ -0,0 +1,105 @@
+import math
+import random
+
+import pytest
+
+from src.services import analysis_backends
+from src.services.analysis_backends import NUMPY_MIN_CANDLES, PYTHON_BACKEND, NumpyAnalysisBackend, select_backend
+from src.services.candle_columns import CandleColumns
+
+np = pytest.importorskip('numpy')
+NUMPY_BACKEND = NumpyAnalysisBackend()
+
+
+def make_columns(rng, count, tick):
+    """随机K线；tick=True 时价格只取少数几个值，高低点大量相等"""
+    rows = []
+    price = 2000.0
+    for i in range(count):
+        if tick:
+            close = float(rng.randint(0, 4))
+            high = close + rng.randint(0, 1)
+            low = close - rng.randint(0, 1)
+        else:
+            price += rng.gauss(0, 2)
+            close = price
+            high = price + rng.random()
+            low = price - rng.random()
+        rows.append([i * 60000, close, high, low, close, 1.0, close])
+    return CandleColumns.from_rows(rows)
+
+
+def both(candles):
+    """同一数据分别转换为两个后端的输入"""
+    return PYTHON_BACKEND.prepare(candles), NUMPY_BACKEND.prepare(candles)
+
+
+CASES = [(size, tick, seed) for size in (1, 2, 5, 24, 99, 100, 250) for tick in (False, True) for seed in (1, 2)]
+
+
+def assert_floats_close(expected, actual):
+    assert len(expected) == len(actual)
+    for a, b in zip(expected, actual):
+        assert math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9), (a, b)
+
+
+@pytest.mark.parametrize('size,tick,seed', CASES)
+def test_moving_averages(size, tick, seed):
+    python_candles, numpy_candles = both(make_columns(random.Random(seed), size, tick))
+    periods = [5, 10, 20, 50, 100, 200]
+    expected = PYTHON_BACKEND.moving_averages(python_candles.close, periods)
+    actual = NUMPY_BACKEND.moving_averages(numpy_candles.close, periods)
+    assert expected.keys() == actual.keys()
+    assert_floats_close(list(expected.values()), list(actual.values()))
+
+
+@pytest.mark.parametrize('size,tick,seed', CASES)
+@pytest.mark.parametrize('lookback', [1, 24, 100])
+def test_extremes_first_occurrence(size, tick, seed, lookback):
+    python_candles, numpy_candles = both(make_columns(random.Random(seed), size, tick))
+    expected = PYTHON_BACKEND.extremes(python_candles.high, python_candles.low, lookback)
+    actual = NUMPY_BACKEND.extremes(numpy_candles.high, numpy_candles.low, lookback)
+    assert expected == actual
+    # 位置为窗口内首次出现处
+    highs = list(python_candles.high[-lookback:])
+    assert expected[2] == highs.index(max(highs))
+
+
+@pytest.mark.parametrize('size,tick,seed', [case for case in CASES if case[0] >= 2])
+def test_regression(size, tick, seed):
+    python_candles, numpy_candles = both(make_columns(random.Random(seed), size, tick))
+    expected = PYTHON_BACKEND.regression(python_candles.close, 50)
+    actual = NUMPY_BACKEND.regression(numpy_candles.close, 50)
+    assert expected[0] == actual[0] and expected[1] == actual[1] and expected[4] == actual[4]
+    assert_floats_close(expected[2:4] + expected[5:], actual[2:4] + actual[5:])
+
+
+@pytest.mark.parametrize('size,tick,seed', CASES)
+@pytest.mark.parametrize('width', [1, 2, 3])
+def test_local_extremes(size, tick, seed, width):
+    python_candles, numpy_candles = both(make_columns(random.Random(seed), size, tick))
+    expected = PYTHON_BACKEND.local_extremes(python_candles.high, python_candles.low, 100, width)
+    actual = NUMPY_BACKEND.local_extremes(numpy_candles.high, numpy_candles.low, 100, width)
+    assert expected == actual
+
+
+def test_python_backend_accepts_memoryview_columns():
+    candles = make_columns(random.Random(3), 120, True)
+    views = CandleColumns(*(memoryview(column) for column in candles.columns()))
+    assert PYTHON_BACKEND.extremes(views.high, views.low, 100) == PYTHON_BACKEND.extremes(candles.high, candles.low, 100)
+
+
+def test_select_backend_thresholds():
+    assert select_backend(NUMPY_MIN_CANDLES - 1) is PYTHON_BACKEND
+    assert select_backend(NUMPY_MIN_CANDLES).name == 'numpy'
+    assert select_backend(10, 'numpy').name == 'numpy'
+    assert select_backend(10_000, 'python') is PYTHON_BACKEND
+    with pytest.raises(ValueError):
+        select_backend(10, 'fortran')
+
+
+def test_select_backend_without_numpy(monkeypatch):
+    monkeypatch.setattr(analysis_backends, 'NUMPY_BACKEND', None)
+    assert select_backend(10_000) is PYTHON_BACKEND
+    with pytest.raises(ImportError):
+        select_backend(10, 'numpy')
@@ -0,0 +1,101 @@
+from src.services.analysis_cache import AnalysisCache
+from src.services.candle_store import CandleStore
+from src.services.ingestion_service import IngestionService
+from src.services.simple_technical_analysis import SimpleTechnicalAnalysis
+
+START = 1700000000000
+STEP = 60000
+
+
+def candle(i, close=1.5):
+    return [START + i * STEP, 1.0, 2.0, 0.5, close, 1.0, 1.0]
+
+
+class Counter:
+    """compute 回调：返回带序号的新结果并记录调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {'n': self.calls}
+
+
+def test_same_version_is_served_from_cache():
+    cache = AnalysisCache()
+    compute = Counter()
+    first = cache.get_or_compute('ETHUSDT', '1m', 'cfg', 1, compute)
+    assert cache.get_or_compute('ETHUSDT', '1m', 'cfg', 1, compute) is first
+    assert compute.calls == 1
+
+    # 版本变化后重新计算
+    assert cache.get_or_compute('ETHUSDT', '1m', 'cfg', 2, compute) == {'n': 2}
+    assert cache.get_or_compute('ETHUSDT', '1m', 'cfg', 2, compute) == {'n': 2}
+    assert cache.get_stats() == {'hits': 2, 'misses': 2, 'evictions': 0, 'entries': 1, 'hit_rate': 0.5}
+
+
+def test_keys_include_series_and_config():
+    cache = AnalysisCache()
+    compute = Counter()
+    for symbol, granularity, config in [('ETHUSDT', '1m', 'a'), ('ETHUSDT', '1m', 'b'),
+                                        ('ETHUSDT', '5m', 'a'), ('BTCUSDT', '1m', 'a')]:
+        cache.get_or_compute(symbol, granularity, config, 1, compute)
+    assert compute.calls == 4 and cache.get_stats()['entries'] == 4
+
+
+def test_older_result_does_not_replace_newer():
+    cache = AnalysisCache()
+    compute = Counter()
+    newer = cache.get_or_compute('ETHUSDT', '1m', 'cfg', 3, compute)
+    # 并发时较慢的旧版本计算后完成：返回给其调用方，但不写入缓存
+    assert cache.get_or_compute('ETHUSDT', '1m', 'cfg', 2, compute) == {'n': 2}
+    assert cache.get_or_compute('ETHUSDT', '1m', 'cfg', 3, compute) is newer
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = AnalysisCache(max_entries=2)
+    compute = Counter()
+    cache.get_or_compute('A', '1m', 'cfg', 1, compute)
+    cache.get_or_compute('B', '1m', 'cfg', 1, compute)
+    cache.get_or_compute('A', '1m', 'cfg', 1, compute)
+    cache.get_or_compute('C', '1m', 'cfg', 1, compute)
+    assert cache.get_stats()['evictions'] == 1
+    cache.get_or_compute('A', '1m', 'cfg', 1, compute)
+    assert compute.calls == 3
+    cache.get_or_compute('B', '1m', 'cfg', 1, compute)
+    assert compute.calls == 4
+
+
+def test_service_invalidates_analysis_when_series_changes():
+    analyzer = SimpleTechnicalAnalysis()
+    service = IngestionService(None, CandleStore(), analyzer=analyzer, resample=False)
+    store = service.store
+    assert service.get_analysis('ETHUSDT', '1m') is None
+
+    store.update('ETHUSDT', '1m', [candle(i) for i in range(30)])
+    first = service.get_analysis('ETHUSDT', '1m')
+    assert service.get_analysis('ETHUSDT', '1m') is first
+    assert first['current_price'] == 1.5
+
+    # 内容相同的合并不改变版本，继续命中
+    assert not store.merge('ETHUSDT', '1m', [candle(29)])
+    assert service.get_analysis('ETHUSDT', '1m') is first
+
+    # 形成中的K线价格变化
+    store.merge('ETHUSDT', '1m', [candle(29, close=1.8)])
+    second = service.get_analysis('ETHUSDT', '1m')
+    assert second is not first and second['current_price'] == 1.8
+
+    # 缺口修复即使不插入新K线也推进版本
+    store.patch('ETHUSDT', '1m', [candle(10, close=1.6)])
+    assert service.get_analysis('ETHUSDT', '1m') is not second
+
+    # 分析配置不同的服务共享缓存时结果分开保存
+    other_analyzer = SimpleTechnicalAnalysis()
+    other_analyzer.ma_periods = [5, 10]
+    other = IngestionService(None, store, analyzer=other_analyzer, resample=False,
+                             analysis_cache=service.analysis_cache)
+    assert other.get_analysis('ETHUSDT', '1m') is not service.get_analysis('ETHUSDT', '1m')
+    stats = service.analysis_cache.get_stats()
+    assert stats['entries'] == 2 and stats['misses'] == 4
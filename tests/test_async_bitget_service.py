@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web
+
+from src.services.async_bitget_service import AsyncBitgetService
+from src.services.rate_limiter import RateLimiter
+
+
+async def start_server(delay: float):
+    """响应前等待 delay 秒的假行情接口"""
+    async def candles(request):
+        await asyncio.sleep(delay)
+        return web.json_response({'code': '00000', 'data': [
+            [str(1700000000000 + i * 60000), '1', '2', '0.5', '1.5', '10', '15'] for i in range(3)]})
+
+    app = web.Application()
+    app.router.add_get('/api/v2/mix/market/candles', candles)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}'
+
+
+async def fetch(delay: float, request_timeout: float, timeout=None):
+    runner, base_url = await start_server(delay)
+    try:
+        async with AsyncBitgetService(proxy=None, request_timeout=request_timeout,
+                                      rate_limiter=RateLimiter()) as service:
+            service.base_url = base_url
+            start = time.perf_counter()
+            klines = await service.get_klines('ETHUSDT', '1m', timeout=timeout)
+            return klines, time.perf_counter() - start
+    finally:
+        await runner.cleanup()
+
+
+def test_slow_server_times_out_within_request_timeout():
+    klines, elapsed = asyncio.run(fetch(delay=2.0, request_timeout=0.5))
+    assert klines == []
+    assert elapsed < 1.5
+
+
+def test_per_call_timeout_overrides_session_default():
+    klines, elapsed = asyncio.run(fetch(delay=2.0, request_timeout=10.0, timeout=0.3))
+    assert klines == []
+    assert elapsed < 1.5
+
+
+def test_fast_server_returns_klines():
+    klines, _ = asyncio.run(fetch(delay=0, request_timeout=0.5))
+    assert [row[0] for row in klines] == [1700000000000, 1700000060000, 1700000120000]
@@ -0,0 +1,89 @@
+import json
+import os
+
+import pytest
+
+from src.services.backfill_service import BackfillService
+
+DAY = 86400000
+# 日线按UTC+8划分，开盘于16:00 UTC
+PHASE = 16 * 3600000
+
+
+class FakeBitget:
+    """历史接口：每个周期都有K线，K线起点偏移为 phase；页面起点在 fail 中的请求失败"""
+
+    def __init__(self, step, phase=0, fail=()):
+        self.step = step
+        self.phase = phase
+        self.fail = set(fail)
+        self.pages = []
+
+    def get_history_klines(self, symbol, granularity, start_time, end_time, limit):
+        self.pages.append((start_time, end_time))
+        if start_time in self.fail:
+            raise ConnectionError('模拟上游故障')
+        first = start_time + (self.phase - start_time) % self.step
+        return [[ts, 1.0, 2.0, 0.5, 1.5, 1.0, 1.0] for ts in range(first, end_time + 1, self.step)][:int(limit)]
+
+
+@pytest.mark.parametrize('granularity,step,phase', [('1m', 60000, 0), ('1D', DAY, PHASE), ('1W', 7 * DAY, PHASE)])
+def test_plan_pages_cover_range_exactly(granularity, step, phase):
+    start = 1700000000000 + phase
+    start -= (start - phase) % step
+    end = start + 450 * step
+    pages = BackfillService.plan_pages(granularity, start, end)
+    assert pages[0][1] == end and pages[-1][0] == start
+    # 页面首尾相接，不重叠也不留空隙
+    for (newer_start, _), (_, older_end) in zip(pages, pages[1:]):
+        assert older_end == newer_start - 1
+    for page_start, page_end in pages:
+        bars = [ts for ts in range(start, end + 1, step) if page_start <= ts <= page_end]
+        assert 0 < len(bars) <= BackfillService.PAGE_SIZE
+
+
+def test_daily_bars_at_utc8_boundaries_are_backfilled():
+    first = 1700000000000 - 1700000000000 % DAY + PHASE
+    bitget = FakeBitget(DAY, PHASE)
+    service = BackfillService(bitget, progress_path=None, max_workers=1)
+    stats = service.backfill('ETHUSDT', '1D', first, first + 9 * DAY)
+    # 区间两端16:00 UTC开盘的K线都要取到
+    assert [k[0] for k in stats['klines']] == [first + i * DAY for i in range(10)]
+
+
+def test_progress_log_resume_and_compaction(tmp_path):
+    path = str(tmp_path / 'progress.json')
+    start, end = 0, 999 * 60000
+    pages = BackfillService.plan_pages('1m', start, end)
+    assert len(pages) == 5
+    failed_page = pages[2][0]
+
+    bitget = FakeBitget(60000, fail=[failed_page])
+    service = BackfillService(bitget, max_workers=2, max_retries=1, progress_path=path)
+    stats = service.backfill('ETHUSDT', '1m', start, end)
+    assert stats['failed'] == 1 and stats['fetched'] == 4
+    # 任务未完成：日志合并进进度文件后删除
+    assert not os.path.exists(path + '.log')
+    with open(path, encoding='utf-8') as f:
+        done = json.load(f)['ETHUSDT:1m:0:59940000']
+    assert sorted(done) == sorted(page[0] for page in pages if page[0] != failed_page)
+
+    # 续传只请求失败的页面，全部完成后删除该任务的进度
+    bitget.fail.clear()
+    bitget.pages.clear()
+    stats = service.backfill('ETHUSDT', '1m', start)
+    assert stats['skipped'] == 4 and stats['fetched'] == 1
+    assert bitget.pages == [pages[2]]
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f) == {}
+
+
+def test_progress_log_survives_interruption(tmp_path):
+    path = str(tmp_path / 'progress.json')
+    service = BackfillService(FakeBitget(60000), progress_path=path)
+    service._mark_done('ETHUSDT:1m:0:100', 0)
+    service._mark_done('ETHUSDT:1m:0:100', 60000)
+    # 中断时写了一半的最后一行被忽略
+    with open(path + '.log', 'a', encoding='utf-8') as f:
+        f.write('ETHUSDT:1m:0:100 12')
+    assert service._load_progress() == {'ETHUSDT:1m:0:100': [0, 60000]}
@@ -0,0 +1,128 @@
+import json
+import time
+
+import pytest
+
+from src.services.bitget_ws_service import BitgetWebSocketClient
+from src.services.candle_store import CandleStore
+from src.services.ingestion_service import IngestionService
+from src.services.ws_replay_server import WebSocketReplayServer
+
+pytest.importorskip('websocket')
+
+START = 1700000000000
+
+
+class FakeBitget:
+    """REST接口：重连补数时返回空"""
+
+    def get_klines_columnar(self, symbol, granularity, limit, start_time=None):
+        return None
+
+
+def candle_frame(ts, close):
+    """录制的K线推送帧（与 BitgetWebSocketClient 录制文件中的格式相同）"""
+    row = [str(ts), '2000', str(close + 1), '1999', str(close), '10', '20000']
+    return {'t': 0.01, 'frame': json.dumps({
+        'action': 'update',
+        'arg': {'instType': 'USDT-FUTURES', 'channel': 'candle1m', 'instId': 'ETHUSDT'},
+        'data': [row],
+        'ts': ts
+    })}
+
+
+FRAMES = [
+    {'t': 0.0, 'frame': json.dumps({'event': 'subscribe', 'arg': {'channel': 'candle1m', 'instId': 'ETHUSDT'}})},
+    candle_frame(START, 2000.5),
+    candle_frame(START, 2001.5),
+    candle_frame(START + 60000, 2002.5),
+    # 格式错误的行被跳过
+    {'t': 0.01, 'frame': json.dumps({
+        'arg': {'instType': 'USDT-FUTURES', 'channel': 'candle1m', 'instId': 'ETHUSDT'},
+        'data': [['oops', None, '1', '1', '1', '1', '1']]
+    })},
+    {'t': 0.01, 'frame': json.dumps({
+        'arg': {'instType': 'USDT-FUTURES', 'channel': 'ticker', 'instId': 'ETHUSDT'},
+        'data': [{'lastPr': '2002.5', 'ts': str(START + 61000)}]
+    })},
+]
+
+
+def wait_until(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def make_client(server, **kwargs):
+    store = CandleStore()
+    ingestion = IngestionService(FakeBitget(), store, resample=False)
+    client = BitgetWebSocketClient(store, ingestion, url=server.url, **kwargs)
+    client.subscribe_candles('ETHUSDT', '1m')
+    client.subscribe_ticker('ETHUSDT')
+    return client, store, ingestion
+
+
+def test_replay_subscribes_ingests_and_hands_back_to_rest():
+    server = WebSocketReplayServer(FRAMES, speed=10.0, close_after_replay=True)
+    server.start()
+    client, store, ingestion = make_client(server, reconnect_delay=5.0)
+    try:
+        assert client.start()
+        assert wait_until(lambda: store.get_ticker('ETHUSDT') is not None)
+
+        subscribe = json.loads(server.client_messages[0])
+        assert subscribe['op'] == 'subscribe'
+        assert {'instType': 'USDT-FUTURES', 'channel': 'candle1m', 'instId': 'ETHUSDT'} in subscribe['args']
+        assert {'instType': 'USDT-FUTURES', 'channel': 'ticker', 'instId': 'ETHUSDT'} in subscribe['args']
+
+        # 同一根K线的更新合并，形成中的K线以最后一次推送为准
+        klines = store.get('ETHUSDT', '1m')['klines']
+        assert list(klines.timestamp) == [START, START + 60000]
+        assert list(klines.close) == [2001.5, 2002.5]
+        assert store.get_ticker('ETHUSDT')['price'] == 2002.5
+
+        # 回放结束后服务器断开：推送的序列交还给REST轮询，等待重连
+        assert wait_until(lambda: not client.is_connected())
+        assert wait_until(lambda: not ingestion._streaming)
+        assert client.get_stats()['streaming'] == []
+        assert client.get_stats()['candle_updates'] == 3
+    finally:
+        client.stop()
+        server.stop()
+
+
+def test_streaming_series_skips_rest_polling():
+    server = WebSocketReplayServer(FRAMES, speed=10.0)
+    server.start()
+    client, store, ingestion = make_client(server)
+    try:
+        client.start()
+        assert wait_until(lambda: ('ETHUSDT', '1m') in ingestion._streaming)
+        assert client.get_stats()['streaming'] == ['ETHUSDT:1m']
+    finally:
+        client.stop()
+        server.stop()
+
+
+@pytest.mark.parametrize('stable_after,max_connections', [(10.0, 8), (0.0, None)])
+def test_backoff_resets_only_after_stable_connection(stable_after, max_connections):
+    # 握手成功后立即断开的服务器
+    server = WebSocketReplayServer([], close_after_replay=True)
+    server.start()
+    client, _, _ = make_client(server, reconnect_delay=0.05, max_reconnect_delay=0.4,
+                               stable_after=stable_after)
+    try:
+        client.start()
+        time.sleep(1.2)
+    finally:
+        client.stop()
+        server.stop()
+    if max_connections is not None:
+        # 0.05, 0.1, 0.2, 0.4, 0.4 ... 退避，而不是每次都以0.05秒重连
+        assert 3 <= server.connections <= max_connections
+    else:
+        assert server.connections > 10
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from src.services.candle_archive import ArchiveSeries, CandleArchive
+from src.services.candle_db import CandleDatabase
+from src.services.simple_technical_analysis import SimpleTechnicalAnalysis
+
+START = 1700000000000
+STEP = 60000
+
+
+def candles(start, count):
+    return [[START + i * STEP, 2000.0 + i, 2001.0 + i, 1999.0 + i, 2000.5 + i, 1.0, 2.0]
+            for i in range(start, start + count)]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = CandleArchive(str(tmp_path / 'archive'), durable=False)
+    yield archive
+    archive.close()
+
+
+def test_append_and_read_round_trip(archive):
+    assert archive.append('ETHUSDT', '1m', candles(0, 100)) == 100
+    # 已归档的部分被跳过
+    assert archive.append('ETHUSDT', '1m', candles(90, 20)) == 10
+    columns = archive.read('ETHUSDT', '1m')
+    assert columns['timestamp'].tolist() == [START + i * STEP for i in range(110)]
+    assert columns['close'][5] == 2005.5 and columns['amount'].dtype == np.float64
+    assert not columns['close'].flags.writeable
+    assert archive.series('ETHUSDT', '1m').last_timestamp() == START + 109 * STEP
+
+    part = archive.read('ETHUSDT', '1m', START + 10 * STEP, START + 19 * STEP)
+    assert part['timestamp'].tolist() == [START + i * STEP for i in range(10, 20)]
+    assert len(archive.read('BTCUSDT', '1m')['timestamp']) == 0
+
+
+def test_reader_sees_appends_across_file_growth(archive, monkeypatch):
+    monkeypatch.setattr(ArchiveSeries, 'GROW_ROWS', 8)
+    writer = archive.series('ETHUSDT', '1m')
+    # 另一个实例（如另一个进程）打开同一目录
+    reader = ArchiveSeries(writer.directory)
+    try:
+        writer.append(candles(0, 5))
+        first = reader.read()
+        assert len(first['timestamp']) == 5
+        writer.append(candles(5, 20))
+        assert reader.read()['timestamp'].tolist() == [START + i * STEP for i in range(25)]
+        # 之前返回的数组仍然有效
+        assert first['timestamp'].tolist() == [START + i * STEP for i in range(5)]
+        assert os.path.getsize(os.path.join(writer.directory, 'close.col')) == 32 * 8
+    finally:
+        reader.close()
+
+
+def test_uncommitted_rows_are_ignored_and_overwritten(archive):
+    series = archive.series('ETHUSDT', '1m')
+    series.append(candles(0, 10))
+    # 模拟写完数据列、提交长度之前崩溃
+    os.pwrite(series._fds['timestamp'], np.array([START + 99 * STEP], dtype=np.int64).tobytes(), 10 * 8)
+    os.pwrite(series._fds['close'], np.array([9.0]).tobytes(), 10 * 8)
+    assert len(series) == 10
+    assert series.last_timestamp() == START + 9 * STEP
+    assert series.append(candles(10, 1)) == 1
+    columns = series.read()
+    assert columns['timestamp'][-1] == START + 10 * STEP and columns['close'][-1] == 2010.5
+
+
+def test_import_from_database_skips_forming_candle(archive, tmp_path):
+    database = CandleDatabase(str(tmp_path / 'candles.db'))
+    try:
+        database.upsert('ETHUSDT', '1m', candles(0, 30))
+        assert archive.import_from_database(database, 'ETHUSDT', '1m', chunk_size=7) == 29
+        database.upsert('ETHUSDT', '1m', candles(30, 5))
+        assert archive.import_from_database(database, 'ETHUSDT', '1m') == 5
+    finally:
+        database.close()
+    assert archive.read('ETHUSDT', '1m')['timestamp'].tolist() == [START + i * STEP for i in range(34)]
+
+
+def test_series_directory_is_sanitized(archive):
+    series = archive.series('../ETH/USDT', '1m')
+    assert os.path.commonpath([series.directory, archive.root]) == archive.root
+
+
+def test_analysis_on_archived_columns(archive):
+    rows = candles(0, 300)
+    archive.append('ETHUSDT', '1m', rows)
+    analyzer = SimpleTechnicalAnalysis(backend='numpy')
+    assert analyzer.analyze(archive.read('ETHUSDT', '1m')) == analyzer.analyze(rows)
@@ -0,0 +1,33 @@
+import pytest
+
+from src.services.candle_columns import CandleColumns
+
+
+def bitget_rows(count, start=1700000000000):
+    # Bitget 按时间倒序返回字符串行
+    return [[str(start + i * 60000), '1.5', '2', '1', '1.75', '10', '17.5'] for i in range(count)][::-1]
+
+
+def test_from_bitget_parses_and_sorts():
+    columns = CandleColumns.from_bitget(bitget_rows(3))
+    assert list(columns.timestamp) == [1700000000000, 1700000060000, 1700000120000]
+    assert columns.row(0) == [1700000000000, 1.5, 2.0, 1.0, 1.75, 10.0, 17.5]
+
+
+def test_from_bitget_skips_malformed_rows():
+    data = bitget_rows(4)
+    data[1] = data[1][:5]
+    data[2] = ['x'] + data[2][1:]
+    columns = CandleColumns.from_bitget(data)
+    assert len(columns) == 2
+    assert columns == CandleColumns.from_rows([[int(r[0])] + [float(v) for v in r[1:]] for r in (data[3], data[0])])
+
+
+def test_from_bitget_accepts_extra_columns():
+    data = [row + ['extra'] for row in bitget_rows(2)]
+    assert CandleColumns.from_bitget(data) == CandleColumns.from_bitget(bitget_rows(2))
+
+
+def test_from_bitget_rejects_non_sequence_rows():
+    with pytest.raises(TypeError):
+        CandleColumns.from_bitget([1, 2, 3])
@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+
+from src.services.candle_columns import CandleColumns
+from src.services.candle_db import CandleDatabase
+from src.services.candle_store import CandleStore
+from src.services.ingestion_service import IngestionService
+
+START = 1700000000000
+STEP = 60000
+
+
+def candle(i, close=1.5):
+    return [START + i * STEP, 1.0, 2.0, 0.5, close, 1.0, 1.0]
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = CandleDatabase(str(tmp_path / 'candles.db'), batch_size=7)
+    yield database
+    database.close()
+
+
+def test_upsert_and_read_range(database):
+    assert database.upsert('ETHUSDT', '1m', [candle(i) for i in range(20)]) == 20
+    # 已存在的时间戳覆盖（形成中的K线不断更新）
+    database.upsert('ETHUSDT', '1m', [candle(19, close=3.0)])
+    assert database.count('ETHUSDT', '1m') == 20
+    assert database.last_timestamp('ETHUSDT', '1m') == START + 19 * STEP
+    assert database.last_timestamp('BTCUSDT', '1m') is None
+
+    assert database.read_range('ETHUSDT', '1m', START + 5 * STEP, START + 7 * STEP).to_rows() == \
+        [candle(i) for i in range(5, 8)]
+    latest = database.latest('ETHUSDT', '1m', 3)
+    assert latest.to_rows() == [candle(17), candle(18), candle(19, close=3.0)]
+    assert not database.read_range('BTCUSDT', '1m')
+    assert database.keys() == [('ETHUSDT', '1m')]
+
+
+def test_iter_range_chunks(database):
+    database.upsert('ETHUSDT', '1m', [candle(i) for i in range(25)])
+    chunks = list(database.iter_range('ETHUSDT', '1m', START + 2 * STEP, chunk_size=10, end_time=START + 21 * STEP))
+    assert [len(chunk) for chunk in chunks] == [10, 10]
+    assert [ts for chunk in chunks for ts in chunk.timestamp] == [START + i * STEP for i in range(2, 22)]
+
+
+def test_delete(database):
+    database.upsert('ETHUSDT', '1m', [candle(i) for i in range(10)])
+    assert database.delete_timestamps('ETHUSDT', '1m', [START, START + STEP, START + 99 * STEP]) == 2
+    assert database.delete_range('ETHUSDT', '1m', end_time=START + 4 * STEP) == 3
+    assert list(database.read_range('ETHUSDT', '1m').timestamp) == [START + i * STEP for i in range(5, 10)]
+
+
+def test_threads_use_separate_connections(database):
+    errors = []
+
+    def write(offset):
+        try:
+            database.upsert('ETHUSDT', '1m', [candle(offset + i) for i in range(50)])
+        except Exception as e:
+            errors.append(e)
+        finally:
+            database.close()
+
+    threads = [threading.Thread(target=write, args=(i * 50,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert database.count('ETHUSDT', '1m') == 200
+
+
+class FakeBitget:
+    """上游序列 rows；指定 start_time 时只返回之后的K线"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def get_klines_columnar(self, symbol, granularity, limit, start_time=None):
+        self.calls.append(start_time)
+        rows = self.rows if start_time is None else [row for row in self.rows if row[0] >= start_time]
+        return CandleColumns.from_rows(rows[-int(limit):])
+
+
+def test_warm_restart_fetches_only_the_increment(tmp_path):
+    path = str(tmp_path / 'candles.db')
+    rows = [candle(i) for i in range(100)]
+    first = IngestionService(FakeBitget(rows), CandleStore(), limit='1000', database=CandleDatabase(path),
+                             resample=False)
+    try:
+        assert first.ensure_series('ETHUSDT', '1m')
+    finally:
+        first.stop()
+
+    # 重启：新进程的内存存储为空，从数据库恢复后只请求最后一根K线之后的数据
+    bitget = FakeBitget(rows + [candle(100), candle(101)])
+    second = IngestionService(bitget, CandleStore(), limit='1000', database=CandleDatabase(path), resample=False)
+    try:
+        assert second.ensure_series('ETHUSDT', '1m')
+    finally:
+        second.stop()
+    # 之后的请求来自后台采集线程，同样是增量请求
+    assert bitget.calls[0] == START + 99 * STEP and None not in bitget.calls
+    assert list(second.store.get('ETHUSDT', '1m')['klines'].timestamp) == [START + i * STEP for i in range(102)]
+    assert second.database.count('ETHUSDT', '1m') == 102
+
+
+def test_restored_series_is_served_when_upstream_is_down(tmp_path):
+    path = str(tmp_path / 'candles.db')
+    CandleDatabase(path).upsert('ETHUSDT', '1m', [candle(i) for i in range(30)])
+    service = IngestionService(FakeBitget([]), CandleStore(), database=CandleDatabase(path), resample=False)
+    try:
+        assert service.ensure_series('ETHUSDT', '1m')
+    finally:
+        service.stop()
+    series = service.store.get('ETHUSDT', '1m')
+    assert len(series['klines']) == 30
+    # 数据年龄从最后一根K线算起
+    assert series['fetched_at'] == START + 29 * STEP
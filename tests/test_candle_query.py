@@ -0,0 +1,106 @@
+import time
+
+from src.services.candle_query import CandleRangeQuery, _merge, _subtract
+from src.services.candle_store import CandleStore
+
+STEP = 60000
+DAY = 86400000
+# 日线按UTC+8划分，开盘于16:00 UTC
+PHASE = 16 * 3600000
+
+
+def candle(ts):
+    return [ts, 1.0, 2.0, 0.5, 1.5, 1.0, 1.0]
+
+
+class FakeBitget:
+    """历史接口：任意时间都有K线"""
+
+    def __init__(self):
+        self.pages = []
+
+    def get_history_klines(self, symbol, granularity, start_time, end_time, limit):
+        self.pages.append((start_time, end_time))
+        return [candle(ts) for ts in range(start_time, end_time + 1, STEP)]
+
+
+def setup_query(hole):
+    now = int(time.time() * 1000)
+    last = now - now % STEP
+    # 内存中最近100根K线，其中缺少 hole 处的一根
+    times = [last - i * STEP for i in range(99, -1, -1)]
+    store = CandleStore()
+    store.update('ETHUSDT', '1m', [candle(ts) for ts in times if ts != times[hole]])
+    bitget = FakeBitget()
+    return CandleRangeQuery(store, bitget), store, bitget, times
+
+
+def test_hole_in_memory_window_is_patched_into_store():
+    query, store, bitget, times = setup_query(hole=50)
+    result = query.query('ETHUSDT', '1m', times[0], times[-1])
+    assert list(result.timestamp) == times
+    assert len(bitget.pages) == 1
+    assert times[50] in store.get('ETHUSDT', '1m')['klines'].timestamp
+
+    # 再次查询不再请求上游
+    assert list(query.query('ETHUSDT', '1m', times[0], times[-1]).timestamp) == times
+    assert len(bitget.pages) == 1
+
+
+def test_history_without_database_is_cached():
+    query, store, bitget, times = setup_query(hole=50)
+    start = times[0] - 300 * STEP
+    end = times[0] - 100 * STEP
+    first = query.query('ETHUSDT', '1m', start, end)
+    pages = len(bitget.pages)
+    assert len(first) == 201 and pages
+
+    assert query.query('ETHUSDT', '1m', start, end) == first
+    # 与已补拉区间部分重叠的查询只请求未覆盖的部分
+    query.query('ETHUSDT', '1m', start - 10 * STEP, end)
+    assert len(bitget.pages) == pages + 1
+    assert bitget.pages[-1] == (start - 10 * STEP, start - 1)
+
+
+def test_interval_helpers():
+    assert _merge([(5, 9), (0, 3), (4, 4), (20, 30)]) == [(0, 9), (20, 30)]
+    assert _subtract(0, 100, [(10, 20), (50, 60)]) == [(0, 9), (21, 49), (61, 100)]
+    assert _subtract(15, 55, [(10, 20), (50, 60)]) == [(21, 49)]
+    assert _subtract(0, 5, [(0, 10)]) == []
+
+
+class DailyBitget:
+    """历史接口：任意时间都有日线"""
+
+    def __init__(self):
+        self.pages = []
+
+    def get_history_klines(self, symbol, granularity, start_time, end_time, limit):
+        self.pages.append((start_time, end_time))
+        first = start_time + (PHASE - start_time) % DAY
+        return [candle(ts) for ts in range(first, end_time + 1, DAY)]
+
+
+def test_daily_history_at_utc8_open_is_filled():
+    now = int(time.time() * 1000)
+    # 形成中的日线
+    last = now - (now - PHASE) % DAY
+    store = CandleStore()
+    store.update('ETHUSDT', '1D', [candle(last - i * DAY) for i in range(29, -1, -1)])
+    bitget = DailyBitget()
+    query = CandleRangeQuery(store, bitget)
+
+    first = last - 29 * DAY
+    start, end = first - 40 * DAY, first - 20 * DAY
+    expected = list(range(start, end + 1, DAY))
+    # 区间两端恰为16:00 UTC开盘的K线
+    assert list(query.query('ETHUSDT', '1D', start, end).timestamp) == expected
+    # 本地缺少区间开头的K线时同样补拉
+    assert list(query.query('ETHUSDT', '1D', start - DAY, end).timestamp) == [start - DAY] + expected
+
+    # 延伸到内存窗口的查询只请求与内存之间尚未补拉的部分
+    pages = len(bitget.pages)
+    assert list(query.query('ETHUSDT', '1D', start - DAY, first + DAY).timestamp) == \
+        [start - DAY] + list(range(start, first + 2 * DAY, DAY))
+    assert len(bitget.pages) == pages + 1
+    assert bitget.pages[-1] == (end + 1, first - DAY)
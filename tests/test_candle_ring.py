@@ -0,0 +1,117 @@
+import random
+
+import pytest
+
+from src.services.candle_ring import CandleRingBuffer
+
+START = 1700000000000
+STEP = 60000
+
+
+def candle(i, close=1.5):
+    return [START + i * STEP, 1.0, 2.0, 0.5, float(close), 1.0, float(i)]
+
+
+def rows(ring):
+    return ring.snapshot().to_rows()
+
+
+def test_append_wraps_around_capacity():
+    ring = CandleRingBuffer(5, slack=3)
+    assert len(ring) == 0 and ring.last_timestamp() is None
+    assert ring.nbytes == 7 * 8 * 8
+    for i in range(23):
+        ring.append(candle(i))
+        assert rows(ring) == [candle(j) for j in range(max(0, i - 4), i + 1)]
+    assert ring.last_timestamp() == START + 22 * STEP
+    assert ring.view(2).to_rows() == [candle(21), candle(22)]
+    assert ring.view(100).to_rows() == rows(ring)
+
+
+def test_update_last_in_place():
+    ring = CandleRingBuffer(3, slack=1)
+    with pytest.raises(IndexError):
+        ring.update_last(candle(0))
+    ring.extend([candle(i) for i in range(4)])
+    ring.update_last(candle(3, close=9.0))
+    assert rows(ring) == [candle(1), candle(2), candle(3, close=9.0)]
+
+
+def test_extend_keeps_latest_window():
+    ring = CandleRingBuffer(10, slack=4)
+    ring.extend([candle(i) for i in range(25)])
+    assert rows(ring) == [candle(i) for i in range(15, 25)]
+    # 追加空间不足时先丢弃挤出窗口的旧数据再搬回开头
+    ring.extend([candle(i) for i in range(25, 32)])
+    assert rows(ring) == [candle(i) for i in range(22, 32)]
+    ring.extend([])
+    assert len(ring) == 10
+
+
+def test_merge_replaces_tail():
+    ring = CandleRingBuffer(6, slack=2)
+    ring.extend([candle(i) for i in range(5)])
+    assert not ring.merge([candle(3), candle(4)])
+    assert not ring.merge([])
+    assert ring.merge([candle(4, close=3.0), candle(5), candle(6)])
+    assert rows(ring) == [candle(1), candle(2), candle(3), candle(4, close=3.0), candle(5), candle(6)]
+    # 新数据早于窗口时整体替换
+    assert ring.merge([candle(-5), candle(-4)])
+    assert rows(ring) == [candle(-5), candle(-4)]
+
+
+def test_patch_inside_window_only():
+    ring = CandleRingBuffer(10, slack=2)
+    ring.extend([candle(i) for i in range(10) if i not in (3, 4)])
+    assert ring.patch([candle(3), candle(4, close=2.0), candle(5, close=7.0), candle(20)]) == 2
+    assert rows(ring) == [candle(i, close={4: 2.0, 5: 7.0}.get(i, 1.5)) for i in range(10)]
+    assert CandleRingBuffer(3).patch([candle(0)]) == 0
+
+
+def test_snapshot_is_reused_until_next_write():
+    ring = CandleRingBuffer(4, slack=1)
+    ring.extend([candle(i) for i in range(3)])
+    snapshot = ring.snapshot()
+    assert ring.snapshot() is snapshot
+    ring.append(candle(3))
+    assert ring.snapshot() is not snapshot
+    # 旧快照是独立副本，不受之后写入影响
+    assert snapshot.to_rows() == [candle(i) for i in range(3)]
+
+
+def test_random_operations_match_list_model():
+    rng = random.Random(7)
+    capacity = 8
+    ring = CandleRingBuffer(capacity, slack=3)
+    model = []
+    next_i = 0
+    nbytes = ring.nbytes
+    for _ in range(2000):
+        op = rng.random()
+        if op < 0.4:
+            row = candle(next_i, close=rng.random())
+            next_i += 1
+            ring.append(row)
+            model.append(row)
+        elif op < 0.6 and model:
+            row = candle(next_i - 1, close=rng.random())
+            ring.update_last(row)
+            model[-1] = row
+        elif op < 0.8:
+            count = rng.randint(1, 12)
+            new = [candle(next_i + j, close=rng.random()) for j in range(count)]
+            next_i += count
+            ring.extend(new)
+            model.extend(new)
+        else:
+            back = rng.randint(0, min(3, next_i))
+            count = rng.randint(1, 5)
+            new = [candle(next_i - back + j, close=rng.random()) for j in range(count)]
+            next_i = max(next_i, next_i - back + count)
+            ring.merge(new)
+            model = [row for row in model if row[0] < new[0][0]] + new
+        model = model[-capacity:]
+        assert rows(ring) == model
+        assert len(ring) == len(model)
+        # 预分配的数组不会增长
+        assert ring.nbytes == nbytes
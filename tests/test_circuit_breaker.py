@@ -0,0 +1,144 @@
+import json
+import time
+
+from src.services.bitget_service import BitgetService
+from src.services.candle_columns import CandleColumns
+from src.services.candle_store import CandleStore
+from src.services.circuit_breaker import CircuitBreaker
+from src.services.ingestion_service import IngestionService
+from src.services.rate_limiter import RateLimiter
+from src.services.transports import RecordedResponse
+
+
+def make_breaker(**kwargs):
+    return CircuitBreaker(failure_threshold=3, base_backoff=0.05, max_backoff=0.2, **kwargs)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_opens_after_consecutive_failures():
+    breaker = make_breaker()
+    breaker.record_failure()
+    breaker.record_failure()
+    # 成功一次后重新计数
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    stats = breaker.get_stats()
+    assert stats['opened'] == 1 and stats['short_circuited'] == 1 and stats['consecutive_failures'] == 3
+    assert 0 < stats['next_probe_in'] <= 0.05
+
+
+def test_half_open_allows_a_single_probe():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request() and breaker.allow_request()
+    assert breaker.get_stats()['probes'] == 1
+
+
+def test_failed_probe_doubles_backoff_up_to_limit():
+    breaker = make_breaker()
+    open_breaker(breaker)
+    for expected in (0.1, 0.2, 0.2):
+        time.sleep(breaker.get_stats()['next_probe_in'] + 0.01)
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert expected - 0.02 < breaker.get_stats()['next_probe_in'] <= expected
+    # 恢复后退避时间重置
+    time.sleep(0.21)
+    assert breaker.allow_request()
+    breaker.record_success()
+    open_breaker(breaker)
+    assert breaker.get_stats()['next_probe_in'] <= 0.05
+
+
+def test_probe_without_result_times_out():
+    breaker = make_breaker(probe_timeout=0.05)
+    open_breaker(breaker)
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    time.sleep(0.06)
+    assert breaker.allow_request()
+
+
+class FailingTransport:
+    """按 statuses 依次返回状态码，用完后返回200"""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=10, proxies=None):
+        self.calls += 1
+        status = self.statuses.pop(0) if self.statuses else 200
+        return RecordedResponse(status, json.dumps({'code': '00000', 'data': []}))
+
+
+def test_service_stops_calling_failing_upstream():
+    transport = FailingTransport([500, 429, 503])
+    service = BitgetService(rate_limiter=RateLimiter(), transport=transport)
+    service.circuit_breaker = make_breaker()
+    for _ in range(5):
+        assert service._make_request('/api/v2/public/time') is None
+    assert transport.calls == 3
+
+    time.sleep(0.06)
+    assert service._make_request('/api/v2/public/time') == {'code': '00000', 'data': []}
+    assert service.circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+def test_client_errors_do_not_open_breaker():
+    transport = FailingTransport([400] * 5)
+    service = BitgetService(rate_limiter=RateLimiter(), transport=transport)
+    for _ in range(5):
+        service._make_request('/api/v2/public/time')
+    assert transport.calls == 5
+    assert service.circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+class FlakyBitget:
+    """up 为False时上游无数据"""
+
+    def __init__(self):
+        self.up = True
+
+    def get_klines_columnar(self, symbol, granularity, limit, start_time=None):
+        if not self.up:
+            return CandleColumns()
+        return CandleColumns.from_rows([[1700000000000 + i * 60000, 1, 2, 0.5, 1.5, 1, 1] for i in range(30)])
+
+
+def test_last_data_is_kept_and_flagged_by_age():
+    service = IngestionService(FlakyBitget(), CandleStore(), resample=False, incremental=False)
+    assert service.ingest_once('ETHUSDT', '1m')
+    fetched_at = service.store.get('ETHUSDT', '1m')['fetched_at']
+
+    # 上游故障期间保留最后一次成功获取的数据，获取时间不变
+    service.bitget_service.up = False
+    assert not service.ingest_once('ETHUSDT', '1m')
+    series = service.store.get('ETHUSDT', '1m')
+    assert len(series['klines']) == 30 and series['fetched_at'] == fetched_at
+
+    # 约错过三次拉取即视为过期，最短5秒
+    assert service.stale_after_ms('1m') == 5000
+    assert service.stale_after_ms('4H') == 90000
+    assert service.stale_after_ms('1D') == 180000
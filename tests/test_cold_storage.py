@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from src.services.candle_db import CandleDatabase
+from src.services.cold_storage import ColdStorage
+
+STEP = 60000
+# 2020-01-01，远早于封存的截止时间
+BASE = 1577836800000
+
+
+def candles(start: int, count: int, price: float = 2000.0):
+    return [[BASE + (start + i) * STEP, price, price + 1, price - 1, price + 0.5, 10.0, 1000.0]
+            for i in range(count)]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    database = CandleDatabase(str(tmp_path / 'candles.db'))
+    cold = ColdStorage(str(tmp_path / 'cold'), chunk_rows=16)
+    yield database, cold
+    database.close()
+
+
+def test_seal_moves_rows_to_cold_storage(storage):
+    database, cold = storage
+    database.upsert('ETHUSDT', '1m', candles(0, 100))
+
+    assert cold.seal_from_database(database, 'ETHUSDT', '1m') == 100
+    assert database.count('ETHUSDT', '1m') == 0
+    assert cold.read('ETHUSDT', '1m').to_rows() == candles(0, 100)
+
+
+def test_late_patch_survives_second_seal(storage):
+    database, cold = storage
+    database.upsert('ETHUSDT', '1m', candles(0, 50))
+    cold.seal_from_database(database, 'ETHUSDT', '1m')
+
+    # 已封存区间内补入的K线（如缺口修复），以及之后的新K线
+    patch = candles(10, 1, price=2100.0)
+    database.upsert('ETHUSDT', '1m', patch)
+    database.upsert('ETHUSDT', '1m', candles(50, 50))
+
+    assert cold.seal_from_database(database, 'ETHUSDT', '1m') == 50
+    assert database.read_range('ETHUSDT', '1m').to_rows() == patch
+    assert cold.read('ETHUSDT', '1m').to_rows() == candles(0, 100)
+
+
+def test_seal_without_delete_keeps_rows(storage):
+    database, cold = storage
+    database.upsert('ETHUSDT', '1m', candles(0, 20))
+
+    assert cold.seal_from_database(database, 'ETHUSDT', '1m', delete=False) == 20
+    assert database.count('ETHUSDT', '1m') == 20
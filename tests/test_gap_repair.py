@@ -0,0 +1,63 @@
+from src.services.candle_store import CandleStore
+from src.services.gap_repair import GapRepairService, find_gaps
+from src.services.ingestion_service import IngestionService
+
+DAY = 86400000
+# 日线按UTC+8划分，开盘于16:00 UTC
+FIRST = 1700000000000 - 1700000000000 % DAY + 16 * 3600000
+
+
+def candle(ts):
+    return [ts, 1.0, 2.0, 0.5, 1.5, 1.0, 1.0]
+
+
+class FakeBitget:
+    """历史接口：返回请求区间内16:00 UTC开盘的日线，empty 中的K线上游也没有"""
+
+    def __init__(self, empty=()):
+        self.empty = set(empty)
+        self.pages = []
+
+    def get_history_klines(self, symbol, granularity, start_time, end_time, limit):
+        self.pages.append((start_time, end_time))
+        first = start_time + (FIRST - start_time) % DAY
+        return [candle(ts) for ts in range(first, end_time + 1, DAY) if ts not in self.empty]
+
+
+def setup_repair(missing, empty=()):
+    times = [FIRST + i * DAY for i in range(60)]
+    ingestion = IngestionService(FakeBitget(empty), CandleStore(), resample=False)
+    ingestion.store.update('ETHUSDT', '1D', [candle(ts) for ts in times if ts not in missing])
+    return GapRepairService(ingestion), ingestion.store, times
+
+
+def test_find_gaps():
+    assert find_gaps([0, 1, 2, 5, 6, 9], 1) == [(3, 4), (7, 8)]
+    assert find_gaps([0, 1, 2], 1) == []
+    assert find_gaps([7], 1) == []
+
+
+def test_daily_gap_at_utc8_open_is_repaired():
+    missing = {FIRST + 20 * DAY, FIRST + 21 * DAY, FIRST + 40 * DAY}
+    service, store, times = setup_repair(missing)
+    assert service.scan('ETHUSDT', '1D') == [(FIRST + 20 * DAY, FIRST + 21 * DAY), (FIRST + 40 * DAY, FIRST + 40 * DAY)]
+
+    assert service.repair_pending() == 3
+    assert list(store.get('ETHUSDT', '1D')['klines'].timestamp) == times
+    assert service.scan('ETHUSDT', '1D') == []
+    metrics = service.get_metrics()['ETHUSDT:1D']
+    assert metrics['completeness'] == 1.0 and metrics['unrepairable'] == 0
+
+
+def test_gap_without_upstream_data_is_unrepairable():
+    missing = {FIRST + 30 * DAY}
+    service, store, _ = setup_repair(missing, empty=missing)
+    service.scan('ETHUSDT', '1D')
+    assert service.repair_pending() == 0
+
+    # 再次扫描时不再排队请求上游
+    pages = len(service.bitget_service.pages)
+    service.scan('ETHUSDT', '1D')
+    assert service.repair_pending() == 0
+    assert len(service.bitget_service.pages) == pages
+    assert service.get_metrics()['ETHUSDT:1D']['unrepairable'] == 1
@@ -0,0 +1,89 @@
+from src.services.bitget_service import BitgetService
+from src.services.candle_columns import CandleColumns
+from src.services.candle_store import CandleStore
+from src.services.ingestion_service import IngestionService
+
+START = 1700000000000
+STEP = 60000
+
+
+def candle(i, close=1.5):
+    return [START + i * STEP, 1.0, 2.0, 0.5, close, 1.0, 1.0]
+
+
+class FakeBitget:
+    """上游序列 rows；指定 start_time 时只返回之后的K线，记录每次请求的起始时间"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def get_klines_columnar(self, symbol, granularity, limit, start_time=None):
+        self.calls.append(start_time)
+        rows = self.rows if start_time is None else [row for row in self.rows if row[0] >= start_time]
+        return CandleColumns.from_rows(rows[-int(limit):])
+
+
+def make_service(rows, incremental=True):
+    return IngestionService(FakeBitget(rows), CandleStore(), limit='100', incremental=incremental, resample=False)
+
+
+def test_klines_params_include_start_time():
+    params = BitgetService.build_klines_params('ETHUSDT', '1m', '100', 'usdt-futures', START)
+    assert params['startTime'] == str(START)
+    assert 'startTime' not in BitgetService.build_klines_params('ETHUSDT', '1m', '100', 'usdt-futures')
+
+
+def test_incremental_fetch_merges_from_last_candle():
+    service = make_service([candle(i) for i in range(50)])
+    bitget, store = service.bitget_service, service.store
+    assert service.ingest_once('ETHUSDT', '1m')
+    assert bitget.calls == [None]
+    version = store.version('ETHUSDT', '1m')
+
+    # 形成中的最后一根K线更新，并出现两根新K线
+    bitget.rows[-1] = candle(49, close=1.8)
+    bitget.rows += [candle(50), candle(51)]
+    assert service.ingest_once('ETHUSDT', '1m')
+    assert bitget.calls[-1] == START + 49 * STEP
+    klines = store.get('ETHUSDT', '1m')['klines']
+    assert list(klines.timestamp) == [START + i * STEP for i in range(52)]
+    assert klines.close[49] == 1.8
+    assert store.version('ETHUSDT', '1m') == version + 1
+
+
+def test_unchanged_increment_keeps_version():
+    service = make_service([candle(i) for i in range(50)])
+    service.ingest_once('ETHUSDT', '1m')
+    version = service.store.version('ETHUSDT', '1m')
+    assert service.ingest_once('ETHUSDT', '1m')
+    assert service.store.version('ETHUSDT', '1m') == version
+
+
+def test_disconnected_increment_falls_back_to_full_fetch():
+    service = make_service([candle(i) for i in range(50)])
+    bitget = service.bitget_service
+    service.ingest_once('ETHUSDT', '1m')
+    # 停顿过久：上游已不再返回本地最后一根K线
+    bitget.rows = [candle(i) for i in range(200, 260)]
+    assert service.ingest_once('ETHUSDT', '1m')
+    assert bitget.calls[-2:] == [START + 49 * STEP, None]
+    assert list(service.store.get('ETHUSDT', '1m')['klines'].timestamp) == [row[0] for row in bitget.rows]
+
+
+def test_incremental_disabled_always_fetches_full():
+    service = make_service([candle(i) for i in range(50)], incremental=False)
+    service.ingest_once('ETHUSDT', '1m')
+    service.ingest_once('ETHUSDT', '1m')
+    assert service.bitget_service.calls == [None, None]
+
+
+def test_store_merge_replaces_from_first_new_timestamp():
+    store = CandleStore()
+    store.update('ETHUSDT', '1m', [candle(i) for i in range(10)])
+    assert store.merge('ETHUSDT', '1m', [candle(8, close=3.0), candle(10)])
+    # 新数据首条之后的旧K线以新数据为准
+    klines = store.get('ETHUSDT', '1m')['klines']
+    assert list(klines.timestamp) == [START + i * STEP for i in (*range(9), 10)]
+    assert list(klines.close[7:]) == [1.5, 3.0, 1.5]
+    assert not store.merge('ETHUSDT', '1m', [candle(10)])
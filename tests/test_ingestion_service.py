@@ -0,0 +1,123 @@
+import threading
+import time
+
+from src.services.candle_columns import CandleColumns
+from src.services.candle_store import CandleStore
+from src.services.ingestion_service import IngestionService
+from src.services.simple_technical_analysis import SimpleTechnicalAnalysis
+
+
+class FakeBitget:
+    """只认识 ETHUSDT 的上游"""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_klines_columnar(self, symbol, granularity, limit, start_time=None):
+        self.calls.append((symbol, granularity))
+        if symbol != 'ETHUSDT':
+            return None
+        return CandleColumns.from_rows([[1700000000000 + i * 60000, 1, 2, 0.5, 1.5, 1, 1] for i in range(30)])
+
+
+def make_service():
+    return IngestionService(FakeBitget(), CandleStore(), resample=False)
+
+
+def test_ensure_series_watches_after_successful_fetch():
+    service = make_service()
+    try:
+        assert service.ensure_series('ETHUSDT', '1m')
+        assert ('ETHUSDT', '1m') in service._watched
+    finally:
+        service.stop()
+
+
+def test_unknown_symbol_is_not_watched():
+    service = make_service()
+    try:
+        assert not service.ensure_series('ZZZ', '1m')
+        assert not service._watched
+        assert not service.is_running()
+    finally:
+        service.stop()
+
+
+def test_unsupported_granularity_is_rejected_without_fetching():
+    service = make_service()
+    assert not service.ensure_series('ETHUSDT', '7m')
+    assert not service.bitget_service.calls
+    assert not service._watched
+
+
+def test_read_or_fetch_does_not_watch():
+    service = make_service()
+    klines = service.read_or_fetch('ETHUSDT', '1m')
+    assert len(klines) == 30
+    assert service.read_or_fetch('ZZZ', '1m') is None
+    assert not service._watched
+    assert not service.store.has_data('ETHUSDT', '1m')
+
+
+def test_analysis_during_repair_sees_rebuilt_state():
+    # 补入缺口与丢弃区间最值索引在同一写锁内：并发的查询不会用旧索引计算补入后的数据
+    service = IngestionService(FakeBitget(), CandleStore(), analyzer=SimpleTechnicalAnalysis(), resample=False)
+    rows = [[1700000000000 + i * 60000, 1, 2, 0.5, 1.5, 1, 1] for i in range(30)]
+    service.store.update('ETHUSDT', '1m', [row for i, row in enumerate(rows) if i != 10])
+    assert service.get_levels('ETHUSDT', '1m', [30])[30]['fibonacci_retracements']['high_price'] == 2
+
+    # 补入的K线是区间最高点；patch 完成后立即在另一个线程查询
+    concurrent = {}
+    patch = service.store.patch
+
+    def patch_then_query(symbol, granularity, klines):
+        inserted = patch(symbol, granularity, klines)
+        thread = threading.Thread(
+            target=lambda: concurrent.update(levels=service.get_levels(symbol, granularity, [30])))
+        thread.start()
+        thread.join(0.2)
+        concurrent['thread'] = thread
+        return inserted
+
+    service.store.patch = patch_then_query
+    assert service.apply_repair('ETHUSDT', '1m', [[rows[10][0], 1, 9, 0.5, 1.5, 1, 1]]) == 1
+    concurrent['thread'].join()
+    assert concurrent['levels'][30]['fibonacci_retracements']['high_price'] == 9
+
+
+class SlowBitget(FakeBitget):
+    """每次请求耗时 delay 秒，记录同时进行的最大请求数；以 USDT 结尾的币对都有数据"""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def get_klines_columnar(self, symbol, granularity, limit, start_time=None):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return super().get_klines_columnar('ETHUSDT' if symbol.endswith('USDT') else symbol, granularity, limit)
+
+
+def test_read_or_fetch_many_fetches_missing_series_concurrently():
+    service = IngestionService(SlowBitget(0.1), CandleStore(), resample=False)
+    service.store.update('ETHUSDT', '1m', [[1700000000000, 1, 2, 0.5, 1.5, 1, 1]])
+    symbols = ['ETHUSDT', 'ZZZ'] + [f'C{i}USDT' for i in range(16)]
+
+    started = time.time()
+    result = service.read_or_fetch_many(symbols, '1m', max_workers=8)
+    assert time.time() - started < 1.0
+    assert list(result) == symbols
+    # 存储中已有的序列不请求上游
+    assert len(result['ETHUSDT']) == 1
+    assert result['ZZZ'] is None
+    assert all(len(result[symbol]) == 30 for symbol in symbols[2:])
+    assert len(service.bitget_service.calls) == 17
+    assert service.bitget_service.peak == 8
+    assert not service._watched
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from src.services.lazy_analysis import SECTION_DEPENDENCIES, LazyAnalysis
+from src.services.simple_technical_analysis import SimpleTechnicalAnalysis
+
+
+def candles(count):
+    return [[1700000000000 + i * 60000, 2000.0 + i % 7, 2003.0 + i % 11, 1996.0 - i % 5, 2000.5 + i % 7, 1.0, 2.0]
+            for i in range(count)]
+
+
+class Recorder:
+    """compute 回调：记录计算顺序，可选每次计算耗时"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.order = []
+
+    def __call__(self, name, resolved):
+        for dependency in SECTION_DEPENDENCIES[name]:
+            assert dependency in resolved
+        time.sleep(self.delay)
+        self.order.append(name)
+        return name.upper()
+
+
+def test_fields_compute_only_requested_sections_and_dependencies():
+    recorder = Recorder()
+    analysis = LazyAnalysis(recorder)
+    assert analysis.to_dict(['pivot_points']) == {'pivot_points': 'PIVOT_POINTS'}
+    assert analysis.computed() == ('pivot_points',)
+
+    assert analysis.to_dict(['optimized_levels']) == {'optimized_levels': 'OPTIMIZED_LEVELS'}
+    # 依赖先计算，已计算的部分不重复计算
+    assert recorder.order == ['pivot_points', 'current_price', 'fibonacci_retracements', 'optimized_levels']
+
+    analysis['moving_averages']
+    assert recorder.order[-1] == 'moving_averages' and recorder.order.count('current_price') == 1
+    assert list(analysis.to_dict()) == list(SECTION_DEPENDENCIES)
+    assert len(recorder.order) == len(SECTION_DEPENDENCIES)
+
+
+def test_unknown_fields_are_rejected():
+    analysis = LazyAnalysis(Recorder())
+    with pytest.raises(KeyError):
+        analysis.to_dict(['pivot_points', 'rsi'])
+    with pytest.raises(KeyError):
+        analysis['rsi']
+    assert analysis.computed() == ()
+
+
+def test_failed_and_precomputed_results():
+    failed = LazyAnalysis.failed('K线数据不足')
+    assert failed.to_dict(['pivot_points']) == {'error': 'K线数据不足'}
+    assert len(failed) == 0 and list(failed) == []
+    assert LazyAnalysis.from_dict({'error': 'x'}).error == 'x'
+
+    wrapped = LazyAnalysis.from_dict({name: i for i, name in enumerate(SECTION_DEPENDENCIES)})
+    assert wrapped.to_dict(['trend_lines', 'timestamp']) == {'trend_lines': 5, 'timestamp': 1}
+    assert dict(wrapped) == wrapped.to_dict()
+
+
+def test_shared_between_threads_computes_each_section_once():
+    recorder = Recorder(delay=0.01)
+    analysis = LazyAnalysis(recorder)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(analysis.to_dict(['optimized_levels', 'moving_averages'])))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 8 and all(result == results[0] for result in results)
+    assert sorted(recorder.order) == sorted(set(recorder.order))
+
+
+@pytest.mark.parametrize('backend', ['python', 'auto'])
+def test_lazy_analysis_matches_full_analysis(backend):
+    analyzer = SimpleTechnicalAnalysis(backend=backend)
+    rows = candles(150)
+    full = analyzer.analyze(rows)
+    lazy = analyzer.analyze_lazy(rows)
+    assert lazy.to_dict(['optimized_levels']) == {'optimized_levels': full['optimized_levels']}
+    assert set(lazy.computed()) == {'current_price', 'fibonacci_retracements', 'pivot_points', 'optimized_levels'}
+    assert lazy.to_dict() == full
+
+    assert analyzer.analyze_lazy(candles(19)).to_dict() == analyzer.analyze(candles(19))
@@ -0,0 +1,146 @@
+import random
+
+import pytest
+
+from src.services.analysis_backends import PYTHON_BACKEND
+from src.services.candle_columns import CandleColumns
+from src.services.candle_store import CandleStore
+from src.services.ingestion_service import IngestionService
+from src.services.range_index import CandleRangeIndex, RangeExtremaIndex
+from src.services.simple_technical_analysis import SimpleTechnicalAnalysis
+
+START = 1700000000000
+STEP = 60000
+
+
+def brute_force(values, start, end, is_max):
+    """区间内最值首次出现的下标"""
+    pick = max if is_max else min
+    return pick(range(start, end + 1), key=values.__getitem__)
+
+
+def random_values(rng, count):
+    # 只取少数几个值，大量相等的最值检验“取较早下标”
+    return [float(rng.randint(0, 5)) for _ in range(count)]
+
+
+def assert_all_queries(index, values):
+    for start in range(len(values)):
+        for end in range(start, len(values)):
+            assert index.query(start, end) == brute_force(values, start, end, index.is_max)
+
+
+@pytest.mark.parametrize('is_max', [True, False])
+def test_sparse_table_matches_brute_force(is_max):
+    rng = random.Random(1)
+    for size in (1, 2, 3, 7, 8, 9, 33):
+        values = random_values(rng, size)
+        loaded = RangeExtremaIndex(is_max)
+        loaded.load(values)
+        assert_all_queries(loaded, values)
+
+        appended = RangeExtremaIndex(is_max)
+        for value in values:
+            appended.append(value)
+        assert appended._levels == loaded._levels
+        assert_all_queries(appended, values)
+
+
+@pytest.mark.parametrize('is_max', [True, False])
+def test_replace_last_updates_every_level(is_max):
+    rng = random.Random(2)
+    index = RangeExtremaIndex(is_max)
+    values = []
+    for _ in range(40):
+        if values and rng.random() < 0.5:
+            values[-1] = float(rng.randint(0, 5))
+            index.replace_last(values[-1])
+        else:
+            values.append(float(rng.randint(0, 5)))
+            index.append(values[-1])
+        assert_all_queries(index, values)
+    assert len(index) == len(values)
+    index.load([])
+    assert len(index) == 0 and index._levels == []
+
+
+def candle(i, high, low, close=None):
+    return [START + i * STEP, low, high, low, (high + low) / 2 if close is None else close, 1.0, 1.0]
+
+
+def random_candle(rng, i):
+    low = rng.randint(0, 5)
+    return candle(i, float(low + rng.randint(0, 3)), float(low))
+
+
+def assert_extremes(index, rows, lookbacks):
+    highs = [row[2] for row in rows]
+    lows = [row[3] for row in rows]
+    for lookback in lookbacks:
+        assert index.extremes(lookback) == PYTHON_BACKEND.extremes(highs, lows, min(lookback, len(rows)))
+
+
+def test_candle_index_matches_backend_across_compaction():
+    rng = random.Random(3)
+    index = CandleRangeIndex(capacity=8)
+    with pytest.raises(IndexError):
+        index.replace_last(candle(0, 1.0, 0.0))
+    with pytest.raises(ValueError):
+        index.extremes(5)
+
+    rows = []
+    for i in range(60):
+        if rows and rng.random() < 0.3:
+            rows[-1] = random_candle(rng, i)
+            index.replace_last(rows[-1])
+        else:
+            rows.append(random_candle(rng, i))
+            index.append(rows[-1])
+        window = rows[-8:]
+        assert len(index) == len(window)
+        assert_extremes(index, window, (1, 3, 8, 100))
+    # 超过两倍容量时压缩
+    assert len(index.timestamp) <= 16
+
+
+def test_sync_follows_store():
+    rng = random.Random(4)
+    store = CandleStore(max_candles=50)
+    rows = [random_candle(rng, i) for i in range(30)]
+    store.update('ETHUSDT', '1m', rows)
+    index = CandleRangeIndex(capacity=50)
+    with store.view('ETHUSDT', '1m') as klines:
+        index.sync(klines)
+    assert_extremes(index, rows, (5, 30))
+
+    for i in range(30, 120):
+        # 形成中的K线更新后追加新K线
+        new = [random_candle(rng, i - 1), random_candle(rng, i)]
+        store.merge('ETHUSDT', '1m', new)
+        rows[-1:] = new
+        with store.view('ETHUSDT', '1m') as klines:
+            index.sync(klines)
+        assert_extremes(index, rows[-50:], (1, 10, 50))
+
+    # 序列被整体替换时重新构建
+    replaced = [random_candle(rng, i) for i in range(500, 520)]
+    index.sync(CandleColumns.from_rows(replaced))
+    assert list(index.timestamp) == [row[0] for row in replaced]
+    assert_extremes(index, replaced, (7, 20))
+    assert not len(index.sync(CandleColumns()))
+
+
+def test_levels_by_lookback_match_full_analysis():
+    rng = random.Random(5)
+    rows = [random_candle(rng, i) for i in range(300)]
+    analyzer = SimpleTechnicalAnalysis()
+    service = IngestionService(None, CandleStore(), analyzer=analyzer, resample=False)
+    service.store.update('ETHUSDT', '1m', rows)
+    levels = service.get_levels('ETHUSDT', '1m', [20, 100, 1000])
+    assert levels[1000]['candles'] == 300
+    full = analyzer.analyze(rows)
+    assert levels[100]['fibonacci_retracements'] == full['fibonacci_retracements']
+    for lookback, result in levels.items():
+        expected = analyzer._fibonacci_levels_for(
+            *PYTHON_BACKEND.extremes([row[2] for row in rows], [row[3] for row in rows], min(lookback, 300)))
+        assert result['fibonacci_retracements'] == expected
@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from src.services import rate_limiter
+from src.services.rate_limiter import FileTokenBucket, RateLimiter, TokenBucket
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CANDLES = '/api/v2/mix/market/candles'
+
+
+def test_bucket_allows_burst_then_refills():
+    bucket = TokenBucket(rate=20, capacity=5)
+    assert [bucket.try_acquire() for _ in range(6)] == [True] * 5 + [False]
+    assert 0 < bucket.wait_time() <= 0.05
+    time.sleep(0.06)
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_acquire_waits_for_token_or_times_out():
+    bucket = TokenBucket(rate=10, capacity=1)
+    assert bucket.acquire()
+    started = time.monotonic()
+    assert bucket.acquire(timeout=1.0)
+    assert 0.05 <= time.monotonic() - started < 0.5
+    assert not bucket.acquire(timeout=0.01)
+
+
+def test_endpoints_have_separate_buckets():
+    limiter = RateLimiter(limits={CANDLES: 2})
+    assert limiter.try_acquire(CANDLES) and limiter.try_acquire(CANDLES)
+    assert not limiter.try_acquire(CANDLES)
+    # 其他接口的额度不受影响，未配置的接口使用默认限频
+    assert limiter.try_acquire('/api/v2/mix/market/ticker')
+    assert limiter.bucket('/unknown').rate == RateLimiter.DEFAULT_LIMIT
+    assert limiter.bucket(CANDLES) is limiter.bucket(CANDLES)
+
+
+@pytest.mark.skipif(rate_limiter.fcntl is None, reason='当前平台不支持文件锁')
+def test_file_buckets_share_state(tmp_path):
+    path = str(tmp_path / 'candles.bucket')
+    first = FileTokenBucket(path, rate=1, capacity=3)
+    second = FileTokenBucket(path, rate=1, capacity=3)
+    assert first.try_acquire() and second.try_acquire() and first.try_acquire()
+    assert not second.try_acquire()
+    assert not first.try_acquire()
+
+
+@pytest.mark.skipif(rate_limiter.fcntl is None, reason='当前平台不支持文件锁')
+def test_shared_dir_limits_across_processes(tmp_path):
+    # 多个进程同时抢同一个共享令牌桶，文件锁保证发放的令牌总数不超过额度
+    script = (
+        'import sys\n'
+        'from src.services.rate_limiter import RateLimiter\n'
+        'limiter = RateLimiter(limits={%r: 1}, shared_dir=sys.argv[1])\n'
+        'limiter.bucket(%r).capacity = 20\n'
+        'print(sum(limiter.try_acquire(%r) for _ in range(50)))\n'
+    ) % (CANDLES, CANDLES, CANDLES)
+    started = time.time()
+    processes = [subprocess.Popen([sys.executable, '-c', script, str(tmp_path)], cwd=ROOT,
+                                  stdout=subprocess.PIPE, text=True) for _ in range(4)]
+    granted = sum(int(process.communicate(timeout=30)[0]) for process in processes)
+    elapsed = time.time() - started
+    # 首次创建状态文件的进程按容量初始化，其后每秒补充1个
+    assert 20 <= granted <= 20 + int(elapsed) + 1
+    assert os.listdir(tmp_path) == ['api_v2_mix_market_candles.bucket']
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+
+from src.services.bitget_service import BitgetService
+from src.services.rate_limiter import RateLimiter
+from src.services.transports import RecordedResponse
+
+
+class BlockingTransport:
+    """K线接口：请求在 release 之前阻塞，记录每次请求的参数"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=10, proxies=None):
+        with self._lock:
+            self.calls.append(dict(params))
+        self.release.wait(5)
+        rows = [[str(1700000000000 + i * 60000), '1', '2', '0.5', '1.5', '1', '1'] for i in range(3)]
+        return RecordedResponse(200, json.dumps({'code': '00000', 'data': rows}))
+
+
+def make_service():
+    transport = BlockingTransport()
+    service = BitgetService(rate_limiter=RateLimiter(), transport=transport)
+    return service, transport
+
+
+def wait_until(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def run_concurrently(count, call):
+    results = [None] * count
+
+    def worker(i):
+        results[i] = call()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_identical_concurrent_calls_share_one_upstream_request():
+    service, transport = make_service()
+    threads, results = run_concurrently(8, lambda: service.get_klines('ETHUSDT', '1m', '3'))
+    # 第一个调用发起请求，其余调用等待它的结果
+    assert wait_until(lambda: service.get_coalesce_stats()['coalesced'] == 7)
+    transport.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(transport.calls) == 1
+    assert all(result == results[0] for result in results) and len(results[0]) == 3
+    # 每个调用方得到独立的列表，修改不影响其他调用方
+    results[0].clear()
+    assert len(results[1]) == 3
+    assert service.get_coalesce_stats() == {'requests': 8, 'upstream_calls': 1, 'coalesced': 7}
+
+
+def test_columnar_calls_share_the_same_object():
+    service, transport = make_service()
+    threads, results = run_concurrently(4, lambda: service.get_klines_columnar('ETHUSDT', '1m', '3'))
+    assert wait_until(lambda: service.get_coalesce_stats()['coalesced'] == 3)
+    transport.release.set()
+    for thread in threads:
+        thread.join()
+    assert len(transport.calls) == 1
+    assert all(result is results[0] for result in results)
+    assert list(results[0].timestamp) == [1700000000000 + i * 60000 for i in range(3)]
+
+
+def test_different_parameters_are_not_coalesced():
+    service, transport = make_service()
+    calls = [lambda: service.get_klines('ETHUSDT', '1m', '3'),
+             lambda: service.get_klines('ETHUSDT', '5m', '3'),
+             lambda: service.get_klines('BTCUSDT', '1m', '3'),
+             lambda: service.get_klines('ETHUSDT', '1m', '3', start_time=1700000000000)]
+    threads = [threading.Thread(target=call) for call in calls]
+    for thread in threads:
+        thread.start()
+    assert wait_until(lambda: len(transport.calls) == 4)
+    transport.release.set()
+    for thread in threads:
+        thread.join()
+    assert service.get_coalesce_stats()['coalesced'] == 0
+
+
+def test_completed_call_is_not_cached():
+    service, transport = make_service()
+    transport.release.set()
+    service.get_klines('ETHUSDT', '1m', '3')
+    service.get_klines('ETHUSDT', '1m', '3')
+    assert len(transport.calls) == 2
+    assert service.get_coalesce_stats()['coalesced'] == 0
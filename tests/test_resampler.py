@@ -0,0 +1,124 @@
+import pytest
+
+from src.services.candle_store import CandleStore
+from src.services.resampler import CandleResampler
+
+MINUTE = 60000
+DAY = 86400000
+# 按UTC+8划分的日线在UTC 16:00开盘
+PHASE = 16 * 3600000
+BASE = 1699977600000
+SYMBOL = 'ETHUSDT'
+
+
+def minute(i, close=None, volume=1.0):
+    price = 100.0 + (i * 7) % 13
+    close = price + 0.5 if close is None else close
+    return [BASE + i * MINUTE, price, max(price, close) + 1, min(price, close) - 1, close, volume, volume * price]
+
+
+def aggregate(rows, step, phase=0):
+    """逐根分组合成周期K线，作为对照"""
+    bars = []
+    for row in rows:
+        bucket = row[0] - (row[0] - phase) % step
+        if bars and bars[-1][0] == bucket:
+            bar = bars[-1]
+            bar[2], bar[3], bar[4] = max(bar[2], row[2]), min(bar[3], row[3]), row[4]
+            bar[5] += row[5]
+            bar[6] += row[6]
+        else:
+            bars.append([bucket] + list(row[1:]))
+    return bars
+
+
+def push(store, resampler, rows):
+    """逐根推送1分钟K线，把派生结果合并进存储（同 IngestionService._derive）"""
+    for row in rows:
+        store.merge(SYMBOL, '1m', [row])
+        for granularity, bars in resampler.update(SYMBOL).items():
+            store.merge(SYMBOL, granularity, bars)
+
+
+def derived(store, granularity):
+    return store.get(SYMBOL, granularity)['klines'].to_rows()
+
+
+def make_resampler(first_row, granularities=('5m', '1H')):
+    store = CandleStore(max_candles=5000)
+    store.update(SYMBOL, '1m', [first_row])
+    resampler = CandleResampler(store)
+    for granularity in granularities:
+        assert resampler.seed(SYMBOL, granularity)
+    return store, resampler
+
+
+def test_seed_requires_minute_data():
+    resampler = CandleResampler(CandleStore())
+    assert resampler.can_derive('4H') and not resampler.can_derive('1W')
+    assert not resampler.seed(SYMBOL, '5m')
+    assert not resampler.is_seeded(SYMBOL, '5m')
+    assert resampler.update(SYMBOL) == {}
+
+
+def test_folded_bars_match_brute_force():
+    rows = [minute(i) for i in range(200)]
+    store, resampler = make_resampler(rows[0])
+    push(store, resampler, rows[1:])
+    assert derived(store, '5m') == aggregate(rows, 5 * MINUTE)
+    assert derived(store, '1H') == aggregate(rows, 60 * MINUTE)
+
+
+def test_forming_minute_is_overlaid_not_accumulated():
+    rows = [minute(i) for i in range(13)]
+    store, resampler = make_resampler(rows[0])
+    push(store, resampler, rows[1:])
+    # 形成中的1分钟K线多次更新，只以最新一次计入当前周期
+    push(store, resampler, [minute(12, close=500.0, volume=3.0), minute(12, close=90.0, volume=2.0)])
+    current = derived(store, '5m')[-1]
+    assert current == aggregate(rows[:12] + [minute(12, close=90.0, volume=2.0)], 5 * MINUTE)[-1]
+    assert current[5] == 4.0
+
+    push(store, resampler, [rows[12]])
+    assert derived(store, '5m') == aggregate(rows, 5 * MINUTE)
+
+
+def test_daily_bars_follow_upstream_utc8_phase():
+    # 上游日线种子：当前日线已包含开盘以来（含形成中的1分钟K线）的成交量
+    upstream = [[BASE - DAY, 90.0, 95.0, 85.0, 100.0, 50.0, 5000.0],
+                [BASE, 100.0, 200.0, 50.0, 101.0, 100.0, 10000.0]]
+    store = CandleStore(max_candles=5000)
+    store.update(SYMBOL, '1D', upstream)
+    store.update(SYMBOL, '1m', [minute(600)])
+    resampler = CandleResampler(store)
+    assert resampler.seed(SYMBOL, '1D')
+
+    rows = [minute(i) for i in range(601, 1446)]
+    push(store, resampler, rows)
+    bars = derived(store, '1D')
+    assert [bar[0] for bar in bars] == [BASE - DAY, BASE, BASE + DAY]
+    assert all(bar[0] % DAY == PHASE for bar in bars)
+
+    # 已收盘部分来自上游，之后的1分钟K线折叠进去
+    minutes = [minute(600)] + rows
+    today = [row for row in minutes if row[0] < BASE + DAY]
+    assert bars[1][:5] == [BASE, 100.0, 200.0, 50.0, today[-1][4]]
+    assert bars[1][5] == 100.0 - 1.0 + len(today)
+    assert bars[1][6] == pytest.approx(10000.0 - minute(600)[6] + sum(row[6] for row in today))
+    assert bars[2] == aggregate([row for row in minutes if row[0] >= BASE + DAY], DAY, PHASE)[0]
+
+
+def test_rebuild_after_minute_gap_is_patched():
+    rows = [minute(i) for i in range(100)]
+    store, resampler = make_resampler(rows[0])
+    push(store, resampler, rows[1:20] + rows[30:])
+    assert len(derived(store, '5m')) == 18
+
+    # 补齐1分钟缺口后重算受影响的周期（同 IngestionService.apply_repair）
+    store.patch(SYMBOL, '1m', rows[20:30])
+    rebuilt = resampler.rebuild(SYMBOL, rows[20][0], rows[29][0])
+    assert [bar[0] for bar in rebuilt['5m'].to_rows()] == [rows[20][0], rows[25][0]]
+    for granularity, bars in rebuilt.items():
+        store.patch(SYMBOL, granularity, bars)
+    assert derived(store, '5m') == aggregate(rows, 5 * MINUTE)
+    assert derived(store, '1H') == aggregate(rows, 60 * MINUTE)
@@ -0,0 +1,120 @@
+import math
+import random
+
+import pytest
+
+from src.services.candle_columns import CandleColumns
+from src.services.lazy_analysis import SECTION_DEPENDENCIES
+from src.services.simple_technical_analysis import SimpleTechnicalAnalysis
+from src.services.streaming_analysis import StreamingTechnicalAnalysis
+
+# 模拟 CandleStore 的窗口长度
+WINDOW = 300
+
+
+def assert_close(expected, actual, path=''):
+    """逐项比较分析结果，浮点数允许累加顺序不同带来的末位误差"""
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict) and expected.keys() == actual.keys(), path
+        for key in expected:
+            assert_close(expected[key], actual[key], f'{path}/{key}')
+    elif isinstance(expected, list):
+        assert len(expected) == len(actual), path
+        for i, (a, b) in enumerate(zip(expected, actual)):
+            assert_close(a, b, f'{path}[{i}]')
+    elif isinstance(expected, float):
+        assert math.isclose(expected, actual, rel_tol=1e-9, abs_tol=1e-9), (path, expected, actual)
+    else:
+        assert expected == actual, (path, expected, actual)
+
+
+def assert_parity(expected, actual):
+    assert expected.keys() == actual.keys()
+    if 'error' in expected:
+        assert expected == actual
+        return
+    assert list(actual) == list(SECTION_DEPENDENCIES)
+    for name, moving_average in expected['moving_averages'].items():
+        if abs(moving_average['distance_percent']) < 1e-9:
+            # 价格恰好等于均线时，舍入顺序不同可能使 support/resistance 判定相反
+            actual['moving_averages'][name]['support_resistance'] = moving_average['support_resistance']
+    for name in expected:
+        assert_close(expected[name], actual[name], name)
+
+
+def random_candles(rng, count, start=0, tick=False):
+    """随机游走K线；tick=True 时价格取整到0.5，产生大量相等的高低点"""
+    digits = (lambda v: round(v * 2) / 2) if tick else (lambda v: v)
+    rows = []
+    price = 2000.0
+    for i in range(count):
+        open_price = price
+        price = digits(price + rng.gauss(0, 3))
+        high = digits(max(open_price, price) + rng.random() * 2)
+        low = digits(min(open_price, price) - rng.random() * 2)
+        rows.append([(start + i) * 60000, open_price, high, low, price, 1.0, price])
+    return rows
+
+
+def reshape(rng, row, tick):
+    """形成中的K线：收盘价变化，高低价随之扩展"""
+    row = list(row)
+    row[4] += rng.choice([-1.0, -0.5, 0.0, 0.5, 1.0]) if tick else rng.gauss(0, 1)
+    row[2] = max(row[2], row[4])
+    row[3] = min(row[3], row[4])
+    return row
+
+
+@pytest.mark.parametrize('tick', [False, True])
+def test_sync_matches_batch_analysis(tick):
+    rng = random.Random(7 if tick else 3)
+    analyzer = SimpleTechnicalAnalysis(backend='python')
+    engine = StreamingTechnicalAnalysis(analyzer)
+    candles = random_candles(rng, 900, tick=tick)
+    series = []
+
+    for candle in candles:
+        series.append(candle)
+        # 形成中的最后一根K线更新若干次
+        for _ in range(rng.randint(0, 2)):
+            series[-1] = reshape(rng, series[-1], tick)
+            window = CandleColumns.from_rows(series[-WINDOW:])
+            assert_parity(analyzer.analyze(window), engine.sync(window).to_dict())
+        window = CandleColumns.from_rows(series[-WINDOW:])
+        assert_parity(analyzer.analyze(window), engine.sync(window).to_dict())
+
+
+def test_sync_catches_up_and_reloads():
+    rng = random.Random(11)
+    analyzer = SimpleTechnicalAnalysis(backend='python')
+    engine = StreamingTechnicalAnalysis(analyzer)
+    series = random_candles(rng, WINDOW)
+    assert_parity(analyzer.analyze(series), engine.sync(CandleColumns.from_rows(series)).to_dict())
+
+    # 一次同步多根新K线（采集停顿后补拉）
+    series = (series + random_candles(rng, 40, start=WINDOW))[-WINDOW:]
+    series[-41] = reshape(rng, series[-41], False)
+    assert_parity(analyzer.analyze(series), engine.sync(CandleColumns.from_rows(series)).to_dict())
+
+    # 已收盘部分被改写（如缺口修复）时整体重新初始化
+    series[-2] = reshape(rng, series[-2], False)
+    assert_parity(analyzer.analyze(series), engine.sync(CandleColumns.from_rows(series)).to_dict())
+
+
+def test_update_and_replace_last_match_batch_analysis():
+    rng = random.Random(5)
+    analyzer = SimpleTechnicalAnalysis(backend='python')
+    engine = StreamingTechnicalAnalysis(analyzer)
+    series = []
+    for candle in random_candles(rng, 400, tick=True):
+        engine.update(candle)
+        series.append(candle)
+        series[-1] = reshape(rng, candle, True)
+        engine.replace_last(series[-1])
+        assert_parity(analyzer.analyze(series[-WINDOW:]), engine.analyze())
+
+
+def test_too_few_candles():
+    engine = StreamingTechnicalAnalysis()
+    rows = random_candles(random.Random(1), 19)
+    assert engine.sync(CandleColumns.from_rows(rows)).to_dict() == SimpleTechnicalAnalysis().analyze(rows)
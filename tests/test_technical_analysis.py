@@ -0,0 +1,101 @@
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+from src.services.technical_analysis import TechnicalAnalysis
+
+
+def legacy_support_resistance(ta, df):
+    """向量化之前的实现：最近100根K线逐行 iloc 比较左右各2根"""
+    recent_data = df.tail(100)
+    highs = []
+    lows = []
+    for i in range(2, len(recent_data) - 2):
+        if (recent_data.iloc[i]['high'] > recent_data.iloc[i-1]['high'] and
+                recent_data.iloc[i]['high'] > recent_data.iloc[i-2]['high'] and
+                recent_data.iloc[i]['high'] > recent_data.iloc[i+1]['high'] and
+                recent_data.iloc[i]['high'] > recent_data.iloc[i+2]['high']):
+            highs.append(recent_data.iloc[i]['high'])
+        if (recent_data.iloc[i]['low'] < recent_data.iloc[i-1]['low'] and
+                recent_data.iloc[i]['low'] < recent_data.iloc[i-2]['low'] and
+                recent_data.iloc[i]['low'] < recent_data.iloc[i+1]['low'] and
+                recent_data.iloc[i]['low'] < recent_data.iloc[i+2]['low']):
+            lows.append(recent_data.iloc[i]['low'])
+    return {
+        'resistance_levels': ta._cluster_price_levels(highs) if highs else [],
+        'support_levels': ta._cluster_price_levels(lows) if lows else []
+    }
+
+
+def brute_force_fractals(values, width, is_high):
+    """逐点比较左右各 width 个值"""
+    found = []
+    for i in range(width, len(values) - width):
+        neighbours = list(values[i - width:i]) + list(values[i + 1:i + width + 1])
+        if all(values[i] > v if is_high else values[i] < v for v in neighbours):
+            found.append(values[i])
+    return found
+
+
+def make_rows(rng, count, tick):
+    """随机K线；tick=True 时价格只取少数几个值，高低点大量相等"""
+    rows = []
+    price = 2000.0
+    for i in range(count):
+        if tick:
+            close = float(rng.randint(10, 14))
+            high = close + rng.randint(0, 1)
+            low = close - rng.randint(0, 1)
+        else:
+            price += rng.gauss(0, 2)
+            close = round(price, 2)
+            high = round(price + rng.random(), 2)
+            low = round(price - rng.random(), 2)
+        rows.append([1700000000000 + i * 60000, close, high, low, close, 1.0, close])
+    return rows
+
+
+@pytest.mark.parametrize('size', [20, 24, 99, 100, 101, 250])
+@pytest.mark.parametrize('tick', [False, True])
+def test_support_resistance_matches_legacy_loop(size, tick):
+    ta = TechnicalAnalysis()
+    for seed in range(3):
+        df = ta._rows_to_dataframe(make_rows(random.Random(seed), size, tick))
+        assert ta._calculate_support_resistance(df) == legacy_support_resistance(ta, df)
+
+
+@pytest.mark.parametrize('width', [1, 2, 3, 5])
+def test_find_fractals_matches_brute_force(width):
+    rng = random.Random(width)
+    for size in (0, 1, 2 * width, 2 * width + 1, 50, 300):
+        for tick in (False, True):
+            values = [rng.randint(0, 4) if tick else rng.gauss(0, 1) for _ in range(size)]
+            array = np.array(values, dtype=float)
+            for is_high in (True, False):
+                assert TechnicalAnalysis._find_fractals(array, width, is_high).tolist() == \
+                    brute_force_fractals(values, width, is_high)
+
+
+def test_plateaus_are_not_fractals():
+    values = np.array([1.0, 2.0, 5.0, 5.0, 2.0, 1.0, 0.0, 1.0, 2.0])
+    assert TechnicalAnalysis._find_fractals(values, 2, True).tolist() == []
+    assert TechnicalAnalysis._find_fractals(values, 2, False).tolist() == [0.0]
+
+
+def test_lookback_and_width_options():
+    rows = make_rows(random.Random(5), 400, False)
+    full = TechnicalAnalysis(support_resistance_lookback=None)
+    df = full._rows_to_dataframe(rows)
+    expected = brute_force_fractals(df['high'].tolist(), 2, True)
+    assert full._calculate_support_resistance(df)['resistance_levels'] == full._cluster_price_levels(expected)
+
+    wide = TechnicalAnalysis(fractal_width=4)
+    expected = brute_force_fractals(df['low'].tail(100).tolist(), 4, False)
+    assert wide._calculate_support_resistance(df)['support_levels'] == wide._cluster_price_levels(expected)
+    assert wide.cache_key() != TechnicalAnalysis().cache_key()
+
+    with pytest.raises(ValueError):
+        TechnicalAnalysis(fractal_width=0)
@@ -0,0 +1,78 @@
+import json
+import time
+
+from src.services.bitget_service import BitgetService
+from src.services.rate_limiter import RateLimiter
+from src.services.transports import RecordedResponse
+
+PRICES = {'ETHUSDT': 2000.5, 'BTCUSDT': 60000.0, 'SOLUSDT': 150.25}
+
+
+def ticker(symbol):
+    return {'symbol': symbol, 'lastPr': str(PRICES[symbol]), 'bidPr': '1', 'askPr': '2',
+            'high24h': '3', 'low24h': '0.5', 'change24h': '0.01', 'ts': '1700000000000'}
+
+
+class TickerTransport:
+    """ticker/tickers 接口，记录请求的接口路径"""
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, params=None, timeout=10, proxies=None):
+        endpoint = url.split('/api/v2/mix/market/')[-1]
+        self.calls.append(endpoint)
+        if endpoint == 'tickers':
+            data = [ticker(symbol) for symbol in PRICES]
+        else:
+            data = [ticker(params['symbol'])] if params['symbol'] in PRICES else []
+        return RecordedResponse(200, json.dumps({'code': '00000', 'data': data}))
+
+
+def make_service(ttl=1.0):
+    transport = TickerTransport()
+    service = BitgetService(rate_limiter=RateLimiter(), transport=transport)
+    service.price_cache_ttl = ttl
+    return service, transport
+
+
+def test_ticker_is_cached_within_ttl():
+    service, transport = make_service(ttl=0.1)
+    first = service.get_ticker('ETHUSDT')
+    assert first['price'] == 2000.5 and first['bid'] == 1.0 and first['ts'] == 1700000000000
+    assert service.get_latest_price('ETHUSDT') == 2000.5
+    assert transport.calls == ['ticker']
+
+    time.sleep(0.12)
+    assert service.get_ticker('ETHUSDT') == first
+    assert transport.calls == ['ticker', 'ticker']
+
+
+def test_batch_prices_use_one_tickers_request():
+    service, transport = make_service()
+    prices = service.get_latest_prices(['ETHUSDT', 'BTCUSDT', 'XXXUSDT'])
+    assert prices == {'ETHUSDT': 2000.5, 'BTCUSDT': 60000.0, 'XXXUSDT': None}
+    assert transport.calls == ['tickers']
+
+    # 全量请求顺带缓存了其他币对；不存在的币对同样缓存，不再单独请求
+    assert service.get_latest_prices(['SOLUSDT', 'XXXUSDT']) == {'SOLUSDT': 150.25, 'XXXUSDT': None}
+    assert service.get_ticker('BTCUSDT')['price'] == 60000.0
+    assert transport.calls == ['tickers']
+
+
+def test_single_missing_symbol_uses_ticker_endpoint():
+    service, transport = make_service()
+    service.get_ticker('ETHUSDT')
+    assert service.get_latest_prices(['ETHUSDT', 'SOLUSDT']) == {'ETHUSDT': 2000.5, 'SOLUSDT': 150.25}
+    assert transport.calls == ['ticker', 'ticker']
+
+
+def test_all_tickers_by_symbol():
+    service, _ = make_service()
+    assert {symbol: t['price'] for symbol, t in service.get_all_tickers().items()} == PRICES
+
+
+def test_parse_ticker_skips_malformed_items():
+    assert BitgetService.parse_ticker({'symbol': 'ETHUSDT', 'lastPr': 'x', 'ts': '1'}) is None
+    parsed = BitgetService.parse_ticker({'symbol': 'ETHUSDT', 'lastPr': '1.5', 'ts': '2'})
+    assert parsed['price'] == 1.5 and parsed['bid'] is None and parsed['high_24h'] is None
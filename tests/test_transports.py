@@ -0,0 +1,97 @@
+import gzip
+import json
+import time
+
+import pytest
+import requests
+
+from src.services.bitget_service import BitgetService
+from src.services.rate_limiter import RateLimiter
+from src.services.transports import RecordedResponse, RecordingTransport, ReplayTransport, request_key
+
+URL = 'https://api.bitget.com/api/v2/mix/market/candles'
+
+
+class FakeSession:
+    """代替 requests.Session：按请求顺序返回不同的正文"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=10, proxies=None):
+        self.calls += 1
+        rows = [[str(1700000000000 + self.calls * 60000), '1', '2', '0.5', '1.5', '1', '1']]
+        return RecordedResponse(200, json.dumps({'code': '00000', 'data': rows}))
+
+
+def record(path, requests_to_make):
+    transport = RecordingTransport(FakeSession(), path)
+    responses = [transport.get(URL, params=params) for params in requests_to_make]
+    transport.close()
+    return transport, responses
+
+
+def test_request_key_sorts_params():
+    assert request_key(URL, {'symbol': 'ETHUSDT', 'limit': 5}) == '/api/v2/mix/market/candles?limit=5&symbol=ETHUSDT'
+    assert request_key('https://api.bitget.com') == '/?'
+
+
+def test_record_and_replay_round_trip(tmp_path):
+    path = str(tmp_path / 'rec' / 'bitget.jsonl.gz')
+    params = {'symbol': 'ETHUSDT', 'granularity': '1m'}
+    transport, responses = record(path, [params, params, {'symbol': 'BTCUSDT', 'granularity': '1m'}])
+    assert transport.recorded == 3
+
+    replay = ReplayTransport(path)
+    # 同一请求录制了多条响应时按顺序返回，用完后循环
+    bodies = [replay.get(URL, params=dict(params)).text for _ in range(3)]
+    assert bodies == [responses[0].text, responses[1].text, responses[0].text]
+    assert replay.get(URL, params={'granularity': '1m', 'symbol': 'BTCUSDT'}).text == responses[2].text
+    assert replay.stats == {'hits': 4, 'loose_hits': 0, 'misses': 0}
+
+
+def test_replay_ignores_time_params_and_misses_like_network_errors(tmp_path):
+    path = str(tmp_path / 'bitget.jsonl.gz')
+    _, responses = record(path, [{'symbol': 'ETHUSDT', 'endTime': '1'}])
+    replay = ReplayTransport(path)
+    assert replay.get(URL, params={'symbol': 'ETHUSDT', 'endTime': '2', 'startTime': '0'}).text == responses[0].text
+    with pytest.raises(requests.exceptions.ConnectionError):
+        replay.get(URL, params={'symbol': 'BTCUSDT'})
+    assert replay.stats == {'hits': 0, 'loose_hits': 1, 'misses': 1}
+
+
+def test_appending_sessions_and_truncated_recording(tmp_path):
+    path = str(tmp_path / 'bitget.jsonl.gz')
+    record(path, [{'symbol': 'ETHUSDT'}])
+    record(path, [{'symbol': 'BTCUSDT'}])
+    # 录制进程被杀时最后一个gzip成员可能不完整
+    with gzip.open(path, 'at', encoding='utf-8') as f:
+        f.write('{"key": "/broken')
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:-6])
+    replay = ReplayTransport(path)
+    assert replay.get(URL, params={'symbol': 'ETHUSDT'}).status_code == 200
+    assert replay.get(URL, params={'symbol': 'BTCUSDT'}).status_code == 200
+
+
+def test_replay_latency(tmp_path):
+    path = str(tmp_path / 'bitget.jsonl.gz')
+    record(path, [{'symbol': 'ETHUSDT'}])
+    replay = ReplayTransport(path, latency=0.05)
+    started = time.perf_counter()
+    replay.get(URL, params={'symbol': 'ETHUSDT'})
+    assert time.perf_counter() - started >= 0.05
+
+
+def test_service_replays_recorded_klines_offline(tmp_path):
+    path = str(tmp_path / 'bitget.jsonl.gz')
+    session = FakeSession()
+    recorder = RecordingTransport(session, path)
+    live = BitgetService(rate_limiter=RateLimiter(), transport=recorder).get_klines('ETHUSDT', '1m', '1')
+    recorder.close()
+
+    replayed = BitgetService(rate_limiter=RateLimiter(), transport=ReplayTransport(path)).get_klines('ETHUSDT', '1m', '1')
+    assert replayed == live and len(live) == 1
+    assert session.calls == 1